@@ -0,0 +1,14 @@
+from django.contrib import admin
+
+from .models import OutboxMessage
+
+
+@admin.register(OutboxMessage)
+class OutboxMessageAdmin(admin.ModelAdmin):
+    list_display = (
+        'pk', 'subject', 'recipients', 'status', 'attempts', 'created', 'sent'
+    )
+    search_fields = ('subject', 'recipients')
+    list_filter = ('status',)
+    exclude = ('data',)
+    empty_value_display = '-пусто-'
@@ -0,0 +1,100 @@
+import hashlib
+import os
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from django.conf import settings
+
+
+class Broadcaster:
+    """Оповещения об изменениях каналов между потоками и процессами.
+
+    Версия канала — mtime его файла в SSE_CHANNEL_DIR в наносекундах.
+    publish в этом процессе будит ждущих сразу, изменения из других
+    процессов замечает один фоновый поток, который раз в
+    SSE_POLL_INTERVAL проверяет только каналы, которые кто-то ждёт.
+    Ждущий держит лишь словарь известных версий.
+    """
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.watched = Counter()
+        self.versions = {}
+        self.poller = None
+
+    def path(self, channel):
+        name = hashlib.md5(channel.encode()).hexdigest()
+        return os.path.join(settings.SSE_CHANNEL_DIR, name)
+
+    def read(self, channel):
+        try:
+            return os.stat(self.path(channel)).st_mtime_ns
+        except FileNotFoundError:
+            return 0
+
+    def publish(self, *channels):
+        os.makedirs(settings.SSE_CHANNEL_DIR, exist_ok=True)
+        for channel in channels:
+            path = self.path(channel)
+            version = max(time.time_ns(), self.read(channel) + 1)
+            with open(path, 'a'):
+                os.utime(path, ns=(version, version))
+        self.refresh(channels)
+
+    def refresh(self, channels=None):
+        """Перечитывает версии каналов и будит ждущих, если что-то
+        изменилось."""
+        with self.condition:
+            changed = False
+            for channel in channels or list(self.watched):
+                if channel not in self.watched:
+                    continue
+                version = self.read(channel)
+                if self.versions.get(channel) != version:
+                    self.versions[channel] = version
+                    changed = True
+            if changed:
+                self.condition.notify_all()
+
+    def poll(self):
+        while True:
+            time.sleep(settings.SSE_POLL_INTERVAL)
+            self.refresh()
+
+    @contextmanager
+    def watch(self, channels):
+        """Подписка на каналы; отдаёт их текущие версии."""
+        with self.condition:
+            for channel in channels:
+                if not self.watched[channel]:
+                    self.versions[channel] = self.read(channel)
+                self.watched[channel] += 1
+            if self.poller is None:
+                self.poller = threading.Thread(
+                    target=self.poll, name='broadcast-poller', daemon=True)
+                self.poller.start()
+            known = {channel: self.versions[channel] for channel in channels}
+        try:
+            yield known
+        finally:
+            with self.condition:
+                self.watched.subtract(channels)
+                for channel in channels:
+                    if self.watched[channel] <= 0:
+                        del self.watched[channel]
+                        self.versions.pop(channel, None)
+
+    def wait(self, known, timeout):
+        """Ждёт, пока версия хоть одного канала уйдёт от known."""
+        def current():
+            return {channel: self.versions.get(channel, version)
+                    for channel, version in known.items()}
+
+        with self.condition:
+            self.condition.wait_for(lambda: current() != known, timeout)
+            return current()
+
+
+broadcaster = Broadcaster()
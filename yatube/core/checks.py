@@ -0,0 +1,37 @@
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    """Буфер просмотров и другие общие данные живут в кэше.
+
+    Кэш в памяти процесса у каждого воркера свой, поэтому в
+    production нужен общий бэкенд.
+    """
+    if settings.CACHES['default']['BACKEND'] not in LOCAL_CACHES:
+        return []
+    return [Error(
+        'Кэш default не общий для процессов',
+        hint='Укажите в CACHES memcached или другой общий бэкенд',
+        id='core.E001',
+    )]
+
+
+@register(Tags.caches)
+def check_querycache_cache(app_configs, **kwargs):
+    """Версии таблиц кэша запросов должны быть видны всем процессам,
+    иначе запись в одном воркере не сбросит кэш других."""
+    if (not settings.QUERYCACHE_ENABLED
+            or settings.CACHES['default']['BACKEND'] not in LOCAL_CACHES):
+        return []
+    return [Error(
+        'QUERYCACHE_ENABLED требует общего кэша default',
+        hint='Укажите в CACHES memcached или выключите QUERYCACHE_ENABLED',
+        id='core.E002',
+    )]
@@ -0,0 +1,143 @@
+import pickle
+import zlib
+from functools import lru_cache
+
+from django.apps import apps
+from django.conf import settings
+from django.db.models import FileField
+
+PLAIN = b'p'
+COMPRESSED = b'z'
+
+
+@lru_cache(maxsize=None)
+def layout(label):
+    """Модель, имена её полей в базе, позиции файловых полей и
+    контрольная сумма имён."""
+    model = apps.get_model(label)
+    fields = model._meta.concrete_fields
+    names = [field.attname for field in fields]
+    return (
+        model,
+        names,
+        [index for index, field in enumerate(fields)
+         if isinstance(field, FileField)],
+        zlib.crc32('\0'.join(names).encode()),
+    )
+
+
+class Record:
+    """Строка модели без _state: алиас базы, значения полей по порядку
+    и контрольная сумма имён полей, под которые они записаны."""
+
+    __slots__ = ('db', 'values', 'schema')
+    label = None
+
+    def __init__(self, db, values, schema):
+        self.db, self.values, self.schema = db, values, schema
+
+    def __reduce__(self):
+        return type(self), (self.db, self.values, self.schema)
+
+    @classmethod
+    def fits(cls, instance):
+        """Строку можно сжать без потерь: нет связей, аннотаций и
+        отложенных полей."""
+        model, names, _, _ = layout(cls.label)
+        return (type(instance) is model
+                and instance.__dict__.keys() - {'_state'} == set(names)
+                and not instance._state.fields_cache)
+
+    @classmethod
+    def from_instance(cls, instance):
+        _, names, files, schema = layout(cls.label)
+        values = [instance.__dict__[name] for name in names]
+        for index in files:
+            values[index] = getattr(values[index], 'name', values[index])
+        return cls(instance._state.db, tuple(values), schema)
+
+    def to_instance(self):
+        """Модель из значений; None, если с тех пор поменялись поля."""
+        model, names, _, schema = layout(self.label)
+        if schema != self.schema or len(names) != len(self.values):
+            return None
+        return model.from_db(self.db, names, self.values)
+
+
+class PostRecord(Record):
+    __slots__ = ()
+    label = 'posts.Post'
+
+
+class CommentRecord(Record):
+    __slots__ = ()
+    label = 'posts.Comment'
+
+
+class GroupRecord(Record):
+    __slots__ = ()
+    label = 'posts.Group'
+
+
+class UserRecord(Record):
+    __slots__ = ()
+    label = settings.AUTH_USER_MODEL
+
+
+RECORDS = {
+    record.label: record
+    for record in (PostRecord, CommentRecord, GroupRecord, UserRecord)
+}
+
+
+class Stale(Exception):
+    pass
+
+
+def record_for(instance):
+    meta = getattr(instance, '_meta', None)
+    record = meta and RECORDS.get(meta.label)
+    if record is None or not record.fits(instance):
+        return None
+    return record.from_instance(instance)
+
+
+def encode(value):
+    """Модели и списки моделей заменяются записями, остальное как есть.
+
+    Список сжимается, только если все его элементы помещаются в записи,
+    иначе он уходит в pickle целиком.
+    """
+    if isinstance(value, list):
+        records = [record_for(item) for item in value]
+        if None in records:
+            return value
+        return records
+    return record_for(value) or value
+
+
+def decode(value):
+    if isinstance(value, Record):
+        instance = value.to_instance()
+        if instance is None:
+            raise Stale
+        return instance
+    if isinstance(value, list) and value and isinstance(value[0], Record):
+        return [decode(item) for item in value]
+    return value
+
+
+def dumps(value):
+    data = pickle.dumps(encode(value), protocol=4)
+    if len(data) >= settings.CACHE_COMPRESS_THRESHOLD:
+        return COMPRESSED + zlib.compress(data)
+    return PLAIN + data
+
+
+def loads(data):
+    """Значение из dumps; Stale, если записи не подходят к моделям."""
+    if data[:1] == COMPRESSED:
+        data = zlib.decompress(data[1:])
+    else:
+        data = data[1:]
+    return decode(pickle.loads(data))
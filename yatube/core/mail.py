@@ -0,0 +1,149 @@
+import hashlib
+import logging
+import pickle
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import get_connection
+from django.core.mail.backends.base import BaseEmailBackend
+from django.db.models import F
+from django.utils import timezone
+from tasks.queue import enqueue
+
+from .models import OutboxMessage
+
+logger = logging.getLogger(__name__)
+
+SEND_TASK = 'core.send_outbox'
+
+
+def fingerprint(message):
+    parts = [message.from_email, message.subject, message.body]
+    parts += sorted(message.recipients())
+    parts += [content for content, _ in getattr(message, 'alternatives', ())]
+    return hashlib.sha256('\0'.join(parts).encode()).hexdigest()
+
+
+class OutboxEmailBackend(BaseEmailBackend):
+    """Складывает письма в исходящие и сразу возвращает управление.
+
+    Отправляет их фоновая задача core.send_outbox через
+    OUTBOX_EMAIL_BACKEND. Одинаковые письма в пределах
+    OUTBOX_DEDUP_WINDOW сохраняются один раз.
+    """
+
+    def send_messages(self, email_messages):
+        window = timezone.now() - timedelta(
+            seconds=settings.OUTBOX_DEDUP_WINDOW)
+        accepted = stored = 0
+        for message in email_messages:
+            if not message.recipients():
+                continue
+            accepted += 1
+            digest = fingerprint(message)
+            duplicate = OutboxMessage.objects.filter(
+                digest=digest, created__gte=window
+            ).exclude(status=OutboxMessage.FAILED).exists()
+            if duplicate:
+                continue
+            message.connection = None
+            OutboxMessage.objects.create(
+                digest=digest,
+                recipients=', '.join(message.recipients()),
+                subject=message.subject[:255],
+                data=pickle.dumps(message),
+            )
+            stored += 1
+        if stored:
+            enqueue(SEND_TASK, unique=True)
+        return accepted
+
+
+def claim_batch(size):
+    """Захватывает пачку писем для одного отправителя.
+
+    Захват продлевается на TASKS_VISIBILITY_TIMEOUT: если отправитель
+    умрёт, письма снова станут доступны после истечения срока.
+    """
+    now = timezone.now()
+    token = uuid.uuid4().hex
+    due = OutboxMessage.objects.filter(
+        status__in=(OutboxMessage.PENDING, OutboxMessage.SENDING),
+        send_after__lte=now,
+    )
+    ids = list(due.values_list('pk', flat=True)[:size])
+    due.filter(pk__in=ids).update(
+        status=OutboxMessage.SENDING,
+        claim=token,
+        attempts=F('attempts') + 1,
+        send_after=now + timedelta(seconds=settings.TASKS_VISIBILITY_TIMEOUT),
+    )
+    return list(OutboxMessage.objects.filter(claim=token))
+
+
+def fail(outgoing, error):
+    if outgoing.attempts >= settings.OUTBOX_MAX_ATTEMPTS:
+        OutboxMessage.objects.filter(pk=outgoing.pk).update(
+            status=OutboxMessage.FAILED, claim='', error=error)
+        return None
+    delay = settings.OUTBOX_RETRY_DELAY * 2 ** (outgoing.attempts - 1)
+    OutboxMessage.objects.filter(pk=outgoing.pk).update(
+        status=OutboxMessage.PENDING,
+        claim='',
+        error=error,
+        send_after=timezone.now() + timedelta(seconds=delay),
+    )
+    return delay
+
+
+def deliver(connection, batch):
+    sent = []
+    retry_in = None
+    for outgoing in batch:
+        try:
+            connection.send_messages([pickle.loads(outgoing.data)])
+        except Exception as error:
+            logger.warning('Письмо #%s не отправлено: %s', outgoing.pk, error)
+            delay = fail(outgoing, repr(error))
+            if delay is not None:
+                retry_in = min(delay, retry_in or delay)
+            continue
+        sent.append(outgoing.pk)
+    OutboxMessage.objects.filter(pk__in=sent).update(
+        status=OutboxMessage.SENT, claim='', sent=timezone.now())
+    return len(sent), retry_in
+
+
+def send_outbox(batch_size=None):
+    """Разбирает исходящие пачками через одно соединение."""
+    batch_size = batch_size or settings.OUTBOX_BATCH_SIZE
+    batch = claim_batch(batch_size)
+    if not batch:
+        return 0
+    connection = get_connection(settings.OUTBOX_EMAIL_BACKEND)
+    try:
+        connection.open()
+    except Exception as error:
+        logger.warning('Нет соединения для отправки писем: %s', error)
+        delays = [fail(outgoing, repr(error)) for outgoing in batch]
+        reschedule([delay for delay in delays if delay is not None])
+        return 0
+    total = 0
+    delays = []
+    try:
+        while batch:
+            sent, delay = deliver(connection, batch)
+            total += sent
+            if delay is not None:
+                delays.append(delay)
+            batch = claim_batch(batch_size)
+    finally:
+        connection.close()
+    reschedule(delays)
+    return total
+
+
+def reschedule(delays):
+    if delays:
+        enqueue(SEND_TASK, countdown=min(delays), unique=True)
@@ -0,0 +1,70 @@
+import pickle
+import time
+import tracemalloc
+
+from core import codec
+from django.apps import apps
+from django.core.management.base import BaseCommand
+
+
+def best_time(function, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def peak_memory(function):
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает размер, время и память кодека кэша '
+            'с обычным pickle на строках из базы')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--count', type=int, default=1000,
+            help='Сколько строк каждой модели брать'
+        )
+        parser.add_argument(
+            '--repeat', type=int, default=5,
+            help='Сколько раз повторять замер времени'
+        )
+
+    def measure(self, rows, dumps, loads, repeat):
+        data = [dumps(row) for row in rows]
+        return (
+            sum(map(len, data)),
+            best_time(lambda: [dumps(row) for row in rows], repeat),
+            best_time(lambda: [loads(item) for item in data], repeat),
+            peak_memory(lambda: [loads(item) for item in data]),
+        )
+
+    def handle(self, *args, **options):
+        codecs = {
+            'pickle': (pickle.dumps, pickle.loads),
+            'codec': (codec.dumps, codec.loads),
+        }
+        self.stdout.write(
+            f'{"модель":<16}{"формат":<8}{"байт":>12}'
+            f'{"dumps, мс":>12}{"loads, мс":>12}{"память, КБ":>12}')
+        for label in codec.RECORDS:
+            rows = list(apps.get_model(label).objects.order_by('-pk')
+                        [:options['count']])
+            if not rows:
+                continue
+            for name, (dumps, loads) in codecs.items():
+                size, dumped, loaded, memory = self.measure(
+                    rows, dumps, loads, options['repeat'])
+                self.stdout.write(
+                    f'{label:<16}{name:<8}{size:>12}'
+                    f'{dumped * 1000:>12.1f}{loaded * 1000:>12.1f}'
+                    f'{memory / 1024:>12.1f}')
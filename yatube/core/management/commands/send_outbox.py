@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from core import mail
+
+
+class Command(BaseCommand):
+    help = 'Отправляет накопившиеся исходящие письма'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=None,
+            help='Сколько писем отправлять за одну пачку'
+        )
+
+    def handle(self, *args, **options):
+        sent = mail.send_outbox(options['batch_size'])
+        self.stdout.write(f'Отправлено писем: {sent}')
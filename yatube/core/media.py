@@ -0,0 +1,148 @@
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import (FileResponse, Http404, HttpResponse,
+                         StreamingHttpResponse)
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, parse_http_date_safe
+
+HASHED_NAME = re.compile(r'(?:^|/)[0-9a-f]{32,}\.\w+$')
+RANGE = re.compile(r'bytes=(\d*)-(\d*)$')
+BLOCK_SIZE = 64 * 1024
+ENCODED_TYPES = {
+    'bzip2': 'application/x-bzip',
+    'gzip': 'application/gzip',
+    'xz': 'application/x-xz',
+}
+
+
+def media_path(request, path):
+    """Полный путь к файлу и его публичность, если запрос вправе его
+    получить.
+
+    Публичные каталоги MEDIA_PUBLIC_DIRS доступны всем, остальное —
+    только персоналу; чужим запросам отвечаем 404, а не 403.
+    """
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except ValueError:
+        raise Http404
+    relative = os.path.relpath(full_path, settings.MEDIA_ROOT)
+    public = relative.replace(os.sep, '/').startswith(
+        tuple(settings.MEDIA_PUBLIC_DIRS))
+    if not public and not request.user.is_staff:
+        raise Http404
+    if not os.path.isfile(full_path):
+        raise Http404
+    return full_path, public
+
+
+def content_type(full_path):
+    """Тип файла; сжатые файлы отдаются как архивы, а не как
+    содержимое с Content-Encoding."""
+    guessed, encoding = mimetypes.guess_type(full_path)
+    if encoding is not None:
+        return ENCODED_TYPES.get(encoding, 'application/octet-stream')
+    return guessed or 'application/octet-stream'
+
+
+def parse_range(header, size):
+    """Границы одного диапазона байт или None для всего файла.
+
+    Несколько диапазонов и непонятный заголовок дают весь файл,
+    диапазон за концом файла — ValueError.
+    """
+    match = RANGE.match(header or '')
+    if match is None or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if not first:
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError(header)
+    return start, end
+
+
+def file_range(full_path, start, length):
+    with open(full_path, 'rb') as file:
+        file.seek(start)
+        while length > 0:
+            chunk = file.read(min(BLOCK_SIZE, length))
+            if not chunk:
+                return
+            length -= len(chunk)
+            yield chunk
+
+
+def accel_response(path, full_path):
+    response = HttpResponse()
+    if settings.MEDIA_ACCEL == 'x-accel-redirect':
+        response['X-Accel-Redirect'] = (
+            settings.MEDIA_ACCEL_PREFIX + quote(path))
+    else:
+        response['X-Sendfile'] = full_path
+    return response
+
+
+def file_response(request, full_path, size, etag, last_modified):
+    """Ответ из Python: FileResponse для всего файла, 206 для Range."""
+    if_range = request.META.get('HTTP_IF_RANGE')
+    use_range = if_range is None or if_range == etag or (
+        parse_http_date_safe(if_range) == last_modified)
+    try:
+        bounds = use_range and parse_range(
+            request.META.get('HTTP_RANGE'), size)
+    except ValueError:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+    if not bounds:
+        return FileResponse(open(full_path, 'rb'))
+    start, end = bounds
+    response = StreamingHttpResponse(
+        file_range(full_path, start, end - start + 1), status=206)
+    response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    response['Content-Length'] = end - start + 1
+    return response
+
+
+def serve(request, path):
+    """Отдаёт файл из MEDIA_ROOT с учётом кэша и условных запросов.
+
+    При MEDIA_ACCEL сам файл отдаёт веб-сервер (X-Accel-Redirect
+    для nginx, X-Sendfile для Apache и lighttpd), иначе он читается
+    здесь же, с поддержкой Range.
+    """
+    full_path, public = media_path(request, path)
+    stat = os.stat(full_path)
+    etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+    last_modified = int(stat.st_mtime)
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified)
+    if response is None:
+        if settings.MEDIA_ACCEL:
+            response = accel_response(path, full_path)
+        else:
+            response = file_response(
+                request, full_path, stat.st_size, etag, last_modified)
+        response['Content-Type'] = content_type(full_path)
+        response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    if not public:
+        patch_cache_control(response, private=True, no_store=True)
+    elif HASHED_NAME.search(path):
+        patch_cache_control(
+            response, public=True, max_age=60 * 60 * 24 * 365,
+            immutable=True)
+    else:
+        patch_cache_control(
+            response, public=True, max_age=settings.MEDIA_CACHE_TIMEOUT)
+    return response
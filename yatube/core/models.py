@@ -0,0 +1,72 @@
+from django.db import models
+from django.utils import timezone
+
+
+class OutboxMessage(models.Model):
+    PENDING = 'pending'
+    SENDING = 'sending'
+    SENT = 'sent'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (PENDING, 'Ожидает отправки'),
+        (SENDING, 'Отправляется'),
+        (SENT, 'Отправлено'),
+        (FAILED, 'Ошибка'),
+    )
+
+    digest = models.CharField(
+        verbose_name='Отпечаток письма',
+        max_length=64,
+        db_index=True
+    )
+    recipients = models.TextField(verbose_name='Получатели')
+    subject = models.CharField(
+        verbose_name='Тема',
+        max_length=255,
+        blank=True
+    )
+    data = models.BinaryField(verbose_name='Письмо')
+    status = models.CharField(
+        verbose_name='Статус',
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default=PENDING
+    )
+    attempts = models.PositiveSmallIntegerField(
+        verbose_name='Попыток',
+        default=0
+    )
+    claim = models.CharField(
+        verbose_name='Метка отправителя',
+        max_length=32,
+        blank=True
+    )
+    send_after = models.DateTimeField(
+        verbose_name='Отправить после',
+        default=timezone.now
+    )
+    created = models.DateTimeField(
+        verbose_name='Дата создания',
+        auto_now_add=True
+    )
+    sent = models.DateTimeField(
+        verbose_name='Дата отправки',
+        null=True,
+        blank=True
+    )
+    error = models.TextField(
+        verbose_name='Ошибка',
+        blank=True
+    )
+
+    class Meta:
+        ordering = ('send_after', )
+        verbose_name = 'Исходящее письмо'
+        verbose_name_plural = 'Исходящие письма'
+        indexes = [models.Index(
+            fields=['status', 'send_after'],
+            name='outbox_pick_idx')
+        ]
+
+    def __str__(self):
+        return f'{self.subject} → {self.recipients}'
@@ -0,0 +1,191 @@
+import hashlib
+import time
+from collections import Counter
+
+from core import codec
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet, ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import Manager, QuerySet
+from django.db.models.expressions import RawSQL
+from django.db.models.signals import post_delete, post_save
+from django.db.models.sql import Query
+from django.db.models.sql.where import ExtraWhere
+
+VERSION_KEY = 'querycache:table:{}'
+RESULT_KEY = 'querycache:result:{}'
+
+tracked = {}
+hits = Counter()
+misses = Counter()
+
+
+def version_keys(tables):
+    return {VERSION_KEY.format(table): table for table in tables}
+
+
+def versions(tables):
+    """Текущие версии таблиц; пропавшие из кэша заводятся заново."""
+    keys = version_keys(tables)
+    found = cache.get_many(keys)
+    for key in keys.keys() - found.keys():
+        value = time.time_ns()
+        if not cache.add(key, value, None):
+            value = cache.get(key, value)
+        found[key] = value
+    return [found[key] for key in sorted(keys)]
+
+
+def bump(*tables, using=DEFAULT_DB_ALIAS):
+    """Новые версии таблиц после фиксации записи.
+
+    Раньше фиксации версию менять нельзя: другой процесс успел бы
+    закэшировать под новой версией ещё старые строки.
+    """
+    def set_versions():
+        now = time.time_ns()
+        cache.set_many({key: now for key in version_keys(tables)}, None)
+    transaction.on_commit(set_versions, using=using)
+
+
+def query_tables(query):
+    """Таблицы запроса вместе с подзапросами в условиях и аннотациях.
+
+    Сырой SQL может читать что угодно, поэтому вместо его таблиц
+    в ответ попадает None.
+    """
+    tables = {query.get_meta().db_table}
+    tables.update(join.table_name for join in query.alias_map.values())
+    nodes = [query.where, *query.annotations.values(),
+             *query.combined_queries]
+    while nodes:
+        node = nodes.pop()
+        if isinstance(node, (RawSQL, ExtraWhere)):
+            tables.add(None)
+            continue
+        inner = getattr(node, 'query', None) or getattr(
+            getattr(node, 'queryset', None), 'query', None)
+        if isinstance(node, Query) or isinstance(inner, Query):
+            tables.update(query_tables(inner or node))
+            continue
+        nodes.extend(getattr(node, 'children', ()))
+        if hasattr(node, 'get_source_expressions'):
+            nodes.extend(node.get_source_expressions())
+    return tables
+
+
+def result_key(queryset):
+    """Ключ результата по SQL, параметрам и версиям таблиц.
+
+    None — запрос кэшировать нельзя: он внутри транзакции и может
+    видеть её незафиксированные записи, берёт строки на запись или
+    читает, в том числе подзапросом, таблицу, изменения которой мы
+    не отслеживаем.
+    """
+    query = queryset.query
+    if (not settings.QUERYCACHE_ENABLED or query.select_for_update
+            or connections[queryset.db].in_atomic_block):
+        return None
+    if query.extra:
+        return None
+    tables = query_tables(query)
+    if not tables <= tracked.keys():
+        return None
+    try:
+        sql, params = query.get_compiler(queryset.db).as_sql()
+    except EmptyResultSet:
+        return None
+    parts = [queryset.db, queryset._iterable_class.__name__, sql,
+             repr(params), *map(str, versions(tables))]
+    digest = hashlib.md5('\0'.join(parts).encode()).hexdigest()
+    return RESULT_KEY.format(digest)
+
+
+class CachingQuerySet(QuerySet):
+    """QuerySet, который берёт строки из кэша, пока таблицы не менялись."""
+
+    def _fetch_all(self):
+        if self._result_cache is None:
+            key = result_key(self)
+            if key is not None:
+                label = self.model._meta.label
+                result = cache.get(key)
+                if result is not None:
+                    try:
+                        result = codec.loads(result)
+                    except codec.Stale:
+                        result = None
+                if result is None:
+                    misses[label] += 1
+                    result = list(self._iterable_class(self))
+                    cache.set(key, codec.dumps(result),
+                              settings.QUERYCACHE_TIMEOUT)
+                else:
+                    hits[label] += 1
+                self._result_cache = result
+        super()._fetch_all()
+
+    def _bump(self):
+        bump(self.model._meta.db_table, using=self.db)
+
+    def update(self, **kwargs):
+        rows = super().update(**kwargs)
+        self._bump()
+        return rows
+
+    update.alters_data = True
+
+    def bulk_create(self, *args, **kwargs):
+        objs = super().bulk_create(*args, **kwargs)
+        self._bump()
+        return objs
+
+    def delete(self):
+        deleted = super().delete()
+        self._bump()
+        return deleted
+
+    delete.alters_data = True
+    delete.queryset_only = True
+
+
+class CachingManager(Manager.from_queryset(CachingQuerySet)):
+    """Менеджер моделей из QUERYCACHE_MODELS.
+
+    Объявляется в самой модели, поэтому кэш получают и менеджеры
+    связей вроде author.posts, построенные от класса менеджера.
+    """
+
+
+def changed(sender, using=DEFAULT_DB_ALIAS, **kwargs):
+    bump(sender._meta.db_table, using=using)
+
+
+def install(model):
+    """Начинает кэшировать запросы модели и следить за её записями."""
+    if not isinstance(model._default_manager, CachingManager):
+        raise ImproperlyConfigured(
+            f'{model._meta.label}: менеджер по умолчанию не CachingManager')
+    tracked[model._meta.db_table] = model
+    post_save.connect(changed, sender=model, weak=False,
+                      dispatch_uid=f'querycache:{model._meta.label}')
+    post_delete.connect(changed, sender=model, weak=False,
+                        dispatch_uid=f'querycache:{model._meta.label}')
+
+
+def install_all():
+    for label in settings.QUERYCACHE_MODELS:
+        install(apps.get_model(label))
+
+
+def stats():
+    return {
+        label: {
+            'hits': hits[label],
+            'misses': misses[label],
+            'ratio': hits[label] / (hits[label] + misses[label]),
+        }
+        for label in hits.keys() | misses.keys()
+    }
@@ -0,0 +1,13 @@
+from tasks.queue import task
+
+from . import mail, thumbnails
+
+
+@task(name=mail.SEND_TASK, unique=True)
+def send_outbox():
+    mail.send_outbox()
+
+
+@task(name=thumbnails.MAKE_THUMBNAIL, unique=True)
+def make_thumbnail(name, storage, geometry_string, options):
+    thumbnails.make_thumbnail(name, storage, geometry_string, options)
@@ -0,0 +1,45 @@
+import shutil
+import tempfile
+import threading
+
+from django.test import SimpleTestCase, override_settings
+
+from ..broadcast import Broadcaster
+
+CHANNEL_DIR = tempfile.mkdtemp()
+
+
+@override_settings(SSE_CHANNEL_DIR=CHANNEL_DIR, SSE_POLL_INTERVAL=0.05)
+class BroadcasterTests(SimpleTestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(CHANNEL_DIR, ignore_errors=True)
+
+    def test_publish_wakes_waiter(self):
+        """publish будит ждущего только своего канала."""
+        broadcaster = Broadcaster()
+        with broadcaster.watch(['news']) as known:
+            self.assertEqual(broadcaster.wait(known, 0.01), known)
+            threading.Timer(
+                0.05, broadcaster.publish, args=('other', 'news')).start()
+            changed = broadcaster.wait(known, 5)
+        self.assertGreater(changed['news'], known['news'])
+        self.assertFalse(broadcaster.watched)
+
+    def test_other_process_is_seen_by_poller(self):
+        """Публикация другого процесса доходит через файл канала."""
+        broadcaster, other = Broadcaster(), Broadcaster()
+        with broadcaster.watch(['news']) as known:
+            other.publish('news')
+            changed = broadcaster.wait(known, 5)
+        self.assertNotEqual(changed, known)
+
+    def test_versions_grow_within_clock_tick(self):
+        """Частые публикации всё равно дают разные версии."""
+        broadcaster = Broadcaster()
+        versions = set()
+        for _ in range(5):
+            broadcaster.publish('news')
+            versions.add(broadcaster.read('news'))
+        self.assertEqual(len(versions), 5)
@@ -0,0 +1,74 @@
+import pickle
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from posts.models import Group, Post
+
+from .. import codec
+
+User = get_user_model()
+
+
+class CodecTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='Auth_user')
+        cls.group = Group.objects.create(title='test_group', slug='slug')
+        cls.post = Post.objects.create(
+            text='Тестовый пост', author=cls.user, group=cls.group,
+            image='posts/ab/abcdef.gif')
+
+    def test_roundtrip(self):
+        """Модель восстанавливается из записи со всеми полями."""
+        post = Post.objects.get(pk=self.post.pk)
+        restored = codec.loads(codec.dumps(post))
+        self.assertIsInstance(restored, Post)
+        self.assertFalse(restored._state.adding)
+        for field in Post._meta.concrete_fields:
+            self.assertEqual(
+                getattr(restored, field.attname),
+                getattr(post, field.attname))
+        self.assertEqual(restored.image.name, 'posts/ab/abcdef.gif')
+        self.assertEqual(codec.loads(codec.dumps(self.user)), self.user)
+
+    def test_smaller_than_pickle(self):
+        """Запись занимает меньше места, чем pickle модели."""
+        posts = list(Post.objects.all())
+        self.assertLess(
+            len(codec.dumps(posts)), len(pickle.dumps(posts)))
+        self.assertEqual(codec.dumps(posts)[:1], codec.PLAIN)
+
+    @override_settings(CACHE_COMPRESS_THRESHOLD=0)
+    def test_compression_above_threshold(self):
+        """Значения больше порога сжимаются."""
+        data = codec.dumps(self.group)
+        self.assertEqual(data[:1], codec.COMPRESSED)
+        self.assertEqual(codec.loads(data), self.group)
+
+    def test_related_rows_pickled_as_is(self):
+        """Строки с подгруженными связями не теряют их при кэшировании."""
+        posts = list(Post.objects.select_related('author'))
+        restored = codec.loads(codec.dumps(posts))
+        with self.assertNumQueries(0):
+            self.assertEqual(restored[0].author, self.user)
+        self.assertEqual(codec.loads(codec.dumps({'id': 1})), {'id': 1})
+
+    def test_stale_record(self):
+        """Запись под другой набор полей не превращается в модель,
+        даже если число полей совпадает."""
+        record = codec.record_for(self.group)
+        for stale in (
+            codec.GroupRecord('default', (1, 'title'), record.schema),
+            codec.GroupRecord('default', record.values, record.schema + 1),
+        ):
+            with self.assertRaises(codec.Stale):
+                codec.loads(codec.PLAIN + pickle.dumps(stale))
+
+    def test_benchmark_command(self):
+        """Команда замеряет pickle и кодек для каждой модели."""
+        out = StringIO()
+        call_command('bench_codec', count=10, repeat=1, stdout=out)
+        self.assertIn('posts.Post', out.getvalue())
+        self.assertIn('codec', out.getvalue())
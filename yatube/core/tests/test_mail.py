@@ -0,0 +1,172 @@
+import socket
+import socketserver
+import threading
+
+from django.contrib.auth import get_user_model
+from django.core.mail import EmailMessage, get_connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from tasks.models import Task
+from tasks.queue import run_pending
+
+from .. import mail
+from ..models import OutboxMessage
+
+User = get_user_model()
+
+OUTBOX_BACKEND = 'core.mail.OutboxEmailBackend'
+SMTP_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    """Минимальный SMTP-сервер: принимает письма и складывает их в список."""
+
+    def reply(self, line):
+        self.wfile.write(line.encode() + b'\r\n')
+
+    def handle(self):
+        self.server.connections += 1
+        self.reply('220 localhost SMTP')
+        data = None
+        for line in self.rfile:
+            if data is not None:
+                if line == b'.\r\n':
+                    self.server.messages.append(b''.join(data))
+                    data = None
+                    self.reply('250 OK')
+                else:
+                    data.append(line)
+                continue
+            command = line[:4].upper()
+            if command in (b'EHLO', b'HELO'):
+                self.reply('250 localhost')
+            elif command == b'DATA':
+                data = []
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+            elif command == b'QUIT':
+                self.reply('221 Bye')
+                break
+            else:
+                self.reply('250 OK')
+
+
+class SMTPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), SMTPHandler)
+        self.connections = 0
+        self.messages = []
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def make_message(number, to='reader@example.com'):
+    return EmailMessage(
+        subject=f'Письмо {number}',
+        body=f'Текст {number}',
+        from_email='yatube@example.com',
+        to=[to],
+    )
+
+
+class OutboxTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = SMTPServer()
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.server.connections = 0
+        self.server.messages.clear()
+        self.smtp = override_settings(
+            OUTBOX_EMAIL_BACKEND=SMTP_BACKEND,
+            EMAIL_HOST='127.0.0.1',
+            EMAIL_PORT=self.server.server_address[1],
+        )
+        self.smtp.enable()
+
+    def tearDown(self):
+        self.smtp.disable()
+
+    def send(self, *messages):
+        return get_connection(OUTBOX_BACKEND).send_messages(list(messages))
+
+    def test_backend_only_stores_message(self):
+        """Бэкенд сохраняет письмо в исходящие и ставит задачу отправки."""
+        self.assertEqual(self.send(make_message(1)), 1)
+        self.assertEqual(self.server.messages, [])
+        self.assertEqual(
+            OutboxMessage.objects.get().status, OutboxMessage.PENDING)
+        self.assertTrue(Task.objects.filter(name=mail.SEND_TASK).exists())
+
+    def test_batch_is_sent_over_one_connection(self):
+        """Пачка писем уходит через одно SMTP-соединение."""
+        self.send(*[make_message(number) for number in range(5)])
+        self.assertEqual(mail.send_outbox(batch_size=2), 5)
+        self.assertEqual(len(self.server.messages), 5)
+        self.assertEqual(self.server.connections, 1)
+        self.assertFalse(OutboxMessage.objects.exclude(
+            status=OutboxMessage.SENT).exists())
+
+    def test_duplicate_message_is_stored_once(self):
+        """Повторное одинаковое письмо не попадает в исходящие."""
+        self.send(make_message(1))
+        self.send(make_message(1))
+        self.send(make_message(1, to='other@example.com'))
+        self.assertEqual(OutboxMessage.objects.count(), 2)
+        mail.send_outbox()
+        self.assertEqual(len(self.server.messages), 2)
+
+    def test_unreachable_server_is_retried(self):
+        """При недоступном сервере письмо откладывается на повтор."""
+        self.send(make_message(1))
+        with override_settings(EMAIL_PORT=free_port()):
+            self.assertEqual(mail.send_outbox(), 0)
+        outgoing = OutboxMessage.objects.get()
+        self.assertEqual(outgoing.status, OutboxMessage.PENDING)
+        self.assertEqual(outgoing.attempts, 1)
+        self.assertEqual(mail.send_outbox(), 0)
+        outgoing.send_after = outgoing.created
+        outgoing.save()
+        self.assertEqual(mail.send_outbox(), 1)
+        self.assertEqual(len(self.server.messages), 1)
+
+    def test_new_mail_after_failed_send_goes_out_now(self):
+        """Новое письмо не ждёт отложенного повтора упавшей отправки."""
+        self.send(make_message(1))
+        with override_settings(EMAIL_PORT=free_port()):
+            run_pending()
+        self.assertEqual(len(self.server.messages), 0)
+        self.send(make_message(2))
+        run_pending()
+        self.assertEqual(len(self.server.messages), 1)
+        self.assertIn(b'2', self.server.messages[0])
+
+    @override_settings(EMAIL_BACKEND=OUTBOX_BACKEND)
+    def test_password_reset_goes_to_outbox(self):
+        """Письмо сброса пароля уходит в исходящие, а не на сервер."""
+        User.objects.create_user(
+            username='Auth_user', email='reader@example.com',
+            password='secret-password')
+        response = self.client.post(
+            reverse('users:password_reset'),
+            data={'email': 'reader@example.com'}
+        )
+        self.assertRedirects(response, reverse('password_reset_done'))
+        self.assertEqual(self.server.messages, [])
+        self.assertEqual(OutboxMessage.objects.count(), 1)
+        mail.send_outbox()
+        self.assertIn(b'reader@example.com', self.server.messages[0])
@@ -0,0 +1,103 @@
+import os
+import shutil
+import tempfile
+from http import HTTPStatus
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+HASHED = 'posts/ab/' + 'ab' * 32 + '.gif'
+CONTENT = bytes(range(256)) * 4
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class MediaTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        for name in (HASHED, 'posts/plain.gif', 'private/report.txt',
+                     'posts/archive.tar.gz'):
+            path = os.path.join(TEMP_MEDIA_ROOT, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as file:
+                file.write(CONTENT)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def get(self, name, **headers):
+        return self.client.get(
+            reverse('media', kwargs={'path': name}), **headers)
+
+    def test_full_file(self):
+        """Файл отдаётся целиком с типом и заголовками кэша."""
+        response = self.get(HASHED)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(b''.join(response.streaming_content), CONTENT)
+        self.assertEqual(response['Content-Type'], 'image/gif')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertNotIn('immutable', self.get(
+            'posts/plain.gif')['Cache-Control'])
+
+    def test_range(self):
+        """Range отдаёт часть файла, If-Range со старым ETag — весь."""
+        response = self.get(HASHED, HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, HTTPStatus.PARTIAL_CONTENT)
+        self.assertEqual(
+            b''.join(response.streaming_content), CONTENT[10:20])
+        self.assertEqual(
+            response['Content-Range'], f'bytes 10-19/{len(CONTENT)}')
+        suffix = self.get(HASHED, HTTP_RANGE='bytes=-5')
+        self.assertEqual(b''.join(suffix.streaming_content), CONTENT[-5:])
+        stale = self.get(
+            HASHED, HTTP_RANGE='bytes=10-19', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(stale.status_code, HTTPStatus.OK)
+        outside = self.get(HASHED, HTTP_RANGE=f'bytes={len(CONTENT)}-')
+        self.assertEqual(outside.status_code,
+                         HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE)
+
+    def test_conditional(self):
+        """Совпавший ETag или свежий If-Modified-Since дают 304."""
+        response = self.get(HASHED)
+        for headers in (
+            {'HTTP_IF_NONE_MATCH': response['ETag']},
+            {'HTTP_IF_MODIFIED_SINCE': response['Last-Modified']},
+        ):
+            with self.subTest(headers=headers):
+                self.assertEqual(self.get(HASHED, **headers).status_code,
+                                 HTTPStatus.NOT_MODIFIED)
+
+    @override_settings(MEDIA_ACCEL='x-accel-redirect')
+    def test_accel_redirect(self):
+        """С MEDIA_ACCEL файл отдаёт веб-сервер."""
+        response = self.get(HASHED)
+        self.assertEqual(response['X-Accel-Redirect'],
+                         settings.MEDIA_ACCEL_PREFIX + HASHED)
+        self.assertEqual(response.content, b'')
+
+    def test_private_and_missing_files(self):
+        """Непубличные файлы видит только персонал, выход из каталога — 404."""
+        for name in ('private/report.txt', 'posts/missing.gif',
+                     'posts/../private/report.txt'):
+            with self.subTest(name=name):
+                self.assertEqual(self.get(name).status_code,
+                                 HTTPStatus.NOT_FOUND)
+        staff = User.objects.create_user(username='staff', is_staff=True)
+        self.client.force_login(staff)
+        response = self.get('private/report.txt')
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertIn('private', response['Cache-Control'])
+        self.assertNotIn('public', response['Cache-Control'])
+
+    def test_range_of_compressed_file_has_type(self):
+        """У части сжатого файла тоже есть тип содержимого."""
+        response = self.get('posts/archive.tar.gz', HTTP_RANGE='bytes=0-9')
+        self.assertEqual(response.status_code, HTTPStatus.PARTIAL_CONTENT)
+        self.assertEqual(response['Content-Type'], 'application/gzip')
@@ -0,0 +1,78 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.test import TransactionTestCase, override_settings
+from posts.models import Group, Post
+
+from .. import checks, querycache
+
+User = get_user_model()
+
+
+@override_settings(QUERYCACHE_ENABLED=True)
+class QueryCacheTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        querycache.hits.clear()
+        querycache.misses.clear()
+        self.user = User.objects.create_user(username='Auth_user')
+        self.group = Group.objects.create(title='test_group', slug='slug')
+
+    def test_repeated_query_is_served_from_cache(self):
+        """Повторный запрос не доходит до базы и считается попаданием."""
+        Group.objects.get(slug='slug')
+        with self.assertNumQueries(0):
+            self.assertEqual(Group.objects.get(slug='slug'), self.group)
+        self.assertEqual(
+            list(Group.objects.values_list('slug', flat=True)), ['slug'])
+        self.assertEqual(querycache.stats()['posts.Group'], {
+            'hits': 1, 'misses': 2, 'ratio': 1 / 3,
+        })
+
+    def test_writes_invalidate_table(self):
+        """Запись в таблицу делает прежние результаты недоступными."""
+        posts = self.user.posts.all()
+        self.assertEqual(list(posts.all()), [])
+        post = Post.objects.create(text='text', author=self.user)
+        self.assertEqual(list(posts.all()), [post])
+        Post.objects.filter(pk=post.pk).update(text='updated')
+        self.assertEqual(posts.all()[0].text, 'updated')
+        Group.objects.all().delete()
+        self.assertFalse(list(Group.objects.all()))
+
+    def test_not_cached_inside_transaction(self):
+        """Внутри транзакции запросы идут в базу."""
+        with transaction.atomic():
+            list(User.objects.filter(username='Auth_user'))
+            with self.assertNumQueries(1):
+                list(User.objects.filter(username='Auth_user'))
+
+    def test_subquery_tables_are_tracked(self):
+        """Подзапрос к таблице без кэша не кэшируется, к таблице
+        с кэшем — сбрасывается её записью."""
+        by_user = Post.objects.filter(
+            author__in=User.objects.filter(username='Auth_user'))
+        list(by_user.all())
+        with self.assertNumQueries(1):
+            list(by_user.all())
+        Post.objects.create(text='text', author=self.user, group=self.group)
+        by_group = Post.objects.filter(
+            group__in=Group.objects.filter(slug='slug'))
+        self.assertEqual(len(by_group.all()), 1)
+        with self.assertNumQueries(0):
+            list(by_group.all())
+        Group.objects.update(slug='other')
+        self.assertEqual(len(by_group.all()), 0)
+
+    def test_versions_bumped_after_commit(self):
+        """Версия таблицы меняется только после фиксации записи."""
+        before = querycache.versions(['posts_group'])
+        with transaction.atomic():
+            Group.objects.update(title='new_title')
+            self.assertEqual(querycache.versions(['posts_group']), before)
+        self.assertNotEqual(querycache.versions(['posts_group']), before)
+
+    def test_local_cache_is_rejected(self):
+        """Кэш запросов не включается поверх кэша в памяти процесса."""
+        [error] = checks.check_querycache_cache(None)
+        self.assertEqual(error.id, 'core.E002')
@@ -0,0 +1,69 @@
+import shutil
+import tempfile
+from io import BytesIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import TestCase, override_settings
+from PIL import Image
+from sorl.thumbnail import default, get_thumbnail
+from tasks.models import Task
+from tasks.queue import run_pending
+
+from .. import thumbnails
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        default.kvstore.forget()
+        self.names = []
+        for color in ('red', 'blue'):
+            buffer = BytesIO()
+            Image.new('RGB', (40, 20), color).save(buffer, 'PNG')
+            self.names.append(default_storage.save(
+                f'posts/{color}.png', ContentFile(buffer.getvalue())))
+
+    def tearDown(self):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_missing_thumbnail_is_queued(self):
+        """Без миниатюры отдаётся исходник, а генерация идёт в очередь."""
+        image = get_thumbnail(self.names[0], '10x10', crop='center')
+        self.assertEqual(image.name, self.names[0])
+        with self.assertNumQueries(1):
+            get_thumbnail(self.names[0], '10x10', crop='center')
+        self.assertEqual(Task.objects.filter(
+            name=thumbnails.MAKE_THUMBNAIL).count(), 1)
+        run_pending()
+        thumbnail = get_thumbnail(self.names[0], '10x10', crop='center')
+        self.assertTrue(thumbnail.name.startswith('cache/'))
+        self.assertTrue(default_storage.exists(thumbnail.name))
+
+    def test_worker_thumbnail_seen_by_other_processes(self):
+        """Метаданные из воркера видны процессу с пустым кэшем."""
+        get_thumbnail(self.names[0], '10x10')
+        run_pending()
+        cache.clear()
+        default.kvstore.forget()
+        self.assertNotEqual(
+            get_thumbnail(self.names[0], '10x10').name, self.names[0])
+
+    def test_prefetch_reads_page_at_once(self):
+        """После prefetch миниатюры страницы берутся без запросов."""
+        for name in self.names:
+            get_thumbnail(name, '10x10')
+        run_pending()
+        cache.clear()
+        default.kvstore.forget()
+        with self.assertNumQueries(1):
+            thumbnails.prefetch(self.names, '10x10')
+        cache.clear()
+        with self.assertNumQueries(0):
+            for name in self.names:
+                self.assertNotEqual(get_thumbnail(name, '10x10').name, name)
@@ -0,0 +1,159 @@
+import threading
+from contextlib import contextmanager
+
+from django.core.cache import cache
+from django.core.signals import request_finished
+from sorl.thumbnail import default
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import settings
+from sorl.thumbnail.helpers import get_module_class
+from sorl.thumbnail.images import ImageFile
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import KVStore
+from sorl.thumbnail.models import KVStore as KVStoreModel
+from tasks.queue import enqueue
+
+MAKE_THUMBNAIL = 'core.make_thumbnail'
+PENDING_KEY = 'thumbnail_pending:{}'
+
+
+class Probe(Exception):
+    def __init__(self, image_file):
+        super().__init__(image_file.name)
+        self.image_file = image_file
+
+
+class CachedDBKVStore(KVStore):
+    """Хранилище sorl «кэш + база» с чтением целой страницы разом.
+
+    Запись идёт в базу, поэтому метаданные, записанные воркером,
+    видны всем процессам. В отличие от sorl промах в кэше не
+    запоминается: иначе процесс до истечения THUMBNAIL_CACHE_TIMEOUT
+    не узнал бы о миниатюре, построенной в другом процессе.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.local = threading.local()
+        request_finished.connect(self.forget, weak=False)
+
+    @property
+    def prefetched(self):
+        if not hasattr(self.local, 'values'):
+            self.local.values = {}
+        return self.local.values
+
+    def forget(self, **kwargs):
+        self.local.values = {}
+
+    @contextmanager
+    def probing(self):
+        """get бросает Probe с файлом, не заглядывая в хранилище."""
+        self.local.probing = True
+        try:
+            yield
+        finally:
+            self.local.probing = False
+
+    def get(self, image_file):
+        if getattr(self.local, 'probing', False):
+            raise Probe(image_file)
+        return super().get(image_file)
+
+    def prefetch(self, image_files):
+        """Кэш одним get_many, промахи — одним запросом к базе."""
+        keys = [add_prefix(image_file.key, 'image')
+                for image_file in image_files]
+        found = self.cache.get_many(keys)
+        missing = [key for key in keys if key not in found]
+        if missing:
+            stored = dict(KVStoreModel.objects.filter(
+                key__in=missing).values_list('key', 'value'))
+            self.cache.set_many(stored, settings.THUMBNAIL_CACHE_TIMEOUT)
+            found.update(stored)
+        for key in keys:
+            self.prefetched[key] = found.get(key)
+
+    def _get_raw(self, key):
+        if key in self.prefetched:
+            return self.prefetched[key]
+        value = self.cache.get(key)
+        if value is None:
+            value = KVStoreModel.objects.filter(
+                key=key).values_list('value', flat=True).first()
+            if value is not None:
+                self.cache.set(key, value, settings.THUMBNAIL_CACHE_TIMEOUT)
+        return value
+
+    def _set_raw(self, key, value):
+        self.prefetched.pop(key, None)
+        super()._set_raw(key, value)
+
+    def _delete_raw(self, *keys):
+        for key in keys:
+            self.prefetched.pop(key, None)
+        super()._delete_raw(*keys)
+
+
+class QueuedThumbnailBackend(ThumbnailBackend):
+    """Не строит миниатюру во время запроса.
+
+    Если миниатюры нет в хранилище метаданных, её генерация ставится
+    в очередь задач, а шаблон пока получает исходную картинку.
+    """
+
+    def thumbnail_file(self, file_, geometry_string, options):
+        """Файл миниатюры с именем, которое дал бы ей сам sorl.
+
+        Имя считает штатный get_thumbnail: хранилище в режиме probing
+        прерывает его на первом же обращении за метаданными.
+        """
+        with default.kvstore.probing():
+            try:
+                super().get_thumbnail(file_, geometry_string, **options)
+            except Probe as probe:
+                return probe.image_file
+        raise RuntimeError('get_thumbnail не обратился к хранилищу')
+
+    def get_thumbnail(self, file_, geometry_string, **options):
+        if not file_:
+            raise ValueError('falsey file_ argument in get_thumbnail()')
+        thumbnail = self.thumbnail_file(file_, geometry_string, options)
+        cached = default.kvstore.get(thumbnail)
+        if cached:
+            return cached
+        source = ImageFile(file_)
+        if cache.add(PENDING_KEY.format(thumbnail.key), True,
+                     settings.THUMBNAIL_PENDING_TIMEOUT):
+            enqueue(MAKE_THUMBNAIL, args=(
+                source.name, source.serialize_storage(), geometry_string,
+                options
+            ), unique=True)
+        return source
+
+
+def make_thumbnail(name, storage, geometry_string, options):
+    source = ImageFile(name, get_module_class(storage)())
+    return ThumbnailBackend().get_thumbnail(
+        source, geometry_string, **options)
+
+
+def prefetch(files, geometry_string, **options):
+    """Загружает метаданные миниатюр для всех файлов разом."""
+    backend, kvstore = default.backend, default.kvstore
+    if not hasattr(backend, 'thumbnail_file') or not hasattr(
+            kvstore, 'prefetch'):
+        return
+    kvstore.prefetch(
+        backend.thumbnail_file(file_, geometry_string, dict(options))
+        for file_ in files if file_
+    )
+
+
+def is_ready(file_, geometry_string, **options):
+    """Есть ли уже миниатюра; после prefetch — без обращения к кэшу."""
+    backend = default.backend
+    if not hasattr(backend, 'thumbnail_file'):
+        return True
+    thumbnail = backend.thumbnail_file(file_, geometry_string, options)
+    return default.kvstore.get(thumbnail) is not None
@@ -1,4 +1,10 @@
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import JsonResponse
 from django.shortcuts import render
+from django.views.decorators.http import require_safe
+
+from . import media as media_files
+from . import querycache
 
 
 def page_not_found(request, exception):
@@ -15,3 +21,13 @@ def permission_denied(request, exception):
 
 def csrf_failure(request, reason=''):
     return render(request, 'core/403csrf.html')
+
+
+@require_safe
+def media(request, path):
+    return media_files.serve(request, path)
+
+
+@staff_member_required
+def querycache_stats(request):
+    return JsonResponse(querycache.stats())
@@ -1,15 +1,25 @@
 from django.contrib import admin
 
-from .models import Group, Post
+from .models import DeletionJob, Group, Post
+from .tasks import delete_in_background
+
+
+def delete_later(modeladmin, request, queryset):
+    for obj in queryset:
+        delete_in_background(obj)
+
+
+delete_later.short_description = 'Скрыть и удалить в фоне'
 
 
 @admin.register(Post)
 class PostAdmin(admin.ModelAdmin):
-    list_display = ('pk', 'text', 'pub_date', 'author', 'group')
+    list_display = ('pk', 'text', 'pub_date', 'author', 'group', 'views')
     list_editable = ('group',)
     search_fields = ('text',)
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
+    actions = (delete_later,)
 
 
 @admin.register(Group)
@@ -17,3 +27,17 @@ class GroupAdmin(admin.ModelAdmin):
     list_display = ('title', 'slug')
     search_fields = ('title',)
     list_filter = ('slug',)
+    actions = (delete_later,)
+
+
+@admin.register(DeletionJob)
+class DeletionJobAdmin(admin.ModelAdmin):
+    list_display = ('label', 'kind', 'status', 'progress', 'done', 'total',
+                    'created', 'finished')
+    list_filter = ('status', 'kind')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,47 @@
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from sorl.thumbnail import default
+from sorl.thumbnail.images import ImageFile
+
+from .models import ImageBlob
+from .storage import blob_digest, image_storage
+
+
+def acquire(name):
+    """Добавляет ссылку на файл картинки, заводя его учёт при первой."""
+    digest = blob_digest(name)
+    if digest is None:
+        return
+    blobs = ImageBlob.objects.filter(digest=digest)
+    if blobs.update(refs=F('refs') + 1):
+        return
+    try:
+        with transaction.atomic():
+            ImageBlob.objects.create(digest=digest, name=name, refs=1)
+    except IntegrityError:
+        blobs.update(refs=F('refs') + 1)
+
+
+def release(name):
+    """Снимает ссылку; возвращает digest, если ссылок не осталось."""
+    digest = blob_digest(name)
+    if digest is None:
+        return None
+    ImageBlob.objects.filter(
+        digest=digest, refs__gt=0).update(refs=F('refs') - 1)
+    if ImageBlob.objects.filter(digest=digest, refs=0).exists():
+        return digest
+    return None
+
+
+def purge(digest):
+    """Удаляет файл без ссылок вместе с его миниатюрами."""
+    with transaction.atomic():
+        blob = ImageBlob.objects.select_for_update().filter(
+            digest=digest, refs=0).first()
+        if blob is None:
+            return False
+        default.kvstore.delete(ImageFile(blob.name, image_storage))
+        image_storage.delete(blob.name)
+        blob.delete()
+    return True
@@ -0,0 +1,48 @@
+from core import thumbnails
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+
+from . import stamps
+
+CARD_KEY = 'post_card:{}:{}:{}:{}'
+CARD_THUMBNAIL = ('960x339', {'crop': 'center', 'upscale': True})
+VARIANTS = {
+    'card': 'posts/post_card_body.html',
+}
+
+
+def card_key(post, variant, author_stamp):
+    return CARD_KEY.format(
+        variant, post.pk, post.updated_at.timestamp(), author_stamp)
+
+
+def attach_cards(posts, variant='card'):
+    """Проставляет постам card_html из кэша, дорисовывая промахи.
+
+    Вся страница читается одним get_many. В ключ входит метка
+    автора: карточка показывает его имя. Карточка с миниатюрой,
+    которая ещё генерируется, не кэшируется, иначе в ней надолго
+    осталась бы ссылка на исходную картинку.
+    """
+    posts = list(posts)
+    authors = stamps.stamp_many(
+        {stamps.user_scope(post.author_id) for post in posts})
+    keys = {
+        post.pk: card_key(
+            post, variant, authors[stamps.user_scope(post.author_id)])
+        for post in posts
+    }
+    cached = cache.get_many(keys.values())
+    missed = {}
+    geometry, options = CARD_THUMBNAIL
+    for post in posts:
+        post.card_html = cached.get(keys[post.pk])
+        if post.card_html is not None:
+            continue
+        post.card_html = render_to_string(VARIANTS[variant], {'post': post})
+        if not post.image or thumbnails.is_ready(
+                post.image, geometry, **options):
+            missed[keys[post.pk]] = post.card_html
+    cache.set_many(missed, settings.POST_CARD_CACHE_TIMEOUT)
+    return posts
@@ -0,0 +1,102 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Case, F, When
+
+from . import trending
+from .models import Post
+
+VIEWS_KEY = 'post_views:{}:{}'
+LOG_KEY = 'post_views:{}:log:{}'
+LOG_SIZE_KEY = 'post_views:{}:size'
+FLUSHED_KEY = 'post_views:flushed'
+
+
+def current_bucket():
+    return int(time.time() // settings.POST_VIEWS_FLUSH_INTERVAL)
+
+
+class ViewCounter:
+    """Копит просмотры постов в общем кэше.
+
+    Просмотры считаются через cache.incr в корзинах по
+    POST_VIEWS_FLUSH_INTERVAL секунд, поэтому переживают падение
+    процесса и видны всем воркерам. Первый просмотр поста в корзине
+    дописывает его id в журнал корзины. Закрытые корзины сбрасывает
+    в базу периодическая задача или команда flush_views.
+    """
+
+    def hit(self, post_id):
+        bucket = current_bucket()
+        key = VIEWS_KEY.format(bucket, post_id)
+        timeout = settings.POST_VIEWS_BUFFER_TIMEOUT
+        while True:
+            if cache.add(key, 1, timeout):
+                self.log(bucket, post_id)
+                return
+            try:
+                cache.incr(key)
+                return
+            except ValueError:
+                continue
+
+    def log(self, bucket, post_id):
+        timeout = settings.POST_VIEWS_BUFFER_TIMEOUT
+        size_key = LOG_SIZE_KEY.format(bucket)
+        cache.add(size_key, 0, timeout)
+        position = cache.incr(size_key)
+        cache.set(LOG_KEY.format(bucket, position), post_id, timeout)
+
+    def count(self, post):
+        """Просмотры из базы и ещё не сброшенных последних корзин."""
+        bucket = current_bucket()
+        keys = [VIEWS_KEY.format(number, post.pk)
+                for number in range(bucket - 2, bucket + 1)]
+        return post.views + sum(cache.get_many(keys).values())
+
+    def flush(self):
+        """Сбрасывает в базу закрытые корзины, начиная с несброшенной.
+
+        Текущая и предыдущая корзины ещё могут получать просмотры,
+        поэтому не трогаются. Корзины старше времени жизни ключей
+        уже пропали из кэша и тоже пропускаются.
+        """
+        closed = current_bucket() - 2
+        oldest = closed - (settings.POST_VIEWS_BUFFER_TIMEOUT
+                           // settings.POST_VIEWS_FLUSH_INTERVAL)
+        last = cache.get(FLUSHED_KEY)
+        start = oldest if last is None else max(last + 1, oldest)
+        flushed = 0
+        for bucket in range(start, closed + 1):
+            flushed += self.flush_bucket(bucket)
+            cache.set(FLUSHED_KEY, bucket, None)
+        return flushed
+
+    def flush_bucket(self, bucket):
+        size = cache.get(LOG_SIZE_KEY.format(bucket)) or 0
+        batch = settings.POST_VIEWS_BATCH_SIZE
+        flushed = 0
+        for start in range(1, size + 1, batch):
+            log_keys = [LOG_KEY.format(bucket, position)
+                        for position in range(start, start + batch)]
+            view_keys = {
+                VIEWS_KEY.format(bucket, pk): pk
+                for pk in cache.get_many(log_keys).values()
+            }
+            hits = {view_keys[key]: count
+                    for key, count in cache.get_many(view_keys).items()}
+            if hits:
+                Post.objects.filter(pk__in=hits).update(views=Case(
+                    *[When(pk=pk, then=F('views') + count)
+                      for pk, count in hits.items()],
+                    default=F('views'),
+                ))
+                trending.touch(post_id__in=hits)
+            cache.delete_many([*log_keys, *view_keys])
+            flushed += len(hits)
+        cache.delete(LOG_SIZE_KEY.format(bucket))
+        return flushed
+
+
+view_counter = ViewCounter()
@@ -0,0 +1,146 @@
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import feedcache, follows, stamps
+from .models import DeletionJob, Group, Post, User
+
+MODELS = {
+    DeletionJob.USER: User,
+    DeletionJob.GROUP: Group,
+    DeletionJob.POST: Post,
+}
+KINDS = {model: kind for kind, model in MODELS.items()}
+
+
+def relations(model):
+    """Обратные связи, которые удаление модели каскадно меняет."""
+    return [
+        relation for relation in model._meta.related_objects
+        if not relation.many_to_many
+        and relation.on_delete in (models.CASCADE, models.SET_NULL)
+    ]
+
+
+def dependents(obj, relation):
+    return relation.related_model._default_manager.filter(
+        **{relation.field.name: obj})
+
+
+def forget_lists(*scopes):
+    stamps.bump(*(stamps.list_scope(scope) for scope in scopes))
+
+
+def hide(obj):
+    """Прячет объект сразу: пост и группу флагом hidden, пользователя
+    через is_active. Сохранение сбрасывает строку из кэша, а новые
+    метки списков убирают посты из закэшированных id лент."""
+    if isinstance(obj, User):
+        obj.is_active = False
+        obj.save(update_fields=['is_active'])
+        slugs = Group.objects.filter(posts__author=obj).values_list(
+            'slug', flat=True).distinct()
+        forget_lists(stamps.GLOBAL, stamps.author_scope(obj.username),
+                     *map(stamps.group_scope, slugs))
+        follows.fan_out(obj.pk)
+    elif isinstance(obj, Group):
+        obj.hidden = True
+        obj.save(update_fields=['hidden'])
+        forget_lists(stamps.group_scope(obj.slug))
+    else:
+        obj.hidden = True
+        obj.save(update_fields=['hidden'])
+        forget_lists(*stamps.post_scopes(obj))
+        follows.fan_out(obj.author_id)
+
+
+def start(obj):
+    """Прячет объект и заводит задание на его удаление пачками."""
+    with transaction.atomic():
+        hide(obj)
+        return DeletionJob.objects.create(
+            kind=KINDS[type(obj)],
+            object_id=obj.pk,
+            label=str(obj)[:200],
+            total=1 + sum(
+                dependents(obj, relation).count()
+                for relation in relations(type(obj))),
+        )
+
+
+def detach_posts(group, ids):
+    """SET_NULL пачкой UPDATE не шлёт сигналов: сбрасываем кэш сами."""
+    feedcache.forget(Post, *ids)
+    scope = stamps.group_scope(group.slug)
+    stamps.bump(scope, stamps.list_scope(scope))
+
+
+def clear_batch(relation, ids):
+    """Пачка строк ids связи relation; у удаляемых строк сначала их
+    собственные зависимые.
+
+    Так удаление пачки постов пользователя не тянет за собой
+    неограниченный каскад комментариев и лайков. Возвращает False,
+    если в этот раз обработаны только вложенные зависимые.
+    """
+    model = relation.related_model
+    batch = model._default_manager.filter(pk__in=ids)
+    if relation.on_delete is models.SET_NULL:
+        batch.update(**{relation.field.name: None})
+        return True
+    for nested in relations(model):
+        nested_ids = list(nested.related_model._default_manager.filter(
+            **{f'{nested.field.name}__in': ids}).values_list(
+            'pk', flat=True)[:settings.DELETION_BATCH_SIZE])
+        if nested_ids:
+            clear_batch(nested, nested_ids)
+            return False
+    batch.delete()
+    return True
+
+
+def fail(job_id, error):
+    """Отмечает задание упавшим; следующая удачная пачка вернёт
+    ему статус RUNNING."""
+    DeletionJob.objects.filter(pk=job_id).exclude(
+        status=DeletionJob.DONE).update(
+        status=DeletionJob.FAILED, error=error)
+
+
+def run_batch(job_id):
+    """Обрабатывает одну пачку зависимых строк задания.
+
+    Каждая пачка — отдельная короткая транзакция на
+    DELETION_BATCH_SIZE строк одной связи; у строк со своими
+    зависимыми сначала обрабатываются те. Сигналы удаления
+    срабатывают как обычно, так что картинки удалённых постов уходят
+    на очистку. Когда зависимых не остаётся, удаляется сам объект.
+    Возвращает True, если работа ещё осталась.
+    """
+    job = DeletionJob.objects.exclude(
+        status=DeletionJob.DONE).filter(pk=job_id).first()
+    if job is None:
+        return False
+    model = MODELS[job.kind]
+    obj = model._base_manager.filter(pk=job.object_id).first()
+    for relation in relations(model) if obj is not None else ():
+        ids = list(dependents(obj, relation).values_list(
+            'pk', flat=True)[:settings.DELETION_BATCH_SIZE])
+        if not ids:
+            continue
+        with transaction.atomic():
+            cleared = clear_batch(relation, ids)
+            DeletionJob.objects.filter(pk=job.pk).update(
+                status=DeletionJob.RUNNING,
+                done=F('done') + (len(ids) if cleared else 0), error='')
+        if cleared and relation.related_model is Post and model is Group:
+            detach_posts(obj, ids)
+        return True
+    with transaction.atomic():
+        if obj is not None:
+            obj.delete()
+        DeletionJob.objects.filter(pk=job.pk).update(
+            status=DeletionJob.DONE, done=F('total'),
+            finished=timezone.now(), error='')
+    return False
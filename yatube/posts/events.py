@@ -0,0 +1,42 @@
+import time
+
+from core.broadcast import broadcaster
+from django.conf import settings
+
+from . import feedcache
+
+
+def new_posts(scope, queryset, after):
+    """Сколько постов появилось в ленте выше поста after.
+
+    Считается по закэшированному списку id ленты, без запроса к
+    базе, пока список не поменялся.
+    """
+    ids = feedcache.feed_ids(scope, queryset).ids
+    return ids.index(after) if after in ids else 0
+
+
+def stream(channels, count):
+    """Поток событий SSE «N новых постов».
+
+    Событие уходит при каждом изменении числа, в паузах — комментарий
+    keepalive. Через SSE_MAX_DURATION поток закрывается, и EventSource
+    переподключается сам: воркер не занят одним клиентом бесконечно.
+    """
+    deadline = time.monotonic() + settings.SSE_MAX_DURATION
+    yield f'retry: {settings.SSE_RETRY}\n\n'
+    with broadcaster.watch(channels) as known:
+        last = None
+        while True:
+            value = count()
+            if value != last:
+                yield f'event: posts\ndata: {value}\n\n'
+                last = value
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            changed = broadcaster.wait(
+                known, min(remaining, settings.SSE_KEEPALIVE))
+            if changed == known:
+                yield ': keepalive\n\n'
+            known = changed
@@ -0,0 +1,138 @@
+from core import codec
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Paginator
+
+from . import stamps
+from .models import Group, Post, User
+
+IDS_KEY = 'feed_ids:{}:{}'
+USERNAME_KEY = 'user_pk:{}'
+OBJECT_KEYS = {
+    Post: 'post_obj:{}',
+    User: 'user_obj:{}',
+    Group: 'group_obj:{}',
+}
+
+
+class IdList:
+    """Упорядоченные id ленты для Paginator.
+
+    Первые FEED_ID_LIMIT id лежат в кэше, страницы глубже читаются
+    из базы тем же запросом.
+    """
+
+    def __init__(self, queryset, ids, total):
+        self.queryset, self.ids, self.total = queryset, ids, total
+
+    def __len__(self):
+        return self.total
+
+    def __getitem__(self, index):
+        complete = len(self.ids) == self.total
+        if complete or (index.stop or self.total) <= len(self.ids):
+            return self.ids[index]
+        return list(self.queryset.values_list('pk', flat=True)[index])
+
+
+def visible(queryset):
+    """Без скрытых постов и постов неактивных авторов."""
+    return queryset.filter(hidden=False, author__is_active=True)
+
+
+def feed_ids(scope, queryset):
+    queryset = visible(queryset)
+    key = IDS_KEY.format(scope, stamps.stamp(stamps.list_scope(scope)))
+    cached = cache.get(key)
+    if cached is None:
+        limit = settings.FEED_ID_LIMIT
+        ids = list(queryset.values_list('pk', flat=True)[:limit])
+        total = queryset.count() if len(ids) == limit else len(ids)
+        cached = (ids, total)
+        cache.set(key, cached, settings.FEED_CACHE_TIMEOUT)
+    return IdList(queryset, *cached)
+
+
+def fetch(wanted):
+    """Объекты по id из кэша строк, {модель: ids} -> {модель: {id: obj}}.
+
+    Все ключи читаются одним get_many, недостающие строки каждой
+    модели — одним запросом IN. В кэше строки лежат записями
+    core.codec, а не целыми моделями.
+    """
+    keys = {
+        OBJECT_KEYS[model].format(pk): (model, pk)
+        for model, ids in wanted.items() for pk in ids
+    }
+    cached = cache.get_many(keys)
+    found = {model: {} for model in wanted}
+    missing = {model: [] for model in wanted}
+    for key, (model, pk) in keys.items():
+        try:
+            found[model][pk] = codec.loads(cached[key])
+        except (KeyError, codec.Stale):
+            missing[model].append(pk)
+    loaded = {}
+    for model, ids in missing.items():
+        if ids:
+            rows = model.objects.in_bulk(ids)
+            found[model].update(rows)
+            loaded.update(
+                (OBJECT_KEYS[model].format(pk), codec.dumps(row))
+                for pk, row in rows.items())
+    cache.set_many(loaded, settings.OBJECT_CACHE_TIMEOUT)
+    return found
+
+
+def posts_by_ids(ids):
+    """Посты в порядке ids, с авторами и группами из кэша строк.
+
+    Скрытые посты и посты удаляемых авторов пропускаются, ссылка на
+    удаляемую группу убирается.
+    """
+    posts = fetch({Post: ids})[Post]
+    posts = [posts[pk] for pk in ids if pk in posts]
+    related = fetch({
+        User: {post.author_id for post in posts},
+        Group: {post.group_id for post in posts if post.group_id},
+    })
+    result = []
+    for post in posts:
+        author = related[User].get(post.author_id)
+        if post.hidden or author is None or not author.is_active:
+            continue
+        group = related[Group].get(post.group_id)
+        post.author = author
+        post.group = None if group is None or group.hidden else group
+        result.append(post)
+    return result
+
+
+def paginate(request, scope, queryset):
+    paginator = Paginator(feed_ids(scope, queryset), settings.MAX_POSTS)
+    page_obj = paginator.get_page(request.GET.get('page'))
+    page_obj.object_list = posts_by_ids(list(page_obj.object_list))
+    return page_obj
+
+
+def user_id(username):
+    """id пользователя по имени; None, если такого нет.
+
+    Имя сверяется со строкой из кэша строк, так что переименование
+    не отдаст чужой id.
+    """
+    key = USERNAME_KEY.format(username)
+    pk = cache.get(key)
+    if pk is not None:
+        user = fetch({User: [pk]})[User].get(pk)
+        if user is not None and user.username == username:
+            return pk
+    pk = User.objects.filter(
+        username=username).values_list('pk', flat=True).first()
+    if pk is not None:
+        cache.set(key, pk, settings.OBJECT_CACHE_TIMEOUT)
+    return pk
+
+
+def forget(model, *ids):
+    cache.delete_many([OBJECT_KEYS[model].format(pk) for pk in ids])
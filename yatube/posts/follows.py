@@ -0,0 +1,109 @@
+from itertools import islice
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from tasks.queue import enqueue
+
+from . import stamps
+from .models import Follow
+
+FOLLOWING_KEY = 'following:{}'
+FOLLOWERS_COUNT_KEY = 'followers_count:{}'
+BUMP_FOLLOWER_FEEDS = 'posts.bump_follower_feeds'
+
+
+def load_following(user_id):
+    following = set(Follow.objects.filter(
+        user_id=user_id).values_list('author_id', flat=True))
+    cache.set(FOLLOWING_KEY.format(user_id), following,
+              settings.FOLLOWS_CACHE_TIMEOUT)
+    return following
+
+
+def following_ids(user_id):
+    following = cache.get(FOLLOWING_KEY.format(user_id))
+    if following is None:
+        following = load_following(user_id)
+    return following
+
+
+def follower_count(author_id):
+    """Число подписчиков из кэша.
+
+    Самих подписчиков в кэше нет: у популярного автора их множество
+    не поместилось бы в один ключ.
+    """
+    key = FOLLOWERS_COUNT_KEY.format(author_id)
+    count = cache.get(key)
+    if count is None:
+        count = Follow.objects.filter(author_id=author_id).count()
+        cache.add(key, count, settings.FOLLOWS_CACHE_TIMEOUT)
+    return count
+
+
+def follower_ids(author_id):
+    return Follow.objects.filter(
+        author_id=author_id).order_by('user_id').values_list(
+        'user_id', flat=True)
+
+
+def bump_follower_lists(author_id):
+    """Сбрасывает списки id в лентах подписок всех подписчиков автора.
+
+    Подписчики читаются курсором и обновляются пачками по
+    FOLLOWS_FAN_OUT_BATCH_SIZE меток; вызывается из фоновой задачи.
+    """
+    user_ids = follower_ids(author_id).iterator()
+    while True:
+        batch = list(islice(user_ids, settings.FOLLOWS_FAN_OUT_BATCH_SIZE))
+        if not batch:
+            break
+        stamps.bump(*(stamps.list_scope(stamps.follower_scope(user_id))
+                      for user_id in batch))
+
+
+def fan_out(author_id):
+    """Ставит в очередь bump_follower_lists; одна задача на автора."""
+    enqueue(BUMP_FOLLOWER_FEEDS, args=(author_id,), unique=True)
+
+
+def is_following(user, author_id):
+    return user.is_authenticated and author_id in following_ids(user.pk)
+
+
+def changed(user_id, author_id, delta):
+    """Поправляет кэш на месте после появления (delta=1) или удаления
+    (delta=-1) подписки; вызывается из сигналов Follow."""
+    key = FOLLOWING_KEY.format(user_id)
+    following = cache.get(key)
+    if following is not None:
+        if delta > 0:
+            following.add(author_id)
+        else:
+            following.discard(author_id)
+        cache.set(key, following, settings.FOLLOWS_CACHE_TIMEOUT)
+    try:
+        cache.incr(FOLLOWERS_COUNT_KEY.format(author_id), delta)
+    except ValueError:
+        pass
+    stamps.bump(stamps.list_scope(stamps.follower_scope(user_id)))
+
+
+def follow(user_id, author_id):
+    """Подписка одним INSERT; False, если она уже была."""
+    if user_id == author_id:
+        return False
+    try:
+        with transaction.atomic():
+            Follow.objects.create(user_id=user_id, author_id=author_id)
+    except IntegrityError:
+        return False
+    return True
+
+
+def unfollow(user_id, author_id):
+    """Отписка; False, если подписки не было."""
+    deleted, _ = Follow.objects.filter(
+        user_id=user_id, author_id=author_id).delete()
+    return bool(deleted)
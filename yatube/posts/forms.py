@@ -1,4 +1,7 @@
 from django import forms
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.template.defaultfilters import filesizeformat
 
 from .models import Comment, Post
 
@@ -15,6 +18,36 @@ class PostForm(forms.ModelForm):
             'image': 'Картинка для поста',
         }
 
+    def __init__(self, *args, oversized=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        self.oversized = oversized
+
+    def clean_image(self):
+        """Ограничивает размер файла и число пикселей картинки.
+
+        Слишком большой файл обработчик загрузки не дочитывает и
+        передаёт имя поля в oversized. Размеры Pillow берёт из
+        заголовка, не декодируя картинку целиком.
+        """
+        image = self.cleaned_data['image']
+        limit = settings.FILE_UPLOAD_MAX_SIZE
+        if 'image' in self.oversized or (image and image.size > limit):
+            raise ValidationError(
+                'Файл больше %(limit)s',
+                code='file_too_large',
+                params={'limit': filesizeformat(limit)},
+            )
+        if not image or not hasattr(image, 'image'):
+            return image
+        width, height = image.image.size
+        if width * height > settings.POST_IMAGE_MAX_PIXELS:
+            raise ValidationError(
+                'Картинка больше %(limit)s пикселей',
+                code='too_many_pixels',
+                params={'limit': settings.POST_IMAGE_MAX_PIXELS},
+            )
+        return image
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
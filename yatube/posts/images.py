@@ -0,0 +1,53 @@
+import base64
+from io import BytesIO
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.utils import timezone
+from PIL import Image
+
+from . import feedcache
+from .models import Post
+
+
+def dimensions(file):
+    """Ширина и высота из заголовка, без декодирования картинки."""
+    file.seek(0)
+    try:
+        return Image.open(file).size
+    finally:
+        file.seek(0)
+
+
+def placeholder(file):
+    """Крошечная копия картинки как data URI для размытой заглушки.
+
+    draft просит JPEG-декодер сразу уменьшить картинку, так что
+    большие фотографии не раскрываются в память целиком.
+    """
+    size = settings.POST_PLACEHOLDER_SIZE
+    image = Image.open(file)
+    image.draft('RGB', (size, size))
+    image = image.convert('RGB')
+    image.thumbnail((size, size))
+    buffer = BytesIO()
+    image.save(buffer, 'PNG', optimize=True)
+    encoded = base64.b64encode(buffer.getvalue()).decode()
+    return f'data:image/png;base64,{encoded}'
+
+
+def fill_placeholder(post_id, name):
+    """Заполняет заглушку поста, беря готовую у копий той же картинки."""
+    value = Post.objects.filter(image=name).exclude(
+        image_placeholder='').values_list('image_placeholder', flat=True)
+    value = value.first()
+    if value is None:
+        try:
+            with Post._meta.get_field('image').storage.open(name) as file:
+                value = placeholder(file)
+        except (OSError, SuspiciousFileOperation):
+            return False
+    updated = Post.objects.filter(pk=post_id, image=name).update(
+        image_placeholder=value, updated_at=timezone.now())
+    feedcache.forget(Post, post_id)
+    return bool(updated)
@@ -0,0 +1,96 @@
+import random
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+
+from . import trending
+from .models import Like, LikeCounter
+
+LIKED_KEY = 'liked_posts:{}'
+
+
+def liked_post_ids(user):
+    """Множество id постов, отмеченных пользователем, из кэша."""
+    if not user.is_authenticated:
+        return set()
+    key = LIKED_KEY.format(user.pk)
+    liked = cache.get(key)
+    if liked is None:
+        liked = set(
+            Like.objects.filter(user=user).values_list('post_id', flat=True))
+        cache.set(key, liked, settings.LIKES_CACHE_TIMEOUT)
+    return liked
+
+
+def like_counts(post_ids):
+    return dict(
+        LikeCounter.objects.filter(post_id__in=post_ids)
+        .values_list('post_id').annotate(Sum('count')).order_by()
+    )
+
+
+def attach_likes(posts, user):
+    """Проставляет постам likes_total и liked.
+
+    Счётчики всей страницы читаются одним запросом, отметки
+    пользователя — одним обращением к кэшу.
+    """
+    posts = list(posts)
+    counts = like_counts([post.pk for post in posts])
+    liked = liked_post_ids(user)
+    for post in posts:
+        post.likes_total = counts.get(post.pk, 0)
+        post.liked = post.pk in liked
+    return posts
+
+
+def bump(post_id, delta):
+    """Меняет случайный шард счётчика, чтобы не упираться в одну строку."""
+    shard = random.randrange(settings.LIKE_COUNTER_SHARDS)
+    counter = LikeCounter.objects.filter(post_id=post_id, shard=shard)
+    if counter.update(count=F('count') + delta):
+        return
+    try:
+        with transaction.atomic():
+            LikeCounter.objects.create(
+                post_id=post_id, shard=shard, count=delta)
+    except IntegrityError:
+        counter.update(count=F('count') + delta)
+
+
+def drop(post_id):
+    """Снимает одну отметку с непустого шарда, не создавая новых строк.
+
+    Вызывается и при каскадном удалении поста, когда шарды уже удалены.
+    """
+    counters = LikeCounter.objects.filter(post_id=post_id, count__gt=0)
+    while True:
+        shard = counters.values_list('pk', flat=True).first()
+        if shard is None or counters.filter(pk=shard).update(
+                count=F('count') - 1):
+            return
+
+
+def forget(like_row):
+    """Сводит счётчик и кэши с удалённой отметкой."""
+    drop(like_row.post_id)
+    trending.touch(post_id=like_row.post_id)
+    cache.delete(LIKED_KEY.format(like_row.user_id))
+
+
+def like(user, post):
+    try:
+        with transaction.atomic():
+            Like.objects.create(user=user, post=post)
+    except IntegrityError:
+        return False
+    bump(post.pk, 1)
+    cache.delete(LIKED_KEY.format(user.pk))
+    return True
+
+
+def unlike(user, post):
+    deleted, _ = Like.objects.filter(user=user, post=post).delete()
+    return bool(deleted)
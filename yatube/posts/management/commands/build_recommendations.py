@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from posts import recommendations
+
+
+class Command(BaseCommand):
+    help = 'Полностью пересчитывает рекомендации авторов'
+
+    def handle(self, *args, **options):
+        refreshed = recommendations.rebuild()
+        self.stdout.write(f'Пересчитано пользователей: {refreshed}')
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from posts import sitemaps
+
+
+class Command(BaseCommand):
+    help = 'Обновляет карту сайта: изменившиеся шарды и индекс'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full', action='store_true',
+            help='Переписать все шарды, а не только изменившиеся'
+        )
+        parser.add_argument(
+            '--base-url',
+            help='Адрес сайта для ссылок, по умолчанию SITEMAP_BASE_URL'
+        )
+
+    def handle(self, *args, **options):
+        written = sitemaps.build(
+            full=options['full'], base_url=options['base_url'])
+        self.stdout.write(f'Переписано файлов: {len(written)}')
@@ -0,0 +1,45 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.template.defaultfilters import filesizeformat
+
+from posts import mediagc
+
+
+class Command(BaseCommand):
+    help = 'Удаляет файлы картинок постов, на которые нет ссылок'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только посчитать файлы и байты, ничего не трогая'
+        )
+        parser.add_argument(
+            '--quarantine', nargs='?', const=settings.MEDIA_QUARANTINE_ROOT,
+            help='Переносить файлы в каталог карантина вместо удаления'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=None,
+            help='Сколько файлов перепроверять и удалять за раз'
+        )
+        parser.add_argument(
+            '--min-age', type=int, default=None,
+            help='Не трогать файлы моложе стольких секунд'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            report = mediagc.collect(
+                dry_run=options['dry_run'],
+                target=options['quarantine'],
+                batch_size=options['batch_size'],
+                min_age=options['min_age'],
+            )
+        except mediagc.OrderError as error:
+            raise CommandError(
+                f'Порядок имён в базе не совпадает с Python: {error}')
+        action = 'можно освободить' if options['dry_run'] else 'освобождено'
+        self.stdout.write(f'Файлов без ссылок: {report.found}, '
+                          f'{action} {filesizeformat(report.reclaimed)}')
+        self.stdout.write(
+            f'Миниатюр без ссылок: {report.thumbnails}, '
+            f'{action} {filesizeformat(report.thumbnail_bytes)}')
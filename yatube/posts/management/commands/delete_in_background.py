@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.deletion import MODELS
+from posts.tasks import delete_in_background
+
+
+class Command(BaseCommand):
+    help = 'Скрывает объект и ставит его удаление пачками в очередь'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(MODELS))
+        parser.add_argument('ids', nargs='+', type=int)
+
+    def handle(self, *args, **options):
+        model = MODELS[options['kind']]
+        for pk in options['ids']:
+            obj = model._default_manager.filter(pk=pk).first()
+            if obj is None:
+                raise CommandError(f'Объект {pk} не найден')
+            job = delete_in_background(obj)
+            self.stdout.write(f'{job.label}: задание {job.pk}, '
+                              f'строк {job.total}')
@@ -0,0 +1,42 @@
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from posts import feedcache, images
+from posts.models import Post
+
+BATCH_SIZE = 200
+
+
+class Command(BaseCommand):
+    help = 'Заполняет размеры и заглушки картинок у старых постов'
+
+    def fill(self, post):
+        try:
+            with post.image.storage.open(post.image.name) as file:
+                post.image_width, post.image_height = images.dimensions(file)
+                if not post.image_placeholder:
+                    post.image_placeholder = images.placeholder(file)
+        except (OSError, SuspiciousFileOperation) as error:
+            self.stderr.write(f'Пост {post.pk}: {error}')
+            return False
+        post.updated_at = timezone.now()
+        return True
+
+    def handle(self, *args, **options):
+        rows = Post._base_manager.filter(
+            image_width__isnull=True).exclude(image='').only(
+            'pk', 'image', 'image_placeholder').order_by('pk')
+        filled, last = 0, 0
+        while True:
+            batch = list(rows.filter(pk__gt=last)[:BATCH_SIZE])
+            if not batch:
+                break
+            last = batch[-1].pk
+            batch = [post for post in batch if self.fill(post)]
+            Post._base_manager.bulk_update(batch, (
+                'image_width', 'image_height', 'image_placeholder',
+                'updated_at'))
+            feedcache.forget(Post, *(post.pk for post in batch))
+            filled += len(batch)
+        self.stdout.write(f'Заполнено постов: {filled}')
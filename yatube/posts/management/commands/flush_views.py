@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from tasks.queue import enqueue
+
+from posts.counters import view_counter
+from posts.tasks import FLUSH_POST_VIEWS
+
+
+class Command(BaseCommand):
+    help = 'Сохраняет в базу просмотры постов, накопленные в кэше'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--schedule', action='store_true',
+            help='Поставить периодический сброс в очередь задач'
+        )
+
+    def handle(self, *args, **options):
+        if options['schedule']:
+            enqueue(FLUSH_POST_VIEWS, unique=True)
+            self.stdout.write('Сброс поставлен в очередь')
+            return
+        flushed = view_counter.flush()
+        self.stdout.write(f'Сохранены просмотры постов: {flushed}')
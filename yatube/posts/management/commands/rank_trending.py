@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from tasks.queue import enqueue
+
+from posts import trending
+from posts.tasks import RANK_TRENDING
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает рейтинг ленты «Популярное»'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full', action='store_true',
+            help='Пересчитать все свежие посты, а не только изменившиеся'
+        )
+        parser.add_argument(
+            '--schedule', action='store_true',
+            help='Поставить периодический пересчёт в очередь задач'
+        )
+
+    def handle(self, *args, **options):
+        if options['schedule']:
+            enqueue(RANK_TRENDING, unique=True)
+            self.stdout.write('Пересчёт поставлен в очередь')
+            return
+        ranked = trending.rank(full=options['full'])
+        self.stdout.write(f'Пересчитано постов: {ranked}')
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from posts import feedcache
+from posts.models import Comment, Post
+
+BATCH_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = 'Заполняет отрисованный HTML у постов и комментариев'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Перерисовать все записи, а не только пустые'
+        )
+
+    def render(self, model, fields, everything):
+        rows = model.objects.only('pk', 'text', *fields).order_by('pk')
+        if not everything:
+            rows = rows.filter(text_html='')
+        rendered, last = 0, 0
+        while True:
+            batch = list(rows.filter(pk__gt=last)[:BATCH_SIZE])
+            if not batch:
+                return rendered
+            touched = timezone.now()
+            for row in batch:
+                row.render()
+                if 'updated_at' in fields:
+                    row.updated_at = touched
+            model.objects.bulk_update(batch, fields)
+            if model in feedcache.OBJECT_KEYS:
+                feedcache.forget(model, *(row.pk for row in batch))
+            rendered += len(batch)
+            last = batch[-1].pk
+
+    def handle(self, *args, **options):
+        posts = self.render(
+            Post, ('text_html', 'excerpt', 'updated_at'), options['all'])
+        comments = self.render(Comment, ('text_html',), options['all'])
+        self.stdout.write(
+            f'Постов: {posts}, комментариев: {comments}')
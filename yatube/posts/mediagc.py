@@ -0,0 +1,238 @@
+import heapq
+import os
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from sorl.thumbnail import default
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.helpers import deserialize
+from sorl.thumbnail.images import ImageFile
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.models import KVStore
+
+from .models import ImageBlob, Post
+from .storage import image_storage
+
+UPLOAD_DIR = 'posts'
+THUMBNAIL_DIR = thumbnail_settings.THUMBNAIL_PREFIX.rstrip('/')
+
+Report = namedtuple(
+    'Report', ('found', 'reclaimed', 'thumbnails', 'thumbnail_bytes'))
+
+
+class OrderError(Exception):
+    pass
+
+
+def stored_names(root, directory=UPLOAD_DIR):
+    """Имена файлов каталога в порядке сравнения строк, обходом вглубь.
+
+    Каталоги сортируются как «имя/», поэтому порядок совпадает с
+    сортировкой полных путей; в памяти — один каталог за раз.
+    """
+    try:
+        entries = list(os.scandir(os.path.join(root, directory)))
+    except FileNotFoundError:
+        return
+    entries.sort(key=lambda entry: entry.name + (
+        '/' if entry.is_dir(follow_symlinks=False) else ''))
+    for entry in entries:
+        name = f'{directory}/{entry.name}'
+        if entry.is_dir(follow_symlinks=False):
+            yield from stored_names(root, name)
+        elif entry.is_file(follow_symlinks=False):
+            yield name
+
+
+def column_names(queryset, field):
+    """Значения поля по возрастанию, пачками через keyset."""
+    last = ''
+    while True:
+        names = list(
+            queryset.filter(**{f'{field}__gt': last}).order_by(field)
+            .values_list(field, flat=True).distinct()
+            [:settings.MEDIA_GC_CHUNK_SIZE])
+        if not names:
+            return
+        yield from names
+        last = names[-1]
+
+
+def referenced_names():
+    """Имена, на которые есть ссылки: картинки постов и учтённые файлы.
+
+    Файлы ImageBlob без ссылок дочищает их собственная задача после
+    паузы, поэтому сборщик их не трогает. Порядок базы проверяется:
+    если её сопоставление строк расходится с Python, слияние могло бы
+    принять живой файл за сироту.
+    """
+    previous = ''
+    for name in heapq.merge(
+        column_names(Post._base_manager.exclude(image=''), 'image'),
+        column_names(ImageBlob.objects.all(), 'name'),
+    ):
+        if name < previous:
+            raise OrderError(f'{name!r} идёт после {previous!r}')
+        previous = name
+        yield name
+
+
+def orphans(root):
+    """Файлы без ссылок слиянием двух отсортированных потоков."""
+    referenced = referenced_names()
+    current = next(referenced, None)
+    for name in stored_names(root):
+        while current is not None and current < name:
+            current = next(referenced, None)
+        if name != current:
+            yield name
+
+
+def chunked(names):
+    batch = []
+    for name in names:
+        batch.append(name)
+        if len(batch) >= settings.MEDIA_GC_CHUNK_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def thumbnail_orphans(root):
+    """Файлы каталога миниатюр без записи в хранилище ключей sorl.
+
+    Записи проверяются одним запросом на пачку файлов; такие файлы
+    остаются, например, от миниатюр, построенных до того, как
+    хранилище ключей стало общим.
+    """
+    for batch in chunked(stored_names(root, THUMBNAIL_DIR)):
+        keys = {
+            add_prefix(ImageFile(name, default.storage).key, 'image'): name
+            for name in batch
+        }
+        live = set(KVStore.objects.filter(
+            key__in=keys).values_list('key', flat=True))
+        yield from (name for key, name in keys.items() if key not in live)
+
+
+def thumbnail_names(names):
+    """Имена миниатюр файлов names по записям sorl, двумя запросами."""
+    lists = KVStore.objects.filter(key__in=[
+        add_prefix(ImageFile(name, image_storage).key, 'thumbnails')
+        for name in names
+    ]).values_list('value', flat=True)
+    keys = [add_prefix(key, 'image')
+            for value in lists for key in deserialize(value)]
+    return [
+        deserialize(value)['name'] for value in
+        KVStore.objects.filter(key__in=keys).values_list('value', flat=True)
+    ]
+
+
+def old_enough(path, min_age):
+    try:
+        return os.stat(path).st_mtime < time.time() - min_age
+    except FileNotFoundError:
+        return False
+
+
+def file_size(path):
+    try:
+        return os.path.getsize(path)
+    except FileNotFoundError:
+        return 0
+
+
+def quarantine(root, name, target):
+    destination = os.path.join(target, name)
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    os.replace(os.path.join(root, name), destination)
+
+
+def remove(batch, target):
+    """Удаляет или переносит пачку, перепроверив ссылки одним запросом.
+
+    Пост мог сослаться на файл, пока шёл обход. Миниатюры файла
+    удаляет вместе с записями хранилище ключей sorl.
+    """
+    root = image_storage.location
+    live = set(
+        Post._base_manager.filter(image__in=batch)
+        .values_list('image', flat=True))
+    for name in batch:
+        if name in live:
+            continue
+        default.kvstore.delete(ImageFile(name, image_storage))
+        if target:
+            quarantine(root, name, target)
+        else:
+            image_storage.delete(name)
+
+
+def remove_thumbnails(batch, target):
+    root = default.storage.location
+    for name in batch:
+        if target:
+            quarantine(root, name, target)
+        else:
+            default.storage.delete(name)
+
+
+def sweep(names, root, min_age, batch_size, handle):
+    """Передаёт файлы names старше min_age в handle пачками.
+
+    Возвращает число таких файлов и их размер.
+    """
+    found = size = 0
+    batch = []
+    for name in names:
+        path = os.path.join(root, name)
+        if not old_enough(path, min_age):
+            continue
+        found += 1
+        size += file_size(path)
+        batch.append(name)
+        if len(batch) >= batch_size:
+            handle(batch)
+            batch = []
+    if batch:
+        handle(batch)
+    return found, size
+
+
+def collect(dry_run=False, target=None, batch_size=None, min_age=None):
+    """Находит файлы картинок и миниатюр без ссылок и удаляет их пачками.
+
+    Свежие файлы моложе min_age пропускаются: загрузка могла ещё не
+    дойти до сохранения поста, а миниатюра — до записи в хранилище
+    ключей. Миниатюры картинок-сирот удаляются вместе с ними, в
+    каталоге миниатюр — файлы без записи sorl. target — каталог
+    карантина, куда файлы переносятся вместо удаления. Возвращает
+    Report с числом файлов и байт картинок и отдельно миниатюр.
+    """
+    root = image_storage.location
+    thumbnail_root = default.storage.location
+    batch_size = batch_size or settings.MEDIA_GC_BATCH_SIZE
+    min_age = settings.MEDIA_GC_MIN_AGE if min_age is None else min_age
+    children = []
+
+    def remove_images(batch):
+        children.extend(
+            file_size(os.path.join(thumbnail_root, name))
+            for name in thumbnail_names(batch))
+        if not dry_run:
+            remove(batch, target)
+
+    def remove_strays(batch):
+        if not dry_run:
+            remove_thumbnails(batch, target)
+
+    found, reclaimed = sweep(
+        orphans(root), root, min_age, batch_size, remove_images)
+    strays, stray_bytes = sweep(
+        thumbnail_orphans(thumbnail_root), thumbnail_root, min_age,
+        batch_size, remove_strays)
+    return Report(found, reclaimed, len(children) + strays,
+                  sum(children) + stray_bytes)
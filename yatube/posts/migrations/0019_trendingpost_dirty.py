@@ -0,0 +1,18 @@
+# Generated by Django 2.2.16 on 2026-10-19 09:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0018_deletion_jobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trendingpost',
+            name='dirty',
+            field=models.BooleanField(db_index=True, default=False, help_text='Активность, которую не видно по датам: отмена лайка, просмотры, изменение числа подписчиков', verbose_name='Нужен пересчёт'),
+        ),
+    ]
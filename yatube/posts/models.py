@@ -1,14 +1,38 @@
+from core.querycache import CachingManager
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.db import models
+from django.utils.html import linebreaks
+from django.utils.text import Truncator
+
+from .storage import image_storage
 
 User = get_user_model()
 
 
+def render_text(text):
+    return linebreaks(text, autoescape=True)
+
+
+def with_rendered(update_fields, *fields):
+    """Добавляет отрисованные поля к update_fields, если меняется text."""
+    if update_fields is None or 'text' not in update_fields:
+        return update_fields
+    return {*update_fields, *fields}
+
+
 class Group(models.Model):
     title = models.CharField(max_length=200)
     slug = models.SlugField(unique=True)
     description = models.TextField(max_length=200, blank=True)
+    hidden = models.BooleanField(
+        verbose_name='Скрыта',
+        default=False,
+        editable=False,
+        help_text='Группа ждёт фонового удаления'
+    )
+
+    objects = CachingManager()
 
     def __str__(self):
         return self.title
@@ -23,6 +47,10 @@ class Post(models.Model):
         verbose_name='Дата публикации',
         auto_now_add=True
     )
+    updated_at = models.DateTimeField(
+        verbose_name='Дата изменения',
+        auto_now=True
+    )
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -36,14 +64,57 @@ class Post(models.Model):
         related_name='posts',
         blank=True,
         null=True,
+        limit_choices_to={'hidden': False},
         help_text='Группа, к которой будет относиться пост'
     )
     image = models.ImageField(
         verbose_name='Картинка',
         upload_to='posts/',
+        storage=image_storage,
         blank=True,
         help_text='Картинка для поста'
     )
+    image_width = models.PositiveIntegerField(
+        verbose_name='Ширина картинки',
+        null=True,
+        blank=True,
+        editable=False
+    )
+    image_height = models.PositiveIntegerField(
+        verbose_name='Высота картинки',
+        null=True,
+        blank=True,
+        editable=False
+    )
+    image_placeholder = models.TextField(
+        verbose_name='Заглушка картинки',
+        blank=True,
+        editable=False
+    )
+    text_html = models.TextField(
+        verbose_name='Текст поста в HTML',
+        blank=True,
+        editable=False
+    )
+    excerpt = models.TextField(
+        verbose_name='Начало текста',
+        blank=True,
+        editable=False
+    )
+    views = models.PositiveIntegerField(
+        verbose_name='Просмотры',
+        default=0,
+        db_index=True,
+        editable=False
+    )
+    hidden = models.BooleanField(
+        verbose_name='Скрыт',
+        default=False,
+        editable=False,
+        help_text='Пост ждёт фонового удаления'
+    )
+
+    objects = CachingManager()
 
     class Meta:
         ordering = ('-pub_date', )
@@ -53,6 +124,17 @@ class Post(models.Model):
     def __str__(self):
         return self.text[:settings.MAX_SYMS]
 
+    def render(self):
+        self.text_html = render_text(self.text)
+        self.excerpt = Truncator(self.text).words(
+            settings.POST_EXCERPT_WORDS, truncate=' …')
+
+    def save(self, *args, **kwargs):
+        self.render()
+        kwargs['update_fields'] = with_rendered(
+            kwargs.get('update_fields'), 'text_html', 'excerpt')
+        super().save(*args, **kwargs)
+
 
 class Comment(models.Model):
     text = models.TextField(
@@ -76,6 +158,13 @@ class Comment(models.Model):
         auto_now_add=True,
         verbose_name='Дата публикации комментария'
     )
+    text_html = models.TextField(
+        verbose_name='Комментарий в HTML',
+        blank=True,
+        editable=False
+    )
+
+    objects = CachingManager()
 
     class Meta:
         ordering = ('-created', )
@@ -85,6 +174,15 @@ class Comment(models.Model):
     def __str__(self):
         return self.text[:settings.MAX_SYMS]
 
+    def render(self):
+        self.text_html = render_text(self.text)
+
+    def save(self, *args, **kwargs):
+        self.render()
+        kwargs['update_fields'] = with_rendered(
+            kwargs.get('update_fields'), 'text_html')
+        super().save(*args, **kwargs)
+
 
 class Follow(models.Model):
     user = models.ForeignKey(
@@ -100,6 +198,8 @@ class Follow(models.Model):
         verbose_name='Автор записей'
     )
 
+    objects = CachingManager()
+
     class Meta:
         verbose_name = 'Подписчик'
         verbose_name_plural = 'Подписчики'
@@ -107,3 +207,208 @@ class Follow(models.Model):
             fields=['user', 'author'],
             name='unique_follow')
         ]
+
+
+class Like(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name='Пользователь',
+        related_name='likes'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        verbose_name='Пост',
+        related_name='likes'
+    )
+    created = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Дата отметки'
+    )
+
+    class Meta:
+        verbose_name = 'Отметка «нравится»'
+        verbose_name_plural = 'Отметки «нравится»'
+        constraints = [models.UniqueConstraint(
+            fields=['user', 'post'],
+            name='unique_like')
+        ]
+
+
+class LikeCounter(models.Model):
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        verbose_name='Пост',
+        related_name='like_counters'
+    )
+    shard = models.PositiveSmallIntegerField(verbose_name='Шард')
+    count = models.IntegerField(
+        verbose_name='Отметок',
+        default=0
+    )
+
+    class Meta:
+        verbose_name = 'Счётчик отметок'
+        verbose_name_plural = 'Счётчики отметок'
+        constraints = [models.UniqueConstraint(
+            fields=['post', 'shard'],
+            name='unique_like_counter_shard')
+        ]
+
+
+class TrendingPost(models.Model):
+    post = models.OneToOneField(
+        Post,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        verbose_name='Пост',
+        related_name='trending'
+    )
+    score = models.FloatField(
+        verbose_name='Рейтинг',
+        db_index=True
+    )
+    computed = models.DateTimeField(
+        verbose_name='Дата расчёта',
+        auto_now=True
+    )
+    dirty = models.BooleanField(
+        verbose_name='Нужен пересчёт',
+        default=False,
+        db_index=True,
+        help_text='Активность, которую не видно по датам: отмена лайка, '
+                  'просмотры, изменение числа подписчиков'
+    )
+
+    class Meta:
+        ordering = ('-score', )
+        verbose_name = 'Популярный пост'
+        verbose_name_plural = 'Популярные посты'
+
+
+class Recommendation(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name='Пользователь',
+        related_name='recommendations'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name='Рекомендуемый автор',
+        related_name='recommended_to'
+    )
+    score = models.FloatField(verbose_name='Похожесть')
+
+    class Meta:
+        ordering = ('-score', )
+        verbose_name = 'Рекомендация'
+        verbose_name_plural = 'Рекомендации'
+        constraints = [models.UniqueConstraint(
+            fields=['user', 'author'],
+            name='unique_recommendation')
+        ]
+
+
+class ImageBlob(models.Model):
+    digest = models.CharField(
+        verbose_name='sha256',
+        max_length=64,
+        primary_key=True
+    )
+    name = models.CharField(
+        verbose_name='Файл',
+        max_length=255,
+        unique=True
+    )
+    refs = models.PositiveIntegerField(
+        verbose_name='Ссылок',
+        default=0
+    )
+    created = models.DateTimeField(
+        verbose_name='Дата загрузки',
+        auto_now_add=True
+    )
+
+    class Meta:
+        verbose_name = 'Файл картинки'
+        verbose_name_plural = 'Файлы картинок'
+
+    def __str__(self):
+        return self.name
+
+
+class DeletionJob(models.Model):
+    USER = 'user'
+    GROUP = 'group'
+    POST = 'post'
+    KIND_CHOICES = (
+        (USER, 'Пользователь'),
+        (GROUP, 'Группа'),
+        (POST, 'Пост'),
+    )
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (QUEUED, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Завершено'),
+        (FAILED, 'Ошибка'),
+    )
+
+    kind = models.CharField(
+        verbose_name='Что удаляется',
+        max_length=10,
+        choices=KIND_CHOICES
+    )
+    object_id = models.PositiveIntegerField(verbose_name='id объекта')
+    label = models.CharField(
+        verbose_name='Объект',
+        max_length=200
+    )
+    status = models.CharField(
+        verbose_name='Статус',
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default=QUEUED
+    )
+    total = models.PositiveIntegerField(
+        verbose_name='Строк всего',
+        default=0
+    )
+    done = models.PositiveIntegerField(
+        verbose_name='Строк обработано',
+        default=0
+    )
+    created = models.DateTimeField(
+        verbose_name='Дата постановки',
+        auto_now_add=True
+    )
+    finished = models.DateTimeField(
+        verbose_name='Дата завершения',
+        null=True,
+        blank=True
+    )
+    error = models.TextField(
+        verbose_name='Ошибка',
+        blank=True
+    )
+
+    class Meta:
+        ordering = ('-created', )
+        verbose_name = 'Фоновое удаление'
+        verbose_name_plural = 'Фоновые удаления'
+
+    def __str__(self):
+        return f'{self.label} ({self.progress}%)'
+
+    @property
+    def progress(self):
+        if self.status == self.DONE:
+            return 100
+        return min(99, self.done * 100 // max(self.total, 1))
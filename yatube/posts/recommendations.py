@@ -0,0 +1,142 @@
+import heapq
+import math
+from collections import defaultdict
+from itertools import islice
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+
+from .models import Follow, Recommendation, User
+
+
+def chunks(ids):
+    ids = list(ids)
+    size = settings.RECOMMENDATIONS_BATCH_SIZE
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+
+def degrees(field, ids):
+    """Полное число соседей вершин одним GROUP BY на пачку."""
+    result = {}
+    for chunk in chunks(ids):
+        result.update(
+            Follow.objects.filter(**{f'{field}_id__in': chunk})
+            .values_list(f'{field}_id').annotate(Count('pk')).order_by())
+    return result
+
+
+def adjacency(field, ids):
+    """Соседи в графе: для field=user — подписки, для author — подписчики.
+
+    У вершины берётся не больше RECOMMENDATIONS_HOP_LIMIT соседей:
+    у популярных авторов — последние подписчики отдельным запросом
+    с LIMIT, остальные читаются общим запросом. Возвращает соседей и
+    полные степени вершин.
+    """
+    other = 'author_id' if field == 'user' else 'user_id'
+    limit = settings.RECOMMENDATIONS_HOP_LIMIT
+    counts = degrees(field, ids)
+    heavy = [key for key, count in counts.items() if count > limit]
+    light = [key for key, count in counts.items() if count <= limit]
+    sets = defaultdict(set)
+    for chunk in chunks(light):
+        pairs = Follow.objects.filter(
+            **{f'{field}_id__in': chunk}).values_list(f'{field}_id', other)
+        for key, value in pairs.iterator():
+            sets[key].add(value)
+    for key in heavy:
+        sets[key] = set(
+            Follow.objects.filter(**{f'{field}_id': key})
+            .order_by('-pk').values_list(other, flat=True)[:limit])
+    return sets, counts
+
+
+def score_batch(user_ids):
+    """Считает рекомендации для пачки пользователей.
+
+    Похожесть авторов a и b — косинус по их подписчикам:
+    |F(a) ∩ F(b)| / sqrt(|F(a)| * |F(b)|). Кандидат b получает сумму
+    похожестей со всеми авторами, на которых уже подписан пользователь.
+    Из базы читается только двухшаговая окрестность пачки, причём на
+    каждом шаге не больше RECOMMENDATIONS_HOP_LIMIT соседей вершины;
+    пересечение по выборке подписчиков масштабируется до полного.
+    """
+    following, _ = adjacency('user', user_ids)
+    authors = set().union(*following.values())
+    followers, author_degrees = adjacency('author', authors)
+    peers = set().union(*followers.values()) - set(user_ids)
+    peer_following, _ = adjacency('user', peers)
+    following.update(peer_following)
+    candidates = set().union(*(following[peer] for peer in peers))
+    candidate_degrees = {**author_degrees,
+                         **degrees('author', candidates - authors)}
+
+    result = {}
+    for user_id in user_ids:
+        mine = following.get(user_id, set())
+        scores = defaultdict(float)
+        for author in mine:
+            sample = followers[author]
+            scale = author_degrees[author] / len(sample)
+            for peer in sample:
+                if peer == user_id:
+                    continue
+                for candidate in following[peer]:
+                    if candidate == user_id or candidate in mine:
+                        continue
+                    scores[candidate] += scale / math.sqrt(
+                        author_degrees[author]
+                        * candidate_degrees[candidate])
+        result[user_id] = heapq.nlargest(
+            settings.RECOMMENDATIONS_LIMIT, scores.items(),
+            key=lambda item: (item[1], -item[0]))
+    return result
+
+
+def refresh(user_ids):
+    user_ids = iter(user_ids)
+    refreshed = 0
+    while True:
+        batch = list(islice(user_ids, settings.RECOMMENDATIONS_BATCH_SIZE))
+        if not batch:
+            return refreshed
+        refreshed += len(batch)
+        scored = score_batch(batch)
+        with transaction.atomic():
+            Recommendation.objects.filter(user_id__in=batch).delete()
+            Recommendation.objects.bulk_create(
+                Recommendation(user_id=user_id, author_id=author_id,
+                               score=score)
+                for user_id, top in scored.items()
+                for author_id, score in top
+            )
+
+
+def rebuild():
+    """Полный пересчёт по всем подписчикам, пачками."""
+    user_ids = Follow.objects.order_by('user_id').values_list(
+        'user_id', flat=True).distinct()
+    refreshed = refresh(user_ids.iterator())
+    Recommendation.objects.exclude(user_id__in=user_ids).delete()
+    return refreshed
+
+
+def affected_users(user_id, author_id):
+    """Кого затрагивает подписка пользователя на автора.
+
+    Сам пользователь и ограниченная выборка подписчиков автора: у них
+    изменилась похожесть этого автора с остальными.
+    """
+    peers = Follow.objects.filter(author_id=author_id).exclude(
+        user_id=user_id).values_list('user_id', flat=True)
+    return [user_id, *peers[:settings.RECOMMENDATIONS_FANOUT]]
+
+
+def recommended_authors(user):
+    if not user.is_authenticated:
+        return []
+    return User.objects.filter(
+        recommended_to__user=user, is_active=True,
+    ).order_by('-recommended_to__score')
@@ -0,0 +1,60 @@
+from django.conf import settings
+from django.utils.functional import cached_property
+
+from . import feedcache
+from .models import Post
+
+
+def parse_cursor(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def ids_after(ids, cursor, queryset):
+    """Следующие MAX_POSTS id ленты после поста cursor.
+
+    Курсор ищется в закэшированном начале ленты; если его там нет
+    (лента глубже FEED_ID_LIMIT или пост пропал), продолжение
+    читается из queryset по дате публикации курсора. Без queryset
+    такой курсор считается концом ленты.
+    """
+    size = settings.MAX_POSTS
+    if cursor is None:
+        return list(ids[:size])
+    known = getattr(ids, 'ids', ids)
+    if cursor in known:
+        start = known.index(cursor) + 1
+        return list(ids[start:start + size])
+    if queryset is None:
+        return []
+    pub_date = Post.objects.filter(
+        pk=cursor).values_list('pub_date', flat=True).first()
+    if pub_date is None:
+        return []
+    return list(feedcache.visible(queryset).filter(
+        pub_date__lt=pub_date).values_list('pk', flat=True)[:size])
+
+
+class Chunk:
+    """Порция ленты для бесконечной прокрутки.
+
+    Посты читаются только при обращении к posts, так что при попадании
+    во фрагментный кэш шаблона база и кэш строк не трогаются.
+    """
+
+    def __init__(self, load_ids, queryset, cursor, prepare):
+        self.load_ids, self.queryset = load_ids, queryset
+        self.cursor, self.prepare = cursor, prepare
+
+    @cached_property
+    def posts(self):
+        ids = ids_after(self.load_ids(), self.cursor, self.queryset)
+        return self.prepare(feedcache.posts_by_ids(ids))
+
+    @property
+    def next_cursor(self):
+        if len(self.posts) < settings.MAX_POSTS:
+            return None
+        return self.posts[-1].pk
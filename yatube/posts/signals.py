@@ -0,0 +1,119 @@
+from core.broadcast import broadcaster
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from tasks.queue import enqueue
+
+from . import blobs, feedcache, follows, images, likes, stamps, trending
+from .models import Follow, Group, Like, Post, User
+from .tasks import PURGE_IMAGE_BLOB, fill_image_placeholder
+
+
+@receiver(pre_save, sender=Post)
+def remember_previous(sender, instance, **kwargs):
+    instance._previous_group_slug = None
+    instance._previous_image = ''
+    if instance.pk:
+        instance._previous_group_slug, instance._previous_image = (
+            Post.objects.filter(pk=instance.pk).values_list(
+                'group__slug', 'image').first() or (None, '')
+        )
+
+
+@receiver(pre_save, sender=Post)
+def measure_image(sender, instance, **kwargs):
+    if not instance.image:
+        instance.image_width = instance.image_height = None
+        instance.image_placeholder = ''
+    elif not instance.image._committed:
+        instance.image_width, instance.image_height = images.dimensions(
+            instance.image.file)
+        instance.image_placeholder = ''
+
+
+@receiver(post_save, sender=Post)
+def bump_feed_stamps(sender, instance, created, **kwargs):
+    previous_group = getattr(instance, '_previous_group_slug', None)
+    scopes = stamps.post_scopes(instance, previous_group)
+    stamps.bump(*scopes)
+    feedcache.forget(Post, instance.pk)
+    group = instance.group.slug if instance.group_id else None
+    if not created and group == previous_group:
+        return
+    stamps.bump(*(stamps.list_scope(scope) for scope in scopes))
+    if created:
+        follows.fan_out(instance.author_id)
+
+
+@receiver(post_save, sender=Post)
+def announce_new_post(sender, instance, created, **kwargs):
+    if created and settings.SSE_ENABLED:
+        channels = stamps.post_scopes(instance)
+        transaction.on_commit(lambda: broadcaster.publish(*channels))
+
+
+@receiver(post_delete, sender=Post)
+def forget_deleted_post(sender, instance, **kwargs):
+    stamps.bump(*(stamps.list_scope(scope)
+                  for scope in stamps.post_scopes(instance)))
+    follows.fan_out(instance.author_id)
+    feedcache.forget(Post, instance.pk)
+
+
+@receiver(post_save, sender=Follow)
+def count_new_follow(sender, instance, created, **kwargs):
+    if created:
+        follows.changed(instance.user_id, instance.author_id, 1)
+
+
+@receiver(post_delete, sender=Follow)
+def count_deleted_follow(sender, instance, **kwargs):
+    follows.changed(instance.user_id, instance.author_id, -1)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def touch_author_trending(sender, instance, **kwargs):
+    trending.touch(post__author_id=instance.author_id)
+
+
+@receiver(post_delete, sender=Like)
+def count_deleted_like(sender, instance, **kwargs):
+    likes.forget(instance)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=Group)
+def forget_saved_row(sender, instance, **kwargs):
+    feedcache.forget(sender, instance.pk)
+
+
+@receiver(post_save, sender=User)
+def bump_user_stamp(sender, instance, **kwargs):
+    stamps.bump(stamps.user_scope(instance.pk))
+
+
+def release_image(name):
+    digest = blobs.release(name)
+    if digest is not None:
+        enqueue(PURGE_IMAGE_BLOB, args=(digest,), unique=True,
+                countdown=settings.IMAGE_BLOB_GRACE_PERIOD)
+
+
+@receiver(post_save, sender=Post)
+def count_image_refs(sender, instance, **kwargs):
+    previous = getattr(instance, '_previous_image', '')
+    if instance.image.name == previous:
+        return
+    if instance.image:
+        blobs.acquire(instance.image.name)
+        fill_image_placeholder.delay(instance.pk, instance.image.name)
+    if previous:
+        release_image(previous)
+
+
+@receiver(post_delete, sender=Post)
+def release_deleted_image(sender, instance, **kwargs):
+    if instance.image:
+        release_image(instance.image.name)
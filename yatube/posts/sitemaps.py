@@ -0,0 +1,170 @@
+import gzip
+import hashlib
+import json
+import os
+from datetime import datetime, timezone
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.db.models import Count, ExpressionWrapper, F, IntegerField, Max
+from django.urls import reverse
+
+from .models import Group, Post, User
+
+MANIFEST = 'manifest.json'
+INDEX = 'sitemap.xml'
+HEADER = ('<?xml version="1.0" encoding="UTF-8"?>\n'
+          '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n')
+FOOTER = '</urlset>\n'
+
+
+def post_entry(pk, updated_at):
+    url = reverse('posts:post_detail', kwargs={'post_id': pk})
+    return url, updated_at
+
+
+def profile_entry(pk, username):
+    return reverse('posts:profile', kwargs={'username': username}), None
+
+
+def group_entry(pk, slug):
+    return reverse('posts:group_list', kwargs={'slug': slug}), None
+
+
+SECTIONS = {
+    'posts': (
+        Post.objects.filter(hidden=False, author__is_active=True),
+        ('pk', 'updated_at'), post_entry, 'updated_at'
+    ),
+    'profiles': (
+        User.objects.filter(is_active=True), ('pk', 'username'),
+        profile_entry, None
+    ),
+    'groups': (
+        Group.objects.filter(hidden=False), ('pk', 'slug'), group_entry,
+        None
+    ),
+}
+
+
+def shard_fingerprints(queryset, modified=None):
+    """Число строк, максимальный pk и последняя правка шардов.
+
+    Шард — диапазон pk длиной SITEMAP_SHARD_SIZE, поэтому новые
+    записи меняют только последний шард, а удаления — только свой.
+    Всё считается одним запросом; modified — поле даты изменения.
+    """
+    size = settings.SITEMAP_SHARD_SIZE
+    aggregates = {'count': Count('pk'), 'last': Max('pk')}
+    if modified is not None:
+        aggregates['modified'] = Max(modified)
+    shards = queryset.annotate(shard=ExpressionWrapper(
+        (F('pk') - 1) / size, output_field=IntegerField()
+    )).values('shard').annotate(**aggregates)
+    return {
+        row['shard']: [
+            row['count'], row['last'],
+            row['modified'].isoformat() if modified is not None else None,
+        ]
+        for row in shards.order_by('shard')
+    }
+
+
+def url_digest(queryset, fields, shard):
+    """Хэш полей адресов шарда: у профилей и групп нет даты изменения,
+    а переименование меняет адрес без изменения числа строк."""
+    digest = hashlib.sha1()
+    for row in iterate_shard(queryset, fields, shard):
+        digest.update(repr(row).encode())
+    return digest.hexdigest()
+
+
+def iterate_shard(queryset, fields, shard):
+    """Строки шарда по возрастанию pk, пачками через keyset."""
+    size = settings.SITEMAP_SHARD_SIZE
+    last, upper = shard * size, (shard + 1) * size
+    while True:
+        rows = list(queryset.filter(pk__gt=last, pk__lte=upper)
+                    .order_by('pk').values_list(*fields)
+                    [:settings.SITEMAP_CHUNK_SIZE])
+        if not rows:
+            return
+        yield from rows
+        last = rows[-1][0]
+
+
+def write_shard(path, base_url, entries):
+    temporary = f'{path}.tmp'
+    with gzip.open(temporary, 'wt', encoding='utf-8') as sitemap:
+        sitemap.write(HEADER)
+        for url, lastmod in entries:
+            sitemap.write(f'<url><loc>{escape(base_url + url)}</loc>')
+            if lastmod is not None:
+                sitemap.write(f'<lastmod>{lastmod.date().isoformat()}'
+                              '</lastmod>')
+            sitemap.write('</url>\n')
+        sitemap.write(FOOTER)
+    os.replace(temporary, path)
+
+
+def write_index(root, base_url, names):
+    temporary = os.path.join(root, f'{INDEX}.tmp')
+    with open(temporary, 'w', encoding='utf-8') as index:
+        index.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                    '<sitemapindex xmlns='
+                    '"http://www.sitemaps.org/schemas/sitemap/0.9">\n')
+        for name in names:
+            modified = datetime.fromtimestamp(
+                os.path.getmtime(os.path.join(root, name)), tz=timezone.utc)
+            location = escape(base_url + reverse(
+                'posts:sitemap_shard', kwargs={'name': name}))
+            index.write(f'<sitemap><loc>{location}</loc>'
+                        f'<lastmod>{modified.isoformat()}</lastmod>'
+                        '</sitemap>\n')
+        index.write('</sitemapindex>\n')
+    os.replace(temporary, os.path.join(root, INDEX))
+
+
+def load_manifest(root):
+    try:
+        with open(os.path.join(root, MANIFEST), encoding='utf-8') as manifest:
+            return json.load(manifest)
+    except (OSError, ValueError):
+        return {}
+
+
+def build(full=False, base_url=None):
+    """Перестраивает изменившиеся шарды и индекс карты сайта.
+
+    Возвращает список переписанных файлов.
+    """
+    root = settings.SITEMAP_ROOT
+    base_url = (base_url or settings.SITEMAP_BASE_URL).rstrip('/')
+    os.makedirs(root, exist_ok=True)
+    previous = {} if full else load_manifest(root)
+    manifest = {}
+    written = []
+    for section, (queryset, fields, entry, modified) in SECTIONS.items():
+        shards = shard_fingerprints(queryset, modified)
+        for shard, fingerprint in shards.items():
+            if modified is None:
+                fingerprint[2] = url_digest(queryset, fields, shard)
+            name = f'{section}-{shard:04d}.xml.gz'
+            manifest[name] = fingerprint
+            path = os.path.join(root, name)
+            if previous.get(name) == fingerprint and os.path.exists(path):
+                continue
+            write_shard(path, base_url, (
+                entry(*row)
+                for row in iterate_shard(queryset, fields, shard)
+            ))
+            written.append(name)
+    for name in set(previous) - set(manifest):
+        try:
+            os.remove(os.path.join(root, name))
+        except FileNotFoundError:
+            pass
+    write_index(root, base_url, sorted(manifest))
+    with open(os.path.join(root, MANIFEST), 'w', encoding='utf-8') as file:
+        json.dump(manifest, file)
+    return written
@@ -0,0 +1,80 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+STAMP_KEY = 'feed_stamp:{}'
+GLOBAL = 'global'
+
+
+def group_scope(slug):
+    return f'group:{slug}'
+
+
+def author_scope(username):
+    return f'author:{username}'
+
+
+def follower_scope(user_id):
+    return f'follower:{user_id}'
+
+
+def user_scope(user_id):
+    """Метка строки пользователя: меняется при каждом его сохранении."""
+    return f'user:{user_id}'
+
+
+def list_scope(scope):
+    """Метка состава ленты: меняется, только когда меняется список id."""
+    return f'ids:{scope}'
+
+
+def stamp(scope):
+    """Метка последнего изменения ленты: время в наносекундах.
+
+    Метка живёт FEED_STAMP_TIMEOUT: ключи для несуществующих лент
+    не копятся, а пропавшая метка заново создаётся текущим временем,
+    то есть лишь сбрасывает кэш ленты.
+    """
+    key = STAMP_KEY.format(scope)
+    value = cache.get(key)
+    if value is None:
+        value = time.time_ns()
+        if not cache.add(key, value, settings.FEED_STAMP_TIMEOUT):
+            value = cache.get(key, value)
+    return value
+
+
+def changed(scope):
+    """Последнее изменение ленты: правка постов или состава списка.
+
+    У ленты подписок своя метка не меняется, её двигает только
+    метка списка.
+    """
+    return max(stamp(scope), stamp(list_scope(scope)))
+
+
+def stamp_many(scopes):
+    """Метки нескольких лент одним get_many, {scope: метка}."""
+    keys = {STAMP_KEY.format(scope): scope for scope in scopes}
+    found = cache.get_many(keys)
+    missing = {key: time.time_ns() for key in keys if key not in found}
+    for key, value in missing.items():
+        if not cache.add(key, value, settings.FEED_STAMP_TIMEOUT):
+            value = cache.get(key, value)
+        found[key] = value
+    return {keys[key]: value for key, value in found.items()}
+
+
+def bump(*scopes):
+    now = time.time_ns()
+    cache.set_many({STAMP_KEY.format(scope): now for scope in scopes},
+                   settings.FEED_STAMP_TIMEOUT)
+
+
+def post_scopes(post, *group_slugs):
+    scopes = {GLOBAL, author_scope(post.author.username)}
+    if post.group_id:
+        group_slugs += (post.group.slug,)
+    scopes.update(group_scope(slug) for slug in group_slugs if slug)
+    return scopes
@@ -0,0 +1,51 @@
+import hashlib
+import os
+import re
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+BLOB_NAME = re.compile(r'(?:.*/)?[0-9a-f]{2}/(?P<digest>[0-9a-f]{64})\.\w+$')
+
+
+def content_digest(content):
+    """sha256 загрузки: готовый от обработчика или по кускам файла."""
+    digest = getattr(content, 'sha256', None)
+    if digest is not None:
+        return digest
+    digest = hashlib.sha256()
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    for chunk in content.chunks():
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()
+
+
+def blob_digest(name):
+    match = BLOB_NAME.match(name or '')
+    return match and match.group('digest')
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранит файл под его sha256, одинаковое содержимое — один раз.
+
+    Имя вида posts/ab/<sha256>.gif никогда не меняет содержимое,
+    поэтому у ссылок на него можно ставить вечный кэш, а миниатюры
+    sorl, которые он ищет по имени, общие для всех копий.
+    """
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        digest = content_digest(content)
+        directory = os.path.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        name = os.path.join(directory, digest[:2], digest + extension)
+        if self.exists(name):
+            return name
+        return super().save(name, content, max_length)
+
+
+image_storage = ContentAddressedStorage()
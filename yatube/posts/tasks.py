@@ -0,0 +1,76 @@
+import traceback
+
+from django.conf import settings
+from tasks.queue import enqueue, task
+
+from . import blobs, deletion, follows, images, recommendations, trending
+from .counters import view_counter
+
+RANK_TRENDING = 'posts.rank_trending'
+REFRESH_RECOMMENDATIONS = 'posts.refresh_recommendations'
+REFRESH_AFFECTED = 'posts.refresh_affected_recommendations'
+PURGE_IMAGE_BLOB = 'posts.purge_image_blob'
+FILL_IMAGE_PLACEHOLDER = 'posts.fill_image_placeholder'
+RUN_DELETION_JOB = 'posts.run_deletion_job'
+FLUSH_POST_VIEWS = 'posts.flush_post_views'
+
+
+@task(name=RANK_TRENDING, unique=True)
+def rank_trending():
+    try:
+        trending.rank()
+    finally:
+        enqueue(RANK_TRENDING, countdown=settings.TRENDING_INTERVAL,
+                unique=True)
+
+
+@task(name=FLUSH_POST_VIEWS, unique=True)
+def flush_post_views():
+    try:
+        view_counter.flush()
+    finally:
+        enqueue(FLUSH_POST_VIEWS, countdown=settings.POST_VIEWS_FLUSH_INTERVAL,
+                unique=True)
+
+
+@task(name=REFRESH_RECOMMENDATIONS, unique=True)
+def refresh_recommendations(user_ids):
+    recommendations.refresh(user_ids)
+
+
+@task(name=REFRESH_AFFECTED)
+def refresh_affected_recommendations(user_id, author_id):
+    recommendations.refresh(
+        recommendations.affected_users(user_id, author_id))
+
+
+@task(name=follows.BUMP_FOLLOWER_FEEDS, unique=True)
+def bump_follower_feeds(author_id):
+    follows.bump_follower_lists(author_id)
+
+
+@task(name=PURGE_IMAGE_BLOB, unique=True)
+def purge_image_blob(digest):
+    blobs.purge(digest)
+
+
+@task(name=FILL_IMAGE_PLACEHOLDER, unique=True)
+def fill_image_placeholder(post_id, name):
+    images.fill_placeholder(post_id, name)
+
+
+@task(name=RUN_DELETION_JOB, unique=True)
+def run_deletion_job(job_id):
+    try:
+        more = deletion.run_batch(job_id)
+    except Exception:
+        deletion.fail(job_id, traceback.format_exc())
+        raise
+    if more:
+        enqueue(RUN_DELETION_JOB, args=(job_id,), unique=True)
+
+
+def delete_in_background(obj):
+    job = deletion.start(obj)
+    run_deletion_job.delay(job.pk)
+    return job
@@ -1,15 +1,27 @@
+import hashlib
+import os
 import shutil
 import tempfile
-
+import time
+import tracemalloc
 from http import HTTPStatus
+from io import StringIO
 
 from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.files.uploadhandler import StopUpload
+from django.core.management import call_command
 from django.shortcuts import get_object_or_404
-from django.test import Client, TestCase, override_settings
+from django.test import Client, RequestFactory, TestCase, override_settings
 from django.urls import reverse
+from sorl.thumbnail import default
+from sorl.thumbnail.images import ImageFile
+from tasks.queue import run_pending
 
-from ..models import Comment, Group, Post, User
+from .. import mediagc
+from ..models import Comment, Group, ImageBlob, Post, User
+from ..storage import image_storage
+from ..uploads import LimitedUploadHandler, oversized_fields
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
@@ -80,7 +92,9 @@ class PostsFormsTests(TestCase):
         last_post = Post.objects.order_by('id').last()
         self.assertEqual(last_post.text, form_data['text'])
         self.assertEqual(self.user.username, last_post.author.username)
-        self.assertEqual(str(last_post.image), 'posts/small.gif')
+        digest = hashlib.sha256(small_gif).hexdigest()
+        self.assertEqual(
+            str(last_post.image), f'posts/{digest[:2]}/{digest}.gif')
         self.assertRedirects(
             response, reverse(
                 'posts:profile', kwargs={'username': self.user.username})
@@ -175,6 +189,19 @@ class PostsFormsTests(TestCase):
         self.assertEqual(last_comment.text, form_data['text'])
         self.assertEqual(last_comment.post.id, self.post.id)
 
+    def test_add_comment_by_ajax(self):
+        """AJAX-комментарий возвращает фрагмент без редиректа."""
+        url = reverse('posts:add_comment', kwargs={'post_id': self.post.id})
+        response = self.authorized_client.post(
+            url, data={'text': 'Комментарий'},
+            HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertIn('Комментарий', response.json()['html'])
+        response = self.authorized_client.post(
+            url, data={'text': ''}, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+        self.assertIn('text', response.json()['errors'])
+
     def test_add_comments_by_guest(self):
         """Возможность комментирования неавторизированным пользователем."""
         comment_count = Comment.objects.count()
@@ -188,3 +215,258 @@ class PostsFormsTests(TestCase):
         )
         self.assertEqual(response.status_code, HTTPStatus.OK)
         self.assertEqual(Comment.objects.count(), comment_count)
+
+
+def gif(width, height):
+    """Однопиксельный GIF с заданными в заголовке размерами."""
+    return (
+        b'GIF89a' + width.to_bytes(2, 'little') + height.to_bytes(2, 'little')
+        + b'\x80\x00\x00\x00\x00\x00\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+        b'\x00\x00\x00\x2C\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02'
+        b'\x02\x0C\x0A\x00\x3B'
+    )
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class UploadLimitsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Auth_user')
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def post_image(self, content):
+        uploaded = SimpleUploadedFile(
+            name='image.gif', content=content, content_type='image/gif')
+        return self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Тестовый текст', 'image': uploaded},
+        )
+
+    @override_settings(FILE_UPLOAD_MAX_SIZE=64)
+    def test_large_file_is_rejected(self):
+        """Файл больше FILE_UPLOAD_MAX_SIZE отклоняется по размеру,
+        а не как битая картинка."""
+        for content in (gif(1, 1) + b'\x00' * 100, b'\x00' * 100):
+            with self.subTest(content=content[:8]):
+                response = self.post_image(content)
+                self.assertFalse(Post.objects.exists())
+                self.assertFormError(
+                    response, 'form', 'image', 'Файл больше 64\xa0байта')
+
+    @override_settings(POST_IMAGE_MAX_PIXELS=100)
+    def test_too_many_pixels_are_rejected(self):
+        """Картинка с большими размерами в заголовке не сохраняется."""
+        response = self.post_image(gif(20, 20))
+        self.assertFalse(Post.objects.exists())
+        self.assertFormError(
+            response, 'form', 'image', 'Картинка больше 100 пикселей')
+
+    @override_settings(FILE_UPLOAD_MAX_SIZE=4 * 1024 * 1024)
+    def test_handler_memory_is_bounded(self):
+        """Обработчик держит в памяти не больше одного куска загрузки
+        и прерывает разбор, как только файл превысил лимит."""
+        request = RequestFactory().post('/')
+        handler = LimitedUploadHandler(request)
+        chunk = b'\x00' * handler.chunk_size
+        chunks = settings.FILE_UPLOAD_MAX_SIZE // handler.chunk_size
+        tracemalloc.start()
+        try:
+            handler.new_file('image', 'image.gif', 'image/gif', 0)
+            for index in range(chunks):
+                handler.receive_data_chunk(chunk, index * len(chunk))
+            uploaded = handler.file_complete(chunks * len(chunk))
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        uploaded.close()
+        self.assertLess(peak, 2 * handler.chunk_size)
+        self.assertEqual(uploaded.sha256, hashlib.sha256(
+            chunk * chunks).hexdigest())
+        handler.new_file('image', 'image.gif', 'image/gif', 0)
+        with self.assertRaises(StopUpload):
+            for index in range(chunks + 1):
+                handler.receive_data_chunk(chunk, index * len(chunk))
+        self.assertEqual(oversized_fields(request), {'image'})
+
+    def test_post_form_still_checks_csrf(self):
+        """Форма поста без CSRF-токена отклоняется."""
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.user)
+        response = client.post(
+            reverse('posts:post_create'), data={'text': 'Тестовый текст'})
+        self.assertTemplateUsed(response, 'core/403csrf.html')
+        self.assertFalse(Post.objects.exists())
+
+    def test_handler_is_limited_to_post_forms(self):
+        """Обработчик не подменяет загрузку по всему сайту."""
+        self.assertNotIn(
+            'posts.uploads.LimitedUploadHandler',
+            settings.FILE_UPLOAD_HANDLERS)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, IMAGE_BLOB_GRACE_PERIOD=0)
+class ImageStorageTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Auth_user')
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def create_post(self, content, name='image.gif'):
+        uploaded = SimpleUploadedFile(
+            name=name, content=content, content_type='image/gif')
+        self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Тестовый текст', 'image': uploaded},
+        )
+        return Post.objects.order_by('id').last()
+
+    def test_same_content_is_stored_once(self):
+        """Одинаковые картинки хранятся одним файлом с учётом ссылок."""
+        first = self.create_post(gif(2, 1), name='first.GIF')
+        second = self.create_post(gif(2, 1), name='second.gif')
+        other = self.create_post(gif(3, 1))
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertNotEqual(first.image.name, other.image.name)
+        blob = ImageBlob.objects.get(name=first.image.name)
+        self.assertEqual(blob.refs, 2)
+
+    def test_unreferenced_blob_is_purged(self):
+        """Файл удаляется, когда не остаётся постов с картинкой."""
+        first = self.create_post(gif(2, 1))
+        second = self.create_post(gif(2, 1))
+        storage, name = first.image.storage, first.image.name
+        first.delete()
+        run_pending()
+        self.assertTrue(storage.exists(name))
+        second.delete()
+        run_pending()
+        self.assertFalse(storage.exists(name))
+        self.assertFalse(ImageBlob.objects.exists())
+
+    def test_dimensions_and_placeholder(self):
+        """Размеры пишутся при загрузке, заглушка — фоновой задачей."""
+        post = self.create_post(gif(2, 1))
+        copy = self.create_post(gif(2, 1))
+        self.assertEqual((post.image_width, post.image_height), (2, 1))
+        self.assertEqual(post.image_placeholder, '')
+        response = self.authorized_client.get(
+            reverse('posts:post_detail', kwargs={'post_id': post.id}))
+        self.assertContains(response, 'width="2" height="1"')
+        run_pending()
+        post.refresh_from_db()
+        copy.refresh_from_db()
+        self.assertTrue(
+            post.image_placeholder.startswith('data:image/png;base64,'))
+        self.assertEqual(copy.image_placeholder, post.image_placeholder)
+        response = self.authorized_client.get(
+            reverse('posts:post_detail', kwargs={'post_id': post.id}))
+        self.assertContains(response, 'width="960" height="339"')
+        self.assertContains(response, 'loading="lazy"')
+        self.assertContains(response, post.image_placeholder)
+
+    def test_fill_images_backfills_rows(self):
+        """Команда fill_images заполняет размеры у старых постов."""
+        post = self.create_post(gif(2, 1))
+        Post.objects.update(
+            image_width=None, image_height=None, image_placeholder='')
+        call_command('fill_images', stdout=StringIO())
+        post.refresh_from_db()
+        self.assertEqual((post.image_width, post.image_height), (2, 1))
+        self.assertTrue(
+            post.image_placeholder.startswith('data:image/png;base64,'))
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, MEDIA_GC_CHUNK_SIZE=2)
+class MediaCollectorTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='Auth_user')
+        self.quarantine = tempfile.mkdtemp()
+        self.files = {}
+        for name in ('posts/ab/live.gif', 'posts/ab/orphan.gif',
+                     'posts/ab.gif', 'posts/pending.gif', 'posts/zz.gif',
+                     'posts/fresh.gif'):
+            self.write(name, age=0 if name == 'posts/fresh.gif' else 7200)
+        for name in ('posts/ab/live.gif', 'posts/zz.gif'):
+            Post.objects.create(text='text', author=self.user, image=name)
+        ImageBlob.objects.create(
+            digest='0' * 64, name='posts/pending.gif', refs=0)
+
+    def tearDown(self):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        shutil.rmtree(self.quarantine, ignore_errors=True)
+
+    def write(self, name, age):
+        path = os.path.join(TEMP_MEDIA_ROOT, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as file:
+            file.write(gif(1, 1))
+        modified = time.time() - age
+        os.utime(path, (modified, modified))
+        self.files[name] = path
+
+    def existing(self):
+        return {name for name, path in self.files.items()
+                if os.path.exists(path)}
+
+    def test_stored_names_are_sorted(self):
+        """Обход каталога отдаёт полные имена в порядке строк."""
+        names = list(mediagc.stored_names(TEMP_MEDIA_ROOT))
+        self.assertEqual(names, sorted(self.files))
+
+    def test_dry_run_reports_bytes(self):
+        """Пробный запуск только считает сирот и их размер."""
+        out = StringIO()
+        call_command(
+            'collect_media', dry_run=True, min_age=3600, stdout=out)
+        self.assertEqual(self.existing(), set(self.files))
+        self.assertEqual(
+            mediagc.collect(dry_run=True, min_age=3600),
+            (2, 2 * len(gif(1, 1)), 0, 0))
+        self.assertIn('Файлов без ссылок: 2', out.getvalue())
+        self.assertIn('Миниатюр без ссылок: 0', out.getvalue())
+
+    def test_thumbnails_collected(self):
+        """Миниатюры сирот и файлы миниатюр без записи sorl удаляются
+        и учитываются в пробном запуске."""
+        for name in ('cache/ab/cd/live.gif', 'cache/ab/cd/child.gif',
+                     'cache/ab/cd/stray.gif'):
+            self.write(name, age=7200)
+        source = ImageFile('posts/ab/orphan.gif', image_storage)
+        source.set_size((1, 1))
+        default.kvstore.set(source)
+        for name in ('cache/ab/cd/live.gif', 'cache/ab/cd/child.gif'):
+            thumbnail = ImageFile(name, default.storage)
+            thumbnail.set_size((1, 1))
+            default.kvstore.set(
+                thumbnail, source if 'child' in name else None)
+        report = mediagc.collect(dry_run=True, min_age=3600)
+        self.assertEqual(
+            (report.thumbnails, report.thumbnail_bytes),
+            (2, 2 * len(gif(1, 1))))
+        mediagc.collect(min_age=3600)
+        self.assertEqual(
+            {name for name in self.existing() if name.startswith('cache/')},
+            {'cache/ab/cd/live.gif'})
+
+    def test_orphans_deleted_in_batches(self):
+        """Удаляются только старые файлы без ссылок."""
+        mediagc.collect(batch_size=1, min_age=3600)
+        self.assertEqual(self.existing(), {
+            'posts/ab/live.gif', 'posts/pending.gif', 'posts/zz.gif',
+            'posts/fresh.gif',
+        })
+
+    def test_quarantine(self):
+        """В режиме карантина сироты переносятся с тем же путём."""
+        mediagc.collect(target=self.quarantine, min_age=3600)
+        self.assertTrue(os.path.exists(
+            os.path.join(self.quarantine, 'posts/ab/orphan.gif')))
+        self.assertNotIn('posts/ab.gif', self.existing())
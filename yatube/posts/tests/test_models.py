@@ -1,7 +1,12 @@
+from io import StringIO
+
 from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
 from django.test import TestCase
 
-from ..models import Group, Post, User
+from ..feedcache import posts_by_ids
+from ..models import Comment, Group, Post, User
 
 
 class PostModelTest(TestCase):
@@ -57,3 +62,31 @@ class PostModelTest(TestCase):
         """Проверяем, что у моделей корректно работает __str__."""
         post = PostModelTest.post
         self.assertEquals(post.text[:settings.MAX_SYMS], str(post))
+
+    def test_text_is_rendered_on_save(self):
+        """HTML и начало текста считаются при сохранении поста."""
+        post = Post.objects.create(
+            author=self.user, text='<b>один</b>\n\nдва ' * 20)
+        self.assertIn('<p>&lt;b&gt;один&lt;/b&gt;</p>', post.text_html)
+        self.assertEqual(
+            len(post.excerpt.split()), settings.POST_EXCERPT_WORDS + 1)
+        post.text = 'новый текст'
+        post.save(update_fields=['text'])
+        post.refresh_from_db()
+        self.assertEqual(post.text_html, '<p>новый текст</p>')
+        comment = Comment.objects.create(
+            post=post, author=self.user, text='a\nb')
+        self.assertEqual(comment.text_html, '<p>a<br>b</p>')
+
+    def test_render_texts_backfills_rows(self):
+        """Команда render_texts заполняет пустой HTML у старых записей."""
+        cache.clear()
+        Post.objects.update(text_html='', excerpt='')
+        cached, = posts_by_ids([self.post.pk])
+        call_command('render_texts', stdout=StringIO())
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.text_html, '<p>test_post</p>')
+        self.assertEqual(self.post.excerpt, 'test_post')
+        self.assertGreater(self.post.updated_at, cached.updated_at)
+        self.assertEqual(
+            posts_by_ids([self.post.pk])[0].text_html, '<p>test_post</p>')
@@ -1,17 +1,45 @@
+import gzip
+import os
 import shutil
 import tempfile
+import threading
+from datetime import timedelta
+from http import HTTPStatus
+from unittest import mock
+from xml.etree import ElementTree
 
 from django import forms
 from django.conf import settings
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase, override_settings
+from django.test import (Client, TestCase, TransactionTestCase,
+                         override_settings)
 from django.urls import reverse
-from posts.models import Follow, Group, Post, User
+from django.utils import timezone
+from core.broadcast import broadcaster
+from posts.models import (Comment, DeletionJob, Follow, Group, ImageBlob,
+                          Like, LikeCounter, Post, Recommendation,
+                          TrendingPost, User)
+from tasks.models import Task
+from tasks.queue import run_pending
 
+from ..cards import attach_cards, card_key
+from ..counters import view_counter
+from ..deletion import run_batch
+from ..feedcache import feed_ids, posts_by_ids
+from ..follows import following_ids
 from ..forms import PostForm
+from ..likes import like, like_counts, liked_post_ids, unlike
+from ..recommendations import adjacency, rebuild, recommended_authors
+from ..sitemaps import build
+from ..tasks import (PURGE_IMAGE_BLOB, RANK_TRENDING, delete_in_background,
+                     rank_trending)
+from ..stamps import (GLOBAL, author_scope, follower_scope, group_scope,
+                      list_scope, stamp, user_scope)
+from ..trending import rank
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+CHANNEL_DIR = tempfile.mkdtemp()
 
 
 @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
@@ -69,6 +97,7 @@ class PostPagesTests(TestCase):
         shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
 
     def setUp(self):
+        cache.clear()
         self.guest_client = Client()
         self.authorized_client = Client()
         self.authorized_client.force_login(self.user)
@@ -312,3 +341,1004 @@ class CacheTests(TestCase):
                          second_response.content)
         self.assertNotEqual(first_response.content,
                             third_response.content)
+
+
+class CardCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Auth_user')
+        cls.group = Group.objects.create(title='test_group', slug='test_slug')
+        cls.post = Post.objects.create(
+            text='card_text', author=cls.user, group=cls.group)
+
+    def setUp(self):
+        cache.clear()
+
+    def key(self, post):
+        author = stamp(user_scope(post.author_id))
+        return card_key(post, 'card', author)
+
+    def test_card_is_shared_between_feeds(self):
+        """Карточка рисуется один раз и берётся из кэша в других лентах."""
+        self.client.get(reverse('posts:index'))
+        key = self.key(self.post)
+        self.assertIn('card_text', cache.get(key))
+        cache.set(key, 'cached_card')
+        response = self.client.get(
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}))
+        self.assertContains(response, 'cached_card')
+        self.assertNotContains(response, 'card_text')
+
+    def test_edited_post_gets_new_card(self):
+        """Изменение поста меняет ключ карточки."""
+        old_key = self.key(self.post)
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'edited_text'
+        post.save()
+        self.assertNotEqual(self.key(post), old_key)
+        cache.set(old_key, 'stale_card')
+        [card] = attach_cards([post])
+        self.assertIn('edited_text', card.card_html)
+
+    def test_card_with_pending_thumbnail_is_not_cached(self):
+        """Карточка с ещё не готовой миниатюрой не кэшируется."""
+        post = Post.objects.create(
+            text='image_post', author=self.user, image='posts/missing.gif')
+        attach_cards([post])
+        self.assertIsNone(cache.get(self.key(post)))
+
+    def test_renamed_author_gets_new_card(self):
+        """Смена имени автора меняет ключ карточки."""
+        attach_cards([self.post])
+        self.assertIsNotNone(cache.get(self.key(self.post)))
+        self.user.first_name = 'Новое'
+        self.user.last_name = 'Имя'
+        self.user.save()
+        post = Post.objects.select_related('author').get(pk=self.post.pk)
+        [card] = attach_cards([post])
+        self.assertIn('Новое Имя', card.card_html)
+
+
+class FeedCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Auth_user')
+        cls.author = User.objects.create_user(username='Author')
+        cls.group = Group.objects.create(title='test_group', slug='test_slug')
+        cls.posts = [
+            Post.objects.create(
+                text=f'post_{index}', author=cls.author, group=cls.group)
+            for index in range(3)
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def test_page_objects_come_from_cache(self):
+        """Повторная выборка постов страницы не ходит в базу."""
+        ids = list(feed_ids(GLOBAL, Post.objects.all())[:10])
+        self.assertEqual(ids, [post.pk for post in reversed(self.posts)])
+        posts_by_ids(ids)
+        with self.assertNumQueries(0):
+            posts = posts_by_ids(ids)
+            list(feed_ids(GLOBAL, Post.objects.all())[:10])
+        self.assertEqual([post.author for post in posts], [self.author] * 3)
+        self.assertEqual(posts[0].group, self.group)
+
+    def test_edit_touches_only_post_key(self):
+        """Правка поста обновляет его объект, но не список id лент."""
+        ids = [post.pk for post in self.posts]
+        posts_by_ids(ids)
+        list_stamp = stamp(list_scope(GLOBAL))
+        post = Post.objects.get(pk=self.posts[0].pk)
+        post.text = 'edited_text'
+        post.save()
+        self.assertEqual(stamp(list_scope(GLOBAL)), list_stamp)
+        with self.assertNumQueries(1):
+            posts = posts_by_ids(ids)
+        self.assertEqual(posts[0].text, 'edited_text')
+
+    def test_new_post_reaches_follow_feed(self):
+        """Фоновая задача меняет список id ленты подписчика после
+        создания и удаления поста автора."""
+        Follow.objects.create(user=self.user, author=self.author)
+        scope = follower_scope(self.user.pk)
+        posts = Post.objects.filter(author__following__user=self.user)
+        self.assertEqual(len(feed_ids(scope, posts)), 3)
+        post = Post.objects.create(text='fresh_post', author=self.author)
+        self.assertEqual(len(feed_ids(scope, posts)), 3)
+        run_pending()
+        self.assertEqual(len(feed_ids(scope, posts)), 4)
+        post.delete()
+        run_pending()
+        self.assertEqual(len(feed_ids(scope, posts)), 3)
+
+
+class ScrollTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Author')
+        cls.group = Group.objects.create(title='test_group', slug='test_slug')
+        cls.posts = [
+            Post.objects.create(
+                text=f'post_{index}', author=cls.author, group=cls.group)
+            for index in range(25)
+        ]
+        cls.posts.reverse()
+
+    def setUp(self):
+        cache.clear()
+
+    def scroll(self, name, **kwargs):
+        """id постов всех фрагментов ленты по цепочке курсоров."""
+        url = reverse(name, kwargs=kwargs)
+        chunks = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, HTTPStatus.OK)
+            chunk = response.context['chunk']
+            chunks.append([post.pk for post in chunk.posts])
+            url = chunk.next_cursor and (
+                f'{reverse(name, kwargs=kwargs)}?after={chunk.next_cursor}')
+        return chunks
+
+    def test_fragments_follow_cursor(self):
+        """Фрагменты идут за курсором и вместе дают всю ленту."""
+        ids = [post.pk for post in self.posts]
+        expected = [ids[:10], ids[10:20], ids[20:]]
+        self.assertEqual(self.scroll('posts:index_more'), expected)
+        self.assertEqual(self.scroll(
+            'posts:group_more', slug=self.group.slug), expected)
+        self.assertEqual(self.scroll(
+            'posts:profile_more', username=self.author.username), expected)
+        self.assertEqual(self.scroll('posts:trending_more'), [[]])
+
+    def test_fragment_has_only_cards(self):
+        """Фрагмент содержит карточки и ссылку на продолжение без
+        обвязки страницы."""
+        url = reverse('posts:index_more')
+        response = self.client.get(f'{url}?after={self.posts[9].pk}')
+        content = response.content.decode()
+        self.assertNotIn('<html', content)
+        self.assertIn(self.posts[10].text, content)
+        self.assertIn(f'{url}?after={self.posts[19].pk}', content)
+
+    @override_settings(FEED_ID_LIMIT=5)
+    def test_cursor_beyond_cached_ids(self):
+        """Курсор глубже закэшированных id продолжается из базы."""
+        ids = [post.pk for post in self.posts]
+        self.assertEqual(
+            self.scroll('posts:index_more'), [ids[:10], ids[10:20], ids[20:]])
+
+    def test_fragment_cached_per_cursor(self):
+        """Повторный запрос того же фрагмента не ходит в базу."""
+        url = f'{reverse("posts:index_more")}?after={self.posts[9].pk}'
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            self.client.get(url)
+
+    def test_follow_fragment_follows_list_stamp(self):
+        """Фрагмент ленты подписок меняется вместе со списком id."""
+        reader = User.objects.create_user(username='Reader')
+        Follow.objects.create(user=reader, author=self.author)
+        self.client.force_login(reader)
+        url = f'{reverse("posts:follow_more")}?after={self.posts[9].pk}'
+        self.assertContains(self.client.get(url), '<p>post_14</p>')
+        Post.objects.get(pk=self.posts[10].pk).delete()
+        run_pending()
+        self.assertNotContains(self.client.get(url), '<p>post_14</p>')
+
+    def test_page_links_first_fragment(self):
+        """Страница ленты указывает, откуда подгружать продолжение."""
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(
+            response,
+            f'{reverse("posts:index_more")}?after={self.posts[9].pk}')
+
+
+@override_settings(SSE_ENABLED=True, SSE_CHANNEL_DIR=CHANNEL_DIR,
+                   SSE_MAX_DURATION=0)
+class EventsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Author')
+        cls.reader = User.objects.create_user(username='Reader')
+        cls.posts = [
+            Post.objects.create(text=f'post_{index}', author=cls.author)
+            for index in range(3)
+        ]
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(CHANNEL_DIR, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def events(self, client, name, after):
+        response = client.get(f'{reverse(name)}?after={after}')
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        return b''.join(response.streaming_content).decode()
+
+    def test_stream_counts_new_posts(self):
+        """Поток сообщает, сколько постов новее курсора."""
+        content = self.events(
+            self.client, 'posts:index_events', self.posts[0].pk)
+        self.assertIn('retry:', content)
+        self.assertIn('event: posts\ndata: 2\n\n', content)
+        Follow.objects.create(user=self.reader, author=self.author)
+        content = self.events(
+            self.reader_client, 'posts:follow_events', self.posts[1].pk)
+        self.assertIn('event: posts\ndata: 1\n\n', content)
+
+    def test_disabled_by_default(self):
+        """Без SSE_ENABLED страница не открывает поток, а он сам — 404."""
+        with self.settings(SSE_ENABLED=False):
+            response = self.client.get(reverse('posts:index'))
+            self.assertNotContains(response, 'data-new-posts')
+            response = self.client.get(reverse('posts:index_events'))
+            self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+        cache.clear()
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'data-new-posts')
+
+    @override_settings(SSE_MAX_DURATION=5)
+    def test_stream_wakes_on_publish(self):
+        """Публикация в канал ленты сразу даёт новое событие."""
+        response = self.client.get(
+            f'{reverse("posts:index_events")}?after={self.posts[2].pk}')
+        stream = iter(response.streaming_content)
+        next(stream)
+        self.assertEqual(next(stream), b'event: posts\ndata: 0\n\n')
+        Post.objects.create(text='fresh_post', author=self.author)
+        threading.Timer(0.05, broadcaster.publish, args=(GLOBAL,)).start()
+        self.assertEqual(next(stream), b'event: posts\ndata: 1\n\n')
+        response.close()
+
+
+@override_settings(SSE_ENABLED=True, SSE_CHANNEL_DIR=CHANNEL_DIR)
+class NewPostBroadcastTests(TransactionTestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(CHANNEL_DIR, ignore_errors=True)
+
+    def test_new_post_published_after_commit(self):
+        """Новый пост после коммита сдвигает версии каналов своих лент."""
+        author = User.objects.create_user(username='Author')
+        group = Group.objects.create(title='test_group', slug='test_slug')
+        channels = [GLOBAL, author_scope('Author'), group_scope('test_slug')]
+        before = [broadcaster.read(channel) for channel in channels]
+        Post.objects.create(text='text', author=author, group=group)
+        after = [broadcaster.read(channel) for channel in channels]
+        for old, new in zip(before, after):
+            self.assertGreater(new, old)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, DELETION_BATCH_SIZE=2)
+class DeletionTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='Author')
+        self.reader = User.objects.create_user(username='Reader')
+        self.group = Group.objects.create(title='test_group', slug='slug')
+        self.posts = [
+            Post.objects.create(
+                text=f'post_{index}', author=self.author, group=self.group)
+            for index in range(5)
+        ]
+        Comment.objects.create(
+            post=self.posts[0], author=self.reader, text='comment')
+        Follow.objects.create(user=self.reader, author=self.author)
+
+    def test_user_is_hidden_at_once(self):
+        """Удаляемый автор и его посты сразу пропадают со страниц."""
+        index_url = reverse('posts:index')
+        self.assertEqual(
+            len(self.client.get(index_url).context['page_obj']), 5)
+        delete_in_background(self.author)
+        self.assertEqual(
+            len(self.client.get(index_url).context['page_obj']), 0)
+        for url in (
+            reverse('posts:profile', kwargs={'username': 'Author'}),
+            reverse('posts:post_detail',
+                    kwargs={'post_id': self.posts[0].pk}),
+        ):
+            self.assertEqual(
+                self.client.get(url).status_code, HTTPStatus.NOT_FOUND)
+
+    def test_user_deleted_in_batches(self):
+        """Зависимые строки удаляются пачками с отчётом о прогрессе."""
+        job = delete_in_background(self.author)
+        self.assertEqual(job.total, 1 + 5 + 1)
+        self.assertTrue(run_batch(job.pk))
+        job.refresh_from_db()
+        self.assertEqual(job.status, DeletionJob.RUNNING)
+        self.assertEqual((job.done, job.progress), (2, 28))
+        run_pending()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.progress), (DeletionJob.DONE, 100))
+        self.assertFalse(User.objects.filter(username='Author').exists())
+        self.assertFalse(Post.objects.exists())
+        self.assertFalse(Comment.objects.exists())
+        self.assertFalse(Follow.objects.exists())
+
+    def test_post_dependents_cleared_first(self):
+        """Перед пачкой постов пачками удаляются их комментарии."""
+        post = self.posts[-1]
+        for index in range(3):
+            Comment.objects.create(
+                post=post, author=self.reader, text=f'comment_{index}')
+        job = delete_in_background(self.author)
+        self.assertTrue(run_batch(job.pk))
+        self.assertEqual(Comment.objects.filter(post=post).count(), 1)
+        self.assertTrue(Post.objects.filter(pk=post.pk).exists())
+        job.refresh_from_db()
+        self.assertEqual(job.done, 0)
+
+    def test_hidden_post_leaves_feed_ids(self):
+        """Скрытый пост сразу пропадает из закэшированных id лент."""
+        Post.objects.create(text='other', author=self.reader)
+        scopes = {
+            GLOBAL: Post.objects.all(),
+            group_scope('slug'): self.group.posts.all(),
+            follower_scope(self.reader.pk): Post.objects.filter(
+                author__following__user=self.reader),
+        }
+        for scope, posts in scopes.items():
+            self.assertIn(self.posts[0].pk, feed_ids(scope, posts).ids)
+        delete_in_background(Post.objects.get(pk=self.posts[0].pk))
+        run_pending()
+        for scope, posts in scopes.items():
+            self.assertNotIn(self.posts[0].pk, feed_ids(scope, posts).ids)
+        delete_in_background(self.author)
+        self.assertEqual(feed_ids(GLOBAL, Post.objects.all()).total, 1)
+
+    def test_hidden_post_leaves_syndication(self):
+        """Скрытые посты и посты удаляемых авторов уходят из RSS и Atom."""
+        urls = [
+            reverse('posts:index_feed', kwargs={'fmt': 'rss'}),
+            reverse('posts:group_feed',
+                    kwargs={'slug': self.group.slug, 'fmt': 'atom'}),
+        ]
+
+        def served(url):
+            response = self.client.get(url)
+            return b''.join(response.streaming_content)
+
+        for url in urls:
+            self.assertIn(b'post_0', served(url))
+        delete_in_background(Post.objects.get(pk=self.posts[0].pk))
+        run_pending()
+        for url in urls:
+            with self.subTest(url=url):
+                content = served(url)
+                self.assertNotIn(b'post_0', content)
+                self.assertIn(b'post_1', content)
+        delete_in_background(self.author)
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertNotIn(b'post_1', served(url))
+
+    def test_failure_recorded_on_job(self):
+        """Упавшая пачка отмечает задание ошибкой."""
+        job = delete_in_background(self.author)
+        with mock.patch('posts.deletion.clear_batch',
+                        side_effect=RuntimeError('boom')):
+            run_pending()
+        job.refresh_from_db()
+        self.assertEqual(job.status, DeletionJob.FAILED)
+        self.assertIn('boom', job.error)
+        run_batch(job.pk)
+        job.refresh_from_db()
+        self.assertEqual(
+            (job.status, job.error), (DeletionJob.RUNNING, ''))
+
+    def test_group_posts_detached(self):
+        """Посты удаляемой группы остаются, но без группы."""
+        job = delete_in_background(self.group)
+        url = reverse('posts:group_list', kwargs={'slug': 'slug'})
+        self.assertEqual(
+            self.client.get(url).status_code, HTTPStatus.NOT_FOUND)
+        page = self.client.get(reverse('posts:index')).context['page_obj']
+        self.assertEqual([post.group for post in page], [None] * 5)
+        while run_batch(job.pk):
+            pass
+        self.assertFalse(Group.objects.exists())
+        self.assertEqual(Post.objects.filter(group__isnull=True).count(), 5)
+
+    def test_post_images_released(self):
+        """Картинки удалённых постов уходят на очистку."""
+        post = self.posts[1]
+        post.image = SimpleUploadedFile(
+            'small.gif',
+            b'GIF89a\x01\x00\x01\x00\x80\x00\x00\x00\x00\x00\xFF\xFF'
+            b'\xFF\x21\xF9\x04\x00\x00\x00\x00\x00\x2C\x00\x00\x00'
+            b'\x00\x01\x00\x01\x00\x00\x02\x02\x0C\x0A\x00\x3B',
+            content_type='image/gif')
+        post.save()
+        blob = ImageBlob.objects.get()
+        delete_in_background(self.author)
+        run_pending()
+        blob.refresh_from_db()
+        self.assertEqual(blob.refs, 0)
+        self.assertTrue(Task.objects.filter(
+            name=PURGE_IMAGE_BLOB, status=Task.QUEUED).exists())
+
+
+class ViewCounterTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Auth_user')
+        cls.post = Post.objects.create(text='test_post', author=cls.user)
+        cls.other_post = Post.objects.create(text='other', author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.now = 1_000_000.0
+        patcher = mock.patch('posts.counters.time.time', lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_views_are_buffered_and_flushed(self):
+        """Просмотры копятся в кэше и сохраняются одним запросом."""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        self.client.get(url)
+        response = self.client.get(url)
+        view_counter.hit(self.other_post.id)
+        self.assertEqual(response.context['views'], 2)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.views, 0)
+        self.assertEqual(view_counter.flush(), 0)
+        self.now += 2 * settings.POST_VIEWS_FLUSH_INTERVAL
+        with self.assertNumQueries(2):
+            self.assertEqual(view_counter.flush(), 2)
+        self.post.refresh_from_db()
+        self.other_post.refresh_from_db()
+        self.assertEqual(self.post.views, 2)
+        self.assertEqual(self.other_post.views, 1)
+        self.assertEqual(view_counter.count(self.post), 2)
+
+    def test_views_survive_process_buffer(self):
+        """Просмотры из кэша не теряются и не сохраняются дважды."""
+        view_counter.hit(self.post.id)
+        self.now += settings.POST_VIEWS_FLUSH_INTERVAL
+        view_counter.hit(self.post.id)
+        self.now += 2 * settings.POST_VIEWS_FLUSH_INTERVAL
+        view_counter.flush()
+        view_counter.flush()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.views, 2)
+
+    def test_views_flushed_in_batches(self):
+        """Большая корзина сохраняется пачками."""
+        view_counter.hit(self.post.id)
+        view_counter.hit(self.other_post.id)
+        self.now += 2 * settings.POST_VIEWS_FLUSH_INTERVAL
+        with self.settings(POST_VIEWS_BATCH_SIZE=1):
+            with self.assertNumQueries(4):
+                view_counter.flush()
+        self.other_post.refresh_from_db()
+        self.assertEqual(self.other_post.views, 1)
+
+
+class LikeTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Auth_user')
+        cls.reader = User.objects.create_user(username='Reader')
+        cls.post = Post.objects.create(text='test_post', author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+        self.user_client = Client()
+        self.user_client.force_login(self.user)
+
+    def like(self, client, name='posts:post_like'):
+        return client.post(reverse(name, kwargs={'post_id': self.post.id}))
+
+    def test_like_and_unlike(self):
+        """Отметка ставится один раз и снимается."""
+        self.like(self.reader_client)
+        self.like(self.reader_client)
+        self.like(self.user_client)
+        response = self.reader_client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}))
+        self.assertEqual(response.context['post'].likes_total, 2)
+        self.assertTrue(response.context['post'].liked)
+        self.like(self.reader_client, 'posts:post_unlike')
+        response = self.reader_client.get(reverse('posts:index'))
+        self.assertEqual(response.context['page_obj'][0].likes_total, 1)
+        self.assertFalse(response.context['page_obj'][0].liked)
+
+    def test_counter_is_sharded(self):
+        """Счётчик раскладывается по шардам не больше заданного числа."""
+        for number in range(20):
+            reader = User.objects.create_user(username=f'Reader_{number}')
+            client = Client()
+            client.force_login(reader)
+            self.like(client)
+        counters = LikeCounter.objects.filter(post=self.post)
+        self.assertLessEqual(counters.count(), settings.LIKE_COUNTER_SHARDS)
+        self.assertEqual(sum(counters.values_list('count', flat=True)), 20)
+
+    def test_liked_ids_are_cached(self):
+        """Отметки пользователя читаются из кэша без запросов к базе."""
+        self.like(self.reader_client)
+        self.assertEqual(liked_post_ids(self.reader), {self.post.id})
+        with self.assertNumQueries(0):
+            self.assertEqual(liked_post_ids(self.reader), {self.post.id})
+
+    def test_like_requires_post(self):
+        """GET-запрос не ставит отметку, скрытый пост отметить нельзя."""
+        response = self.reader_client.get(
+            reverse('posts:post_like', kwargs={'post_id': self.post.id}))
+        self.assertEqual(
+            response.status_code, HTTPStatus.METHOD_NOT_ALLOWED)
+        self.assertFalse(Like.objects.exists())
+        hidden = Post.objects.create(
+            text='hidden', author=self.user, hidden=True)
+        response = self.reader_client.post(
+            reverse('posts:post_like', kwargs={'post_id': hidden.id}))
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+    def test_deleted_liker_leaves_counter(self):
+        """Удаление пользователя снимает его отметку со счётчика."""
+        liker = User.objects.create_user(username='Liker')
+        client = Client()
+        client.force_login(liker)
+        self.like(client)
+        self.like(self.reader_client)
+        liker.delete()
+        self.assertEqual(like_counts([self.post.id]), {self.post.id: 1})
+        self.like(self.reader_client, 'posts:post_unlike')
+        self.assertEqual(like_counts([self.post.id]), {self.post.id: 0})
+
+
+class TrendingTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Auth_user')
+        cls.quiet_post = Post.objects.create(text='quiet', author=cls.user)
+        cls.hot_post = Post.objects.create(text='hot', author=cls.user)
+        Post.objects.update(pub_date=timezone.now() - timedelta(days=2))
+
+    def comment(self, post, count):
+        Comment.objects.bulk_create(
+            Comment(post=post, author=self.user, text=f'{number}')
+            for number in range(count)
+        )
+
+    def test_posts_ranked_by_engagement(self):
+        """Пост с большим числом комментариев выше в ленте."""
+        self.comment(self.hot_post, 5)
+        self.assertEqual(rank(), 2)
+        response = self.client.get(reverse('posts:trending'))
+        self.assertEqual(
+            list(response.context['page_obj']),
+            [self.hot_post, self.quiet_post]
+        )
+
+    def test_only_touched_posts_are_rescored(self):
+        """Повторный расчёт затрагивает только посты с новой активностью."""
+        rank()
+        TrendingPost.objects.update(
+            computed=timezone.now() - timedelta(days=1))
+        self.comment(self.quiet_post, 3)
+        self.assertEqual(rank(), 1)
+        self.assertEqual(
+            TrendingPost.objects.first().post_id, self.quiet_post.pk)
+
+    def test_activity_without_dates_is_rescored(self):
+        """Отмена лайка, просмотры и подписки пересчитывают посты."""
+        follower = User.objects.create_user(username='Follower')
+        rank()
+        TrendingPost.objects.update(
+            computed=timezone.now() - timedelta(days=1))
+        like(follower, self.quiet_post)
+        rank()
+        TrendingPost.objects.update(
+            computed=timezone.now() - timedelta(days=1))
+        unlike(follower, self.quiet_post)
+        self.assertEqual(rank(), 1)
+        TrendingPost.objects.update(
+            computed=timezone.now() - timedelta(days=1))
+        Follow.objects.create(user=follower, author=self.user)
+        self.assertEqual(rank(), 2)
+        self.assertEqual(rank(), 0)
+
+    def test_ranking_is_rescheduled_after_failure(self):
+        """Сбой расчёта не обрывает периодический пересчёт."""
+        with mock.patch('posts.trending.rank', side_effect=ValueError):
+            with self.assertRaises(ValueError):
+                rank_trending()
+        self.assertTrue(Task.objects.filter(
+            name=RANK_TRENDING, status=Task.QUEUED).exists())
+
+    def test_trending_page_is_single_query_read(self):
+        """Страница популярного читает готовый рейтинг без пересчёта."""
+        rank()
+        with self.assertNumQueries(3):
+            self.client.get(reverse('posts:trending'))
+
+
+class RecommendationTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader, cls.peer, cls.other_peer = (
+            User.objects.create_user(username=name)
+            for name in ('Reader', 'Peer', 'Other_peer')
+        )
+        cls.popular, cls.similar, cls.niche = (
+            User.objects.create_user(username=name)
+            for name in ('Popular', 'Similar', 'Niche')
+        )
+        Follow.objects.bulk_create([
+            Follow(user=cls.reader, author=cls.popular),
+            Follow(user=cls.peer, author=cls.popular),
+            Follow(user=cls.peer, author=cls.similar),
+            Follow(user=cls.other_peer, author=cls.niche),
+        ])
+
+    def setUp(self):
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def recommended(self, user):
+        return list(Recommendation.objects.filter(
+            user=user).values_list('author__username', flat=True))
+
+    def test_rebuild_uses_co_follows(self):
+        """Рекомендуются авторы, на которых подписаны похожие читатели."""
+        rebuild()
+        self.assertEqual(self.recommended(self.reader), ['Similar'])
+        self.assertEqual(self.recommended(self.other_peer), [])
+        response = self.reader_client.get(reverse(
+            'posts:profile', kwargs={'username': self.popular.username}))
+        self.assertEqual(
+            list(response.context['recommendations']), [self.similar])
+
+    def test_inactive_author_is_not_recommended(self):
+        """Деактивированный автор не попадает в рекомендации."""
+        rebuild()
+        User.objects.filter(pk=self.similar.pk).update(is_active=False)
+        self.assertEqual(list(recommended_authors(self.reader)), [])
+
+    def test_follow_refreshes_affected_users(self):
+        """Подписка пересчитывает рекомендации затронутых пользователей."""
+        rebuild()
+        self.reader_client.post(reverse(
+            'posts:profile_follow', kwargs={'username': self.niche}))
+        run_pending()
+        self.assertEqual(self.recommended(self.reader), ['Similar'])
+        self.assertEqual(self.recommended(self.other_peer), ['Popular'])
+        self.reader_client.post(reverse(
+            'posts:profile_unfollow', kwargs={'username': self.popular}))
+        run_pending()
+        self.assertEqual(self.recommended(self.reader), [])
+
+    def test_fanout_is_capped_per_hop(self):
+        """С популярного автора читается только выборка подписчиков."""
+        with self.settings(RECOMMENDATIONS_HOP_LIMIT=1):
+            followers, counts = adjacency('author', [self.popular.pk])
+            self.assertEqual(followers[self.popular.pk], {self.peer.pk})
+            self.assertEqual(counts[self.popular.pk], 2)
+            rebuild()
+        self.assertEqual(self.recommended(self.reader), ['Similar'])
+
+
+class FollowSetsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Author')
+        cls.reader = User.objects.create_user(username='Reader')
+
+    def setUp(self):
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def follow(self, name='posts:profile_follow'):
+        self.reader_client.post(
+            reverse(name, kwargs={'username': self.author.username}))
+
+    def profile(self):
+        return self.reader_client.get(reverse(
+            'posts:profile', kwargs={'username': self.author.username}))
+
+    def test_follow_updates_cached_sets(self):
+        """Подписка сразу видна в кнопке и счётчиках профиля."""
+        self.follow()
+        response = self.profile()
+        self.assertTrue(response.context['following'])
+        self.assertEqual(response.context['followers_count'], 1)
+        self.assertEqual(response.context['following_count'], 0)
+        self.follow('posts:profile_unfollow')
+        response = self.profile()
+        self.assertFalse(response.context['following'])
+        self.assertEqual(response.context['followers_count'], 0)
+
+    def test_ajax_follow_returns_state(self):
+        """AJAX-подписка отвечает JSON с новым состоянием."""
+        url = reverse(
+            'posts:profile_follow', kwargs={'username': self.author.username})
+        response = self.reader_client.post(
+            url, HTTP_ACCEPT='application/json')
+        self.assertEqual(
+            response.json(), {'following': True, 'followers_count': 1})
+        response = self.reader_client.post(reverse(
+            'posts:profile_unfollow',
+            kwargs={'username': self.author.username}
+        ), HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(
+            response.json(), {'following': False, 'followers_count': 0})
+
+    def test_follow_click_queries(self):
+        """Подписка и отписка: запись, пометка трендов и задача.
+
+        Имя автора после первого клика берётся из кэша; у подписки
+        ещё пара запросов SAVEPOINT вокруг INSERT, у отписки — выборка
+        строки перед DELETE ради сигналов.
+        """
+        self.follow()
+        self.follow('posts:profile_unfollow')
+        with self.assertNumQueries(5):
+            self.follow()
+        with self.assertNumQueries(4):
+            self.follow('posts:profile_unfollow')
+        self.assertFalse(Follow.objects.exists())
+        self.assertEqual(following_ids(self.reader.pk), set())
+
+    def test_ajax_follow_requires_post(self):
+        """AJAX-запрос по GET не меняет подписку."""
+        for name in ('posts:profile_follow', 'posts:profile_unfollow'):
+            with self.subTest(name=name):
+                response = self.reader_client.get(reverse(
+                    name, kwargs={'username': self.author.username}
+                ), HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+                self.assertEqual(
+                    response.status_code, HTTPStatus.METHOD_NOT_ALLOWED)
+        self.assertFalse(Follow.objects.exists())
+
+    def test_cannot_follow_self(self):
+        """Подписаться на самого себя нельзя."""
+        self.reader_client.post(reverse(
+            'posts:profile_follow', kwargs={'username': self.reader.username}))
+        self.assertFalse(Follow.objects.filter(user=self.reader).exists())
+
+    def test_follow_state_served_from_cache(self):
+        """Повторные проверки подписки не обращаются к базе."""
+        following_ids(self.reader.pk)
+        self.follow()
+        with self.assertNumQueries(0):
+            self.assertEqual(following_ids(self.reader.pk), {self.author.pk})
+
+    def test_follow_sets_follow_any_write(self):
+        """Кэш подписок следит за правками в обход представлений."""
+        self.follow()
+        self.assertEqual(self.profile().context['followers_count'], 1)
+        Follow.objects.filter(author=self.author).delete()
+        self.assertEqual(following_ids(self.reader.pk), set())
+        self.assertEqual(self.profile().context['followers_count'], 0)
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(following_ids(self.reader.pk), {self.author.pk})
+        self.assertEqual(self.profile().context['followers_count'], 1)
+        gone = User.objects.create_user(username='Gone')
+        Follow.objects.create(user=self.reader, author=gone)
+        gone.delete()
+        self.assertEqual(following_ids(self.reader.pk), {self.author.pk})
+
+    def test_follow_lists(self):
+        """Страницы подписчиков и подписок показывают пользователей."""
+        self.follow()
+        response = self.reader_client.get(reverse(
+            'posts:profile_followers',
+            kwargs={'username': self.author.username}))
+        self.assertEqual(list(response.context['page_obj']), [self.reader])
+        response = self.reader_client.get(reverse(
+            'posts:profile_following',
+            kwargs={'username': self.reader.username}))
+        self.assertEqual(list(response.context['page_obj']), [self.author])
+
+
+class SyndicationTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Auth_user')
+        cls.group = Group.objects.create(title='test_group', slug='test_slug')
+        cls.post = Post.objects.create(
+            text='test_post', author=cls.user, group=cls.group)
+
+    def setUp(self):
+        cache.clear()
+
+    def get_feed(self, url, **headers):
+        response = self.client.get(url, **headers)
+        if response.streaming:
+            return response, b''.join(response.streaming_content)
+        return response, response.content
+
+    def test_feeds_are_valid_xml(self):
+        """Ленты RSS и Atom отдаются потоком и содержат посты."""
+        urls = [
+            reverse('posts:index_feed', kwargs={'fmt': 'rss'}),
+            reverse('posts:group_feed',
+                    kwargs={'slug': self.group.slug, 'fmt': 'atom'}),
+            reverse('posts:profile_feed',
+                    kwargs={'username': self.user.username, 'fmt': 'rss'}),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertTrue(response.streaming)
+                content = b''.join(response.streaming_content)
+                ElementTree.fromstring(content)
+                self.assertIn(reverse(
+                    'posts:post_detail', kwargs={'post_id': self.post.id}
+                ).encode(), content)
+
+    def test_post_html_is_escaped(self):
+        """Разметка из текста поста попадает в ленту экранированной."""
+        Post.objects.create(
+            text='<img src=x onerror=alert(1)>', author=self.user)
+        _, content = self.get_feed(
+            reverse('posts:index_feed', kwargs={'fmt': 'rss'}))
+        descriptions = [
+            item.findtext('description')
+            for item in ElementTree.fromstring(content).iter('item')
+        ]
+        self.assertIn('<p>&lt;img src=x onerror=alert(1)&gt;</p>',
+                      descriptions)
+
+    def test_unknown_feed_is_not_found(self):
+        """Неизвестный формат или группа дают 404."""
+        urls = [
+            reverse('posts:index_feed', kwargs={'fmt': 'json'}),
+            reverse('posts:group_feed',
+                    kwargs={'slug': 'missing', 'fmt': 'rss'}),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+    def test_conditional_get_for_missing_group(self):
+        """Условный запрос к удалённой группе получает 404, а не 304."""
+        group = Group.objects.create(title='gone', slug='gone')
+        url = reverse(
+            'posts:group_feed', kwargs={'slug': 'gone', 'fmt': 'rss'})
+        first, _ = self.get_feed(url)
+        group.delete()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+    def test_deleted_post_changes_feed_stamp(self):
+        """Удаление поста меняет метку ленты и убирает его из неё."""
+        post = Post.objects.create(text='short_lived', author=self.user)
+        url = reverse('posts:index_feed', kwargs={'fmt': 'rss'})
+        first, _ = self.get_feed(url)
+        post.delete()
+        second, content = self.get_feed(
+            url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(second.status_code, HTTPStatus.OK)
+        self.assertNotIn(b'short_lived', content)
+
+    def test_feed_is_cached_and_conditional(self):
+        """Повторный запрос берётся из кэша, условный — получает 304."""
+        url = reverse('posts:index_feed', kwargs={'fmt': 'atom'})
+        first, first_content = self.get_feed(url)
+        with self.assertNumQueries(0):
+            _, second_content = self.get_feed(url)
+            not_modified = self.client.get(
+                url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(first_content, second_content)
+        self.assertEqual(not_modified.status_code, HTTPStatus.NOT_MODIFIED)
+
+    def test_new_post_changes_feed_stamp(self):
+        """Новый пост меняет метку ленты и её содержимое."""
+        url = reverse('posts:profile_feed',
+                      kwargs={'username': self.user.username, 'fmt': 'rss'})
+        first, _ = self.get_feed(url)
+        Post.objects.create(text='fresh_post', author=self.user)
+        second, content = self.get_feed(
+            url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(second.status_code, HTTPStatus.OK)
+        self.assertNotEqual(first['ETag'], second['ETag'])
+        self.assertIn(b'fresh_post', content)
+
+
+SITEMAP_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(SITEMAP_ROOT=SITEMAP_ROOT, SITEMAP_SHARD_SIZE=2,
+                   SITEMAP_CHUNK_SIZE=1)
+class SitemapTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Auth_user')
+        cls.group = Group.objects.create(title='test_group', slug='test_slug')
+        cls.posts = [
+            Post.objects.create(text=f'post_{index}', author=cls.user)
+            for index in range(3)
+        ]
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(SITEMAP_ROOT, ignore_errors=True)
+
+    def read_shard(self, name):
+        with gzip.open(os.path.join(SITEMAP_ROOT, name)) as shard:
+            return ElementTree.fromstring(shard.read())
+
+    def test_sitemaps_cover_all_urls(self):
+        """Шарды карты сайта содержат посты, профили и группы."""
+        build(full=True)
+        response = self.client.get(reverse('posts:sitemap'))
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        index = ElementTree.fromstring(b''.join(response.streaming_content))
+        names = [
+            location.text.rsplit('/', 1)[-1] for location in index.iter(
+                '{http://www.sitemaps.org/schemas/sitemap/0.9}loc')
+        ]
+        locations = set()
+        for name in names:
+            self.assertEqual(self.client.get(
+                reverse('posts:sitemap_shard', kwargs={'name': name})
+            ).status_code, HTTPStatus.OK)
+            locations.update(
+                location.text.replace(settings.SITEMAP_BASE_URL, '')
+                for location in self.read_shard(name).iter(
+                    '{http://www.sitemaps.org/schemas/sitemap/0.9}loc'))
+        expected = {
+            reverse('posts:post_detail', kwargs={'post_id': post.id})
+            for post in self.posts
+        }
+        expected.add(reverse('posts:profile',
+                             kwargs={'username': self.user.username}))
+        expected.add(reverse('posts:group_list',
+                             kwargs={'slug': self.group.slug}))
+        self.assertEqual(locations, expected)
+
+    def test_refresh_rewrites_changed_shards_only(self):
+        """Повторная сборка переписывает только изменившиеся шарды."""
+        build(full=True)
+        self.assertEqual(build(), [])
+        post = Post.objects.create(text='fresh_post', author=self.user)
+        written = build()
+        self.assertEqual(written, [f'posts-{(post.pk - 1) // 2:04d}.xml.gz'])
+
+    def test_renames_and_edits_rewrite_shards(self):
+        """Переименование и правка поста переписывают свои шарды."""
+        build(full=True)
+        User.objects.filter(pk=self.user.pk).update(username='Renamed_user')
+        Group.objects.filter(pk=self.group.pk).update(slug='renamed_slug')
+        post = Post.objects.get(pk=self.posts[0].pk)
+        post.text = 'edited'
+        post.save()
+        self.assertEqual(sorted(build()), [
+            f'groups-{(self.group.pk - 1) // 2:04d}.xml.gz',
+            f'posts-{(post.pk - 1) // 2:04d}.xml.gz',
+            f'profiles-{(self.user.pk - 1) // 2:04d}.xml.gz',
+        ])
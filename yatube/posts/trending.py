@@ -0,0 +1,115 @@
+import math
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Count, Max
+from django.utils import timezone
+
+from . import likes
+from .models import Comment, Follow, Like, Post, TrendingPost
+
+BATCH_SIZE = 500
+
+
+def score(pub_date, comments, likes, views, followers):
+    """Рейтинг поста для ленты «Популярное».
+
+    Вовлечённость умножается на охват автора (число подписчиков) и
+    берётся по логарифму, а к ней прибавляется время публикации,
+    делённое на TRENDING_DECAY. Поэтому более старому посту нужно
+    в 10 раз больше активности, чтобы держаться рядом с постом,
+    опубликованным на TRENDING_DECAY секунд позже. Рейтинг не
+    зависит от текущего времени, и пересчитывать нужно только посты,
+    у которых появилась новая активность.
+    """
+    engagement = (
+        settings.TRENDING_COMMENT_WEIGHT * comments
+        + settings.TRENDING_LIKE_WEIGHT * likes
+        + settings.TRENDING_VIEW_WEIGHT * views
+    )
+    reach = 1 + math.log10(1 + followers)
+    return (
+        math.log10(1 + engagement * reach)
+        + pub_date.timestamp() / settings.TRENDING_DECAY
+    )
+
+
+def touch(**lookups):
+    """Помечает посты для пересчёта при следующем запуске rank."""
+    TrendingPost.objects.filter(**lookups).update(dirty=True)
+
+
+def take_dirty():
+    ids = list(TrendingPost.objects.filter(
+        dirty=True).values_list('post_id', flat=True))
+    TrendingPost.objects.filter(post_id__in=ids).update(dirty=False)
+    return ids
+
+
+def touched_since(since, cutoff):
+    """Посты с новыми постами, комментариями и лайками с since.
+
+    Отмены лайков, просмотры и подписки следов с датой не оставляют,
+    их посты помечены флагом dirty.
+    """
+    ids = set(take_dirty())
+    ids.update(Post.objects.filter(
+        pub_date__gte=max(since, cutoff)).values_list('pk', flat=True))
+    ids.update(Comment.objects.filter(
+        created__gte=since, post__pub_date__gte=cutoff
+    ).values_list('post_id', flat=True))
+    ids.update(Like.objects.filter(
+        created__gte=since, post__pub_date__gte=cutoff
+    ).values_list('post_id', flat=True))
+    return ids
+
+
+def rescore(post_ids):
+    posts = list(
+        Post.objects.filter(pk__in=post_ids)
+        .annotate(comments_total=Count('comments'))
+        .values_list('pk', 'pub_date', 'views', 'author_id', 'comments_total')
+    )
+    like_totals = likes.like_counts(post_ids)
+    followers = dict(
+        Follow.objects.filter(author_id__in={post[3] for post in posts})
+        .values_list('author_id').annotate(Count('pk')).order_by()
+    )
+    rows = [
+        TrendingPost(
+            post_id=pk,
+            score=score(pub_date, comments, like_totals.get(pk, 0), views,
+                        followers.get(author_id, 0)),
+            computed=timezone.now(),
+        )
+        for pk, pub_date, views, author_id, comments in posts
+    ]
+    existing = set(TrendingPost.objects.filter(
+        post_id__in=post_ids).values_list('post_id', flat=True))
+    TrendingPost.objects.bulk_update(
+        [row for row in rows if row.post_id in existing],
+        ['score', 'computed'])
+    TrendingPost.objects.bulk_create(
+        [row for row in rows if row.post_id not in existing])
+    return len(rows)
+
+
+def rank(full=False):
+    """Пересчитывает рейтинг постов с активностью с прошлого запуска.
+
+    Без прошлых результатов (или с full=True) пересчитываются все
+    посты моложе TRENDING_MAX_AGE.
+    """
+    now = timezone.now()
+    cutoff = now - timedelta(seconds=settings.TRENDING_MAX_AGE)
+    TrendingPost.objects.filter(post__pub_date__lt=cutoff).delete()
+    last_run = TrendingPost.objects.aggregate(last=Max('computed'))['last']
+    if full or last_run is None:
+        since = cutoff
+    else:
+        since = last_run - timedelta(seconds=settings.TRENDING_INTERVAL)
+    ids = sorted(touched_since(since, cutoff))
+    ranked = 0
+    for start in range(0, len(ids), BATCH_SIZE):
+        ranked += rescore(ids[start:start + BATCH_SIZE])
+    return ranked
@@ -0,0 +1,59 @@
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.core.files.uploadhandler import (StopUpload,
+                                             TemporaryFileUploadHandler)
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+
+
+def oversized_fields(request):
+    """Поля, загрузку которых LimitedUploadHandler прервал по размеру."""
+    return getattr(request, 'oversized_uploads', frozenset())
+
+
+class LimitedUploadHandler(TemporaryFileUploadHandler):
+    """Пишет загрузку во временный файл по кускам, не держа её в памяти.
+
+    Попутно считает sha256 содержимого. Как только файл превышает
+    FILE_UPLOAD_MAX_SIZE, разбор тела прекращается без дочитывания,
+    а поле попадает в oversized_fields(request), чтобы форма сообщила
+    о размере, а не о битой картинке.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+        self.digest = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > settings.FILE_UPLOAD_MAX_SIZE:
+            if self.request is not None:
+                self.request.oversized_uploads = (
+                    oversized_fields(self.request) | {self.field_name})
+            raise StopUpload(connection_reset=True)
+        self.digest.update(raw_data)
+        self.file.write(raw_data)
+        return None
+
+    def file_complete(self, file_size):
+        uploaded = super().file_complete(file_size)
+        uploaded.sha256 = self.digest.hexdigest()
+        return uploaded
+
+
+def limit_uploads(view):
+    """Включает LimitedUploadHandler только для этого представления.
+
+    Обработчики нельзя сменить после разбора тела, а CsrfViewMiddleware
+    читает POST раньше представления, поэтому CSRF проверяется внутри.
+    """
+    protected = csrf_protect(view)
+
+    @csrf_exempt
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        request.upload_handlers = [LimitedUploadHandler(request)]
+        return protected(request, *args, **kwargs)
+    return wrapper
@@ -1,4 +1,4 @@
-from django.urls import path
+from django.urls import path, re_path
 
 from . import views
 
@@ -6,14 +6,40 @@ app_name = 'posts'
 
 urlpatterns = [
     path('', views.index, name='index'),
+    path('more/', views.index_more, name='index_more'),
+    path('events/', views.index_events, name='index_events'),
+    path('feed/<str:fmt>/', views.index_feed, name='index_feed'),
+    path('sitemap.xml', views.sitemap, name='sitemap'),
+    re_path(r'^sitemaps/(?P<name>[\w-]+\.xml\.gz)$',
+            views.sitemap, name='sitemap_shard'),
+    path('trending/', views.trending, name='trending'),
+    path('trending/more/', views.trending_more, name='trending_more'),
     path('create/', views.post_create, name='post_create'),
     path('group/<slug:slug>/', views.group_posts, name='group_list'),
+    path('group/<slug:slug>/more/', views.group_more, name='group_more'),
+    path('group/<slug:slug>/events/',
+         views.group_events, name='group_events'),
+    path('group/<slug:slug>/feed/<str:fmt>/',
+         views.group_feed, name='group_feed'),
     path('posts/<int:post_id>/', views.post_detail, name='post_detail'),
     path('posts/<int:post_id>/edit/', views.post_edit, name='post_edit'),
     path('posts/<int:post_id>/comment/',
          views.add_comment, name='add_comment'),
+    path('posts/<int:post_id>/like/', views.post_like, name='post_like'),
+    path('posts/<int:post_id>/unlike/',
+         views.post_unlike, name='post_unlike'),
     path('profile/<str:username>/', views.profile, name='profile'),
+    path('profile/<str:username>/more/',
+         views.profile_more, name='profile_more'),
+    path('profile/<str:username>/feed/<str:fmt>/',
+         views.profile_feed, name='profile_feed'),
+    path('profile/<str:username>/followers/',
+         views.profile_followers, name='profile_followers'),
+    path('profile/<str:username>/following/',
+         views.profile_following, name='profile_following'),
     path('follow/', views.follow_index, name='follow_index'),
+    path('follow/more/', views.follow_more, name='follow_more'),
+    path('follow/events/', views.follow_events, name='follow_events'),
     path('profile/<str:username>/follow/',
          views.profile_follow, name='profile_follow'),
     path('profile/<str:username>/unfollow/', views.profile_unfollow,
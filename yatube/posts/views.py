@@ -1,10 +1,31 @@
+from functools import wraps
+
+from core import thumbnails
 from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.core.paginator import Paginator
+from django.http import (Http404, HttpResponseNotAllowed, JsonResponse,
+                         StreamingHttpResponse)
 from django.shortcuts import get_object_or_404, redirect, render
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.views.decorators.http import require_POST
+from django.views.static import serve
 
+from . import events, feedcache, scroll, sitemaps, stamps
+from .cards import CARD_THUMBNAIL, attach_cards
+from .counters import view_counter
+from .follows import (follow, follower_count, follower_ids, following_ids,
+                      is_following, unfollow)
 from .forms import CommentForm, PostForm
-from .models import Comment, Follow, Group, Post, User
+from .likes import attach_likes, like, unlike
+from .models import Comment, Group, Post, User
+from .recommendations import recommended_authors
+from .stamps import (GLOBAL, author_scope, follower_scope, group_scope,
+                     stamp)
+from .syndication import feed_response
+from .tasks import refresh_affected_recommendations
+from .uploads import limit_uploads, oversized_fields
 
 
 def pagination(posts, request):
@@ -14,50 +35,262 @@ def pagination(posts, request):
     return page_obj
 
 
+def wants_json(request):
+    """Запрос пришёл из fetch/XHR и ждёт JSON, а не редирект."""
+    return (request.is_ajax()
+            or 'application/json' in request.META.get('HTTP_ACCEPT', ''))
+
+
+def json_requires_post(view):
+    """fetch/XHR меняет состояние только POST-запросом с CSRF-токеном.
+
+    Обычная ссылка по GET остаётся для совместимости с прежними
+    адресами подписки.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if wants_json(request) and request.method != 'POST':
+            return HttpResponseNotAllowed(['POST'])
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+def prepare_posts(posts, user):
+    """Лайки, заранее загруженные миниатюры и готовые карточки."""
+    posts = attach_likes(posts, user)
+    geometry, options = CARD_THUMBNAIL
+    thumbnails.prefetch((post.image for post in posts), geometry, **options)
+    return attach_cards(posts)
+
+
+def post_page(posts, request, scope=None):
+    """Страница ленты с лайками и заранее загруженными миниатюрами.
+
+    Для ленты со scope id постов и сами посты берутся из кэша.
+    """
+    if scope is None:
+        page_obj = pagination(posts, request)
+    else:
+        page_obj = feedcache.paginate(request, scope, posts)
+    page_obj.object_list = prepare_posts(
+        page_obj.object_list, request.user)
+    return page_obj
+
+
+def feed_more(request, scope, posts, load_ids=None, **context):
+    """Фрагмент бесконечной прокрутки: карточки после ?after=<id поста>.
+
+    Готовый HTML кэшируется шаблоном по ленте, курсору, пользователю
+    и последней из меток ленты и её списка id.
+    """
+    if load_ids is None:
+        def load_ids():
+            return feedcache.feed_ids(scope, posts)
+    cursor = scroll.parse_cursor(request.GET.get('after'))
+    context.update({
+        'chunk': scroll.Chunk(
+            load_ids, posts, cursor,
+            lambda page: prepare_posts(page, request.user)),
+        'scope': scope,
+        'cursor': cursor,
+        'feed_stamp': stamps.changed(scope) if scope else None,
+        'more_url': request.path,
+    })
+    return render(request, 'posts/feed_more.html', context)
+
+
+def events_url(name, **kwargs):
+    """Адрес SSE-потока ленты; None, пока SSE_ENABLED выключен."""
+    if not settings.SSE_ENABLED:
+        return None
+    return reverse(name, kwargs=kwargs)
+
+
+def feed_events(request, scope, posts, channels):
+    """SSE-поток с числом постов ленты новее ?after=<id поста>.
+
+    Поток занимает воркер на SSE_MAX_DURATION, поэтому включается
+    настройкой SSE_ENABLED только под асинхронный сервер.
+    """
+    if not settings.SSE_ENABLED:
+        raise Http404
+    after = scroll.parse_cursor(request.GET.get('after'))
+    response = StreamingHttpResponse(
+        events.stream(
+            channels, lambda: events.new_posts(scope, posts, after)),
+        content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
 def index(request):
-    posts = Post.objects.select_related('group', 'author')
-    page_obj = pagination(posts, request)
+    page_obj = post_page(Post.objects.all(), request, GLOBAL)
     context = {
         'page_obj': page_obj,
+        'feed_stamp': stamp(GLOBAL),
+        'more_url': reverse('posts:index_more'),
+        'events_url': events_url('posts:index_events'),
     }
     return render(request, 'posts/index.html', context)
 
 
+def index_more(request):
+    return feed_more(request, GLOBAL, Post.objects.all())
+
+
+def index_events(request):
+    return feed_events(request, GLOBAL, Post.objects.all(), [GLOBAL])
+
+
+def index_feed(request, fmt):
+    def build():
+        feed_kwargs = {
+            'title': 'Yatube: последние обновления',
+            'link': reverse('posts:index'),
+            'description': 'Последние записи всех авторов',
+        }
+        return feed_kwargs, Post.objects.all()
+    return feed_response(request, fmt, GLOBAL, build)
+
+
+def group_feed(request, slug, fmt):
+    group = get_object_or_404(Group, slug=slug, hidden=False)
+
+    def build():
+        feed_kwargs = {
+            'title': f'Yatube: {group.title}',
+            'link': reverse('posts:group_list', kwargs={'slug': slug}),
+            'description': group.description,
+        }
+        return feed_kwargs, group.posts.all()
+    return feed_response(request, fmt, group_scope(slug), build)
+
+
+def profile_feed(request, username, fmt):
+    author = get_object_or_404(User, username=username, is_active=True)
+
+    def build():
+        feed_kwargs = {
+            'title': f'Yatube: {author.get_full_name() or username}',
+            'link': reverse('posts:profile', kwargs={'username': username}),
+            'description': f'Записи пользователя {username}',
+        }
+        return feed_kwargs, author.posts.all()
+    return feed_response(request, fmt, author_scope(username), build)
+
+
+def sitemap(request, name=sitemaps.INDEX):
+    return serve(request, name, document_root=settings.SITEMAP_ROOT)
+
+
+def trending_posts():
+    return Post.objects.filter(
+        trending__isnull=False, hidden=False, author__is_active=True
+    ).select_related('group', 'author').order_by('-trending__score')
+
+
+def trending(request):
+    page_obj = post_page(trending_posts(), request)
+    context = {
+        'page_obj': page_obj,
+        'trending': True,
+        'more_url': reverse('posts:trending_more'),
+    }
+    return render(request, 'posts/trending.html', context)
+
+
+def trending_more(request):
+    def load_ids():
+        return list(trending_posts().values_list('pk', flat=True)
+                    [:settings.FEED_ID_LIMIT])
+    return feed_more(request, None, None, load_ids, trending=True)
+
+
 def group_posts(request, slug):
-    group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.select_related('author')
-    page_obj = pagination(posts, request)
+    group = get_object_or_404(Group, slug=slug, hidden=False)
+    page_obj = post_page(group.posts.all(), request, group_scope(slug))
     context = {
         'group': group,
         'page_obj': page_obj,
+        'more_url': reverse('posts:group_more', kwargs={'slug': slug}),
+        'events_url': events_url('posts:group_events', slug=slug),
     }
     return render(request, 'posts/group_list.html', context)
 
 
+def group_more(request, slug):
+    group = get_object_or_404(Group, slug=slug, hidden=False)
+    return feed_more(
+        request, group_scope(slug), group.posts.all(), group=group)
+
+
+def group_events(request, slug):
+    group = get_object_or_404(Group, slug=slug, hidden=False)
+    scope = group_scope(slug)
+    return feed_events(request, scope, group.posts.all(), [scope])
+
+
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    posts = author.posts.select_related('author')
-    page_obj = pagination(posts, request)
-    following = (
-        request.user.is_authenticated
-        and Follow.objects.filter(author=author, user=request.user).exists()
-    )
+    author = get_object_or_404(User, username=username, is_active=True)
+    page_obj = post_page(
+        author.posts.all(), request, author_scope(username))
     context = {
         'author': author,
         'page_obj': page_obj,
-        'following': following,
+        'following': is_following(request.user, author.pk),
+        'followers_count': follower_count(author.pk),
+        'following_count': len(following_ids(author.pk)),
+        'recommendations': recommended_authors(request.user),
+        'more_url': reverse(
+            'posts:profile_more', kwargs={'username': username}),
     }
     return render(request, 'posts/profile.html', context)
 
 
+def profile_more(request, username):
+    author = get_object_or_404(User, username=username, is_active=True)
+    return feed_more(request, author_scope(username), author.posts.all())
+
+
+def follow_list(request, author, user_ids, title):
+    page_obj = pagination(user_ids, request)
+    users = User.objects.in_bulk(page_obj.object_list)
+    page_obj.object_list = [
+        users[pk] for pk in page_obj.object_list if pk in users
+    ]
+    context = {
+        'author': author,
+        'page_obj': page_obj,
+        'title': title,
+    }
+    return render(request, 'posts/follow_list.html', context)
+
+
+def profile_followers(request, username):
+    author = get_object_or_404(User, username=username, is_active=True)
+    return follow_list(
+        request, author, follower_ids(author.pk), 'Подписчики')
+
+
+def profile_following(request, username):
+    author = get_object_or_404(User, username=username, is_active=True)
+    return follow_list(
+        request, author, sorted(following_ids(author.pk)), 'Подписки')
+
+
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
+    post = get_object_or_404(
+        Post, pk=post_id, hidden=False, author__is_active=True)
+    view_counter.hit(post.id)
+    attach_likes([post], request.user)
     form = CommentForm(request.POST or None)
     comments = Comment.objects.filter(post_id=post.id)
     posts_count = post.author.posts.count()
     context = {
         'post': post,
         'posts_count': posts_count,
+        'views': view_counter.count(post),
         'comments': comments,
         'form': form,
     }
@@ -65,10 +298,12 @@ def post_detail(request, post_id):
 
 
 @login_required
+@limit_uploads
 def post_create(request):
     form = PostForm(
         request.POST or None,
-        files=request.FILES or None
+        files=request.FILES or None,
+        oversized=oversized_fields(request)
     )
     context = {
         'form': form,
@@ -82,6 +317,7 @@ def post_create(request):
 
 
 @login_required
+@limit_uploads
 def post_edit(request, post_id):
     post = get_object_or_404(Post, pk=post_id)
     if post.author != request.user:
@@ -89,7 +325,8 @@ def post_edit(request, post_id):
     form = PostForm(
         request.POST or None,
         files=request.FILES or None,
-        instance=post
+        instance=post,
+        oversized=oversized_fields(request)
     )
     if form.is_valid():
         form.save()
@@ -102,42 +339,98 @@ def post_edit(request, post_id):
 
 @login_required
 def add_comment(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
+    get_object_or_404(
+        Post.objects.values_list('pk', flat=True), pk=post_id, hidden=False)
     form = CommentForm(request.POST or None)
     if form.is_valid():
         comment = form.save(commit=False)
         comment.author = request.user
-        comment.post = post
+        comment.post_id = post_id
         comment.save()
+        if wants_json(request):
+            return JsonResponse({'html': render_to_string(
+                'posts/comment.html', {'comment': comment}, request)})
+    elif wants_json(request):
+        return JsonResponse({'errors': form.errors}, status=400)
     return redirect('posts:post_detail', post_id=post_id)
 
 
 @login_required
 def follow_index(request):
-    posts = Post.objects.filter(
-        author__following__user=request.user).select_related('author')
-    page_obj = pagination(posts, request)
+    posts = Post.objects.filter(author__following__user=request.user)
+    page_obj = post_page(
+        posts, request, follower_scope(request.user.pk))
     content = {
         'page_obj': page_obj,
+        'recommendations': recommended_authors(request.user),
+        'more_url': reverse('posts:follow_more'),
+        'events_url': events_url('posts:follow_events'),
     }
     return render(request, 'posts/follow.html', content)
 
 
 @login_required
+def follow_more(request):
+    posts = Post.objects.filter(author__following__user=request.user)
+    return feed_more(request, follower_scope(request.user.pk), posts)
+
+
+@login_required
+def follow_events(request):
+    """Поток ленты подписок слушает каналы авторов, на которых
+    подписан пользователь."""
+    authors = feedcache.fetch({User: following_ids(request.user.pk)})[User]
+    posts = Post.objects.filter(author__following__user=request.user)
+    return feed_events(
+        request, follower_scope(request.user.pk), posts,
+        [author_scope(author.username) for author in authors.values()])
+
+
+def follow_state(request, author_id, username):
+    if wants_json(request):
+        return JsonResponse({
+            'following': is_following(request.user, author_id),
+            'followers_count': follower_count(author_id),
+        })
+    return redirect('posts:profile', username=username)
+
+
+def author_id_or_404(username):
+    author_id = feedcache.user_id(username)
+    if author_id is None:
+        raise Http404
+    return author_id
+
+
+@login_required
+@json_requires_post
 def profile_follow(request, username):
-    author = get_object_or_404(User, username=username)
-    if author != request.user:
-        Follow.objects.get_or_create(
-            user=request.user,
-            author=author
-        )
-    return redirect('posts:profile', username=author.username)
+    author_id = author_id_or_404(username)
+    if follow(request.user.pk, author_id):
+        refresh_affected_recommendations.delay(request.user.pk, author_id)
+    return follow_state(request, author_id, username)
 
 
 @login_required
+@json_requires_post
 def profile_unfollow(request, username):
-    follower = Follow.objects.filter(
-        user=request.user, author__username=username)
-    if follower.exists():
-        follower.delete()
-    return redirect('posts:profile', username=username)
+    author_id = author_id_or_404(username)
+    if unfollow(request.user.pk, author_id):
+        refresh_affected_recommendations.delay(request.user.pk, author_id)
+    return follow_state(request, author_id, username)
+
+
+@login_required
+@require_POST
+def post_like(request, post_id):
+    post = get_object_or_404(Post, pk=post_id, hidden=False)
+    like(request.user, post)
+    return redirect('posts:post_detail', post_id=post_id)
+
+
+@login_required
+@require_POST
+def post_unlike(request, post_id):
+    post = get_object_or_404(Post, pk=post_id, hidden=False)
+    unlike(request.user, post)
+    return redirect('posts:post_detail', post_id=post_id)
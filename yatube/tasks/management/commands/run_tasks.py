@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from tasks import worker
+
+
+class Command(BaseCommand):
+    help = 'Запускает воркер фоновых задач'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes', type=int, default=1,
+            help='Количество процессов-воркеров'
+        )
+        parser.add_argument(
+            '--threads', type=int, default=1,
+            help='Количество потоков в каждом процессе'
+        )
+        parser.add_argument(
+            '--burst', action='store_true',
+            help='Выполнить готовые задачи и завершиться'
+        )
+
+    def handle(self, *args, **options):
+        worker.run(
+            processes=options['processes'],
+            threads=options['threads'],
+            burst=options['burst'],
+        )
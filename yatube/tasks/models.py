@@ -0,0 +1,82 @@
+from django.db import models
+from django.utils import timezone
+
+
+class Task(models.Model):
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (QUEUED, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Выполнена'),
+        (FAILED, 'Ошибка'),
+    )
+
+    name = models.CharField(
+        verbose_name='Задача',
+        max_length=200
+    )
+    payload = models.TextField(
+        verbose_name='Аргументы',
+        default='{}'
+    )
+    priority = models.SmallIntegerField(
+        verbose_name='Приоритет',
+        default=0,
+        help_text='Задачи с большим приоритетом выполняются раньше'
+    )
+    status = models.CharField(
+        verbose_name='Статус',
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default=QUEUED
+    )
+    attempts = models.PositiveSmallIntegerField(
+        verbose_name='Попыток',
+        default=0
+    )
+    max_attempts = models.PositiveSmallIntegerField(
+        verbose_name='Максимум попыток',
+        default=1
+    )
+    run_after = models.DateTimeField(
+        verbose_name='Выполнить после',
+        default=timezone.now
+    )
+    created = models.DateTimeField(
+        verbose_name='Дата постановки',
+        auto_now_add=True
+    )
+    started = models.DateTimeField(
+        verbose_name='Начало выполнения',
+        null=True,
+        blank=True
+    )
+    heartbeat = models.DateTimeField(
+        verbose_name='Последний сигнал воркера',
+        null=True,
+        blank=True
+    )
+    finished = models.DateTimeField(
+        verbose_name='Окончание выполнения',
+        null=True,
+        blank=True
+    )
+    error = models.TextField(
+        verbose_name='Ошибка',
+        blank=True
+    )
+
+    class Meta:
+        ordering = ('-priority', 'run_after')
+        verbose_name = 'Задача'
+        verbose_name_plural = 'Задачи'
+        indexes = [models.Index(
+            fields=['status', '-priority', 'run_after'],
+            name='task_pick_idx')
+        ]
+
+    def __str__(self):
+        return f'{self.name} ({self.status})'
@@ -0,0 +1,221 @@
+import json
+import logging
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Count, F, Min
+from django.utils import timezone
+
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+registry = {}
+
+
+def task(name=None, priority=0, max_attempts=None, unique=False):
+    """Регистрирует функцию как фоновую задачу.
+
+    У функции появляется метод ``delay`` для постановки в очередь.
+    """
+    def decorator(func):
+        task_name = name or f'{func.__module__}.{func.__name__}'
+        registry[task_name] = func
+
+        def delay(*args, **kwargs):
+            return enqueue(
+                task_name,
+                args=args,
+                kwargs=kwargs,
+                priority=priority,
+                max_attempts=max_attempts,
+                unique=unique
+            )
+
+        func.task_name = task_name
+        func.delay = delay
+        return func
+    return decorator
+
+
+def enqueue(name, args=(), kwargs=None, priority=0, countdown=0,
+            max_attempts=None, unique=False):
+    """Ставит задачу в очередь.
+
+    С unique=True переиспользуется такая же задача в очереди; если
+    она отложена дальше, чем просит countdown, её срок подтягивается.
+    """
+    payload = json.dumps({'args': list(args), 'kwargs': kwargs or {}})
+    run_after = timezone.now() + timedelta(seconds=countdown)
+    if unique:
+        queued = Task.objects.filter(
+            name=name, payload=payload, status=Task.QUEUED).first()
+        if queued is not None:
+            if queued.run_after > run_after:
+                Task.objects.filter(
+                    pk=queued.pk, status=Task.QUEUED,
+                    run_after__gt=run_after).update(run_after=run_after)
+                queued.run_after = run_after
+            return queued
+    return Task.objects.create(
+        name=name,
+        payload=payload,
+        priority=priority,
+        max_attempts=max_attempts or settings.TASKS_MAX_ATTEMPTS,
+        run_after=run_after,
+    )
+
+
+def claim():
+    """Забирает одну готовую к выполнению задачу.
+
+    Захват делается условным UPDATE по статусу, поэтому несколько
+    воркеров не получат одну и ту же задачу даже без SELECT FOR UPDATE.
+    """
+    now = timezone.now()
+    candidates = Task.objects.filter(
+        status=Task.QUEUED, run_after__lte=now
+    ).order_by('-priority', 'run_after', 'pk').values_list('pk', flat=True)
+    for pk in candidates[:10]:
+        claimed = Task.objects.filter(pk=pk, status=Task.QUEUED).update(
+            status=Task.RUNNING,
+            started=now,
+            heartbeat=now,
+            attempts=F('attempts') + 1,
+        )
+        if claimed:
+            return Task.objects.get(pk=pk)
+    return None
+
+
+def owned(task):
+    """Задача, пока она за этим захватом.
+
+    Номер попытки служит меткой захвата: если задачу вернули в очередь
+    и забрал другой воркер, старый исполнитель её уже не тронет.
+    """
+    return Task.objects.filter(
+        pk=task.pk, status=Task.RUNNING, attempts=task.attempts)
+
+
+def execute(task):
+    func = registry.get(task.name)
+    try:
+        if func is None:
+            raise LookupError(f'Задача {task.name} не зарегистрирована')
+        payload = json.loads(task.payload)
+        func(*payload.get('args', ()), **payload.get('kwargs', {}))
+    except Exception:
+        logger.exception('Задача %s #%s упала', task.name, task.pk)
+        retry(task, traceback.format_exc())
+        return False
+    finished = owned(task).update(
+        status=Task.DONE, finished=timezone.now(), error='')
+    if not finished:
+        logger.warning('Задача %s #%s уже не за этим воркером',
+                       task.name, task.pk)
+    return True
+
+
+def retry(task, error):
+    now = timezone.now()
+    if task.attempts >= task.max_attempts:
+        owned(task).update(status=Task.FAILED, finished=now, error=error)
+        return
+    delay = settings.TASKS_RETRY_DELAY * 2 ** (task.attempts - 1)
+    owned(task).update(
+        status=Task.QUEUED,
+        run_after=now + timedelta(seconds=delay),
+        error=error,
+    )
+
+
+def heartbeat(pks):
+    """Отмечает, что задачи pks ещё выполняются."""
+    if not pks:
+        return 0
+    return Task.objects.filter(pk__in=pks, status=Task.RUNNING).update(
+        heartbeat=timezone.now())
+
+
+def requeue_stale():
+    """Возвращает в очередь задачи, чей воркер умер посреди выполнения.
+
+    Живой воркер отмечает свои задачи через heartbeat, поэтому долгая
+    задача не считается зависшей. Попытка уже учтена при захвате:
+    задача, исчерпавшая попытки, помечается ошибкой, а не крутится
+    вечно, если сама роняет воркер.
+    """
+    now = timezone.now()
+    stale = Task.objects.filter(
+        status=Task.RUNNING,
+        heartbeat__lt=now - timedelta(
+            seconds=settings.TASKS_VISIBILITY_TIMEOUT),
+    )
+    failed = stale.filter(attempts__gte=F('max_attempts')).update(
+        status=Task.FAILED,
+        finished=now,
+        error='Воркер не закончил задачу за отведённое время',
+    )
+    return failed + stale.update(status=Task.QUEUED, run_after=now)
+
+
+def purge_finished():
+    deadline = timezone.now() - timedelta(seconds=settings.TASKS_RESULT_TTL)
+    deleted, _ = Task.objects.filter(
+        status__in=(Task.DONE, Task.FAILED), finished__lt=deadline
+    ).delete()
+    return deleted
+
+
+def run_pending(limit=None):
+    executed = 0
+    while limit is None or executed < limit:
+        task = claim()
+        if task is None:
+            break
+        execute(task)
+        executed += 1
+    return executed
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def metrics():
+    now = timezone.now()
+    depth = dict(
+        Task.objects.values_list('status').annotate(Count('pk')).order_by()
+    )
+    by_priority = dict(
+        Task.objects.filter(status=Task.QUEUED)
+        .values_list('priority').annotate(Count('pk')).order_by()
+    )
+    oldest = Task.objects.filter(
+        status=Task.QUEUED, run_after__lte=now
+    ).aggregate(oldest=Min('run_after'))['oldest']
+    window = now - timedelta(seconds=settings.TASKS_METRICS_WINDOW)
+    finished = list(Task.objects.filter(
+        status=Task.DONE, finished__gte=window
+    ).values_list('created', 'started', 'finished')[:1000])
+    waits = [(started - created).total_seconds()
+             for created, started, _ in finished]
+    runs = [(done - started).total_seconds()
+            for _, started, done in finished]
+    return {
+        'depth': {status: depth.get(status, 0)
+                  for status, _ in Task.STATUS_CHOICES},
+        'queued_by_priority': by_priority,
+        'oldest_queued_age': (now - oldest).total_seconds() if oldest else 0,
+        'window': settings.TASKS_METRICS_WINDOW,
+        'processed': len(waits),
+        'wait_avg': sum(waits) / len(waits) if waits else None,
+        'wait_p95': percentile(waits, 0.95),
+        'run_avg': sum(runs) / len(runs) if runs else None,
+        'run_p95': percentile(runs, 0.95),
+    }
@@ -0,0 +1,144 @@
+from datetime import timedelta
+from http import HTTPStatus
+
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from .. import queue
+from ..models import Task
+
+User = get_user_model()
+
+calls = []
+
+
+@queue.task(name='tests.remember')
+def remember(value):
+    calls.append(value)
+
+
+@queue.task(name='tests.explode', max_attempts=2)
+def explode():
+    raise ValueError('boom')
+
+
+class QueueTests(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_delay_puts_task_to_queue(self):
+        """delay ставит задачу в очередь, а не выполняет её сразу."""
+        remember.delay('first')
+        self.assertEqual(calls, [])
+        self.assertEqual(
+            Task.objects.filter(status=Task.QUEUED).count(), 1)
+
+    def test_run_pending_executes_by_priority(self):
+        """Задачи выполняются в порядке приоритета."""
+        queue.enqueue('tests.remember', args=['low'])
+        queue.enqueue('tests.remember', args=['high'], priority=10)
+        self.assertEqual(queue.run_pending(), 2)
+        self.assertEqual(calls, ['high', 'low'])
+        self.assertEqual(Task.objects.filter(status=Task.DONE).count(), 2)
+
+    def test_delayed_task_is_not_claimed(self):
+        """Отложенная задача не выполняется раньше срока."""
+        queue.enqueue('tests.remember', args=['later'], countdown=60)
+        self.assertEqual(queue.run_pending(), 0)
+
+    def test_failed_task_is_retried_then_failed(self):
+        """Упавшая задача повторяется, после лимита попыток — ошибка."""
+        explode.delay()
+        queue.run_pending()
+        task = Task.objects.get()
+        self.assertEqual(task.status, Task.QUEUED)
+        self.assertIn('boom', task.error)
+        Task.objects.update(run_after=timezone.now())
+        queue.run_pending()
+        task.refresh_from_db()
+        self.assertEqual(task.status, Task.FAILED)
+        self.assertEqual(task.attempts, 2)
+
+    def test_unique_task_is_enqueued_once(self):
+        """Уникальная задача не дублируется в очереди."""
+        queue.enqueue('tests.remember', args=['once'], unique=True)
+        queue.enqueue('tests.remember', args=['once'], unique=True)
+        self.assertEqual(Task.objects.count(), 1)
+
+    def test_stale_running_task_is_requeued(self):
+        """Зависшая задача возвращается в очередь."""
+        task = queue.enqueue('tests.remember', args=['stale'])
+        Task.objects.filter(pk=task.pk).update(
+            status=Task.RUNNING,
+            attempts=1,
+            heartbeat=timezone.now() - timedelta(days=1)
+        )
+        self.assertEqual(queue.requeue_stale(), 1)
+        queue.run_pending()
+        self.assertEqual(calls, ['stale'])
+
+    def test_slow_task_with_heartbeat_is_not_requeued(self):
+        """Долгая задача живого воркера не выполняется второй раз."""
+        task = queue.enqueue('tests.remember', args=['slow'])
+        claimed = queue.claim()
+        Task.objects.filter(pk=task.pk).update(
+            started=timezone.now() - timedelta(days=1))
+        queue.heartbeat([task.pk])
+        self.assertEqual(queue.requeue_stale(), 0)
+        queue.execute(claimed)
+        task.refresh_from_db()
+        self.assertEqual(task.status, Task.DONE)
+
+    def test_stale_task_fails_after_max_attempts(self):
+        """Задача, роняющая воркер, не крутится в очереди вечно."""
+        task = queue.enqueue('tests.remember', args=['crash'])
+        Task.objects.filter(pk=task.pk).update(
+            status=Task.RUNNING,
+            attempts=task.max_attempts,
+            heartbeat=timezone.now() - timedelta(days=1)
+        )
+        queue.requeue_stale()
+        task.refresh_from_db()
+        self.assertEqual(task.status, Task.FAILED)
+
+    def test_requeued_task_is_not_finished_by_old_run(self):
+        """Старый исполнитель не закрывает задачу, забранную заново."""
+        queue.enqueue('tests.remember', args=['twice'])
+        first = queue.claim()
+        Task.objects.filter(pk=first.pk).update(
+            heartbeat=timezone.now() - timedelta(days=1))
+        queue.requeue_stale()
+        second = queue.claim()
+        queue.execute(first)
+        second.refresh_from_db()
+        self.assertEqual(second.status, Task.RUNNING)
+        queue.execute(second)
+        second.refresh_from_db()
+        self.assertEqual(second.status, Task.DONE)
+
+
+class MetricsViewTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.staff = User.objects.create_user(
+            username='Staff_user', is_staff=True)
+        cls.user = User.objects.create_user(username='Auth_user')
+
+    def test_metrics_for_staff(self):
+        """Метрики очереди доступны персоналу."""
+        queue.enqueue('tests.remember', args=['x'])
+        client = Client()
+        client.force_login(self.staff)
+        response = client.get(reverse('tasks:metrics'))
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(response.json()['depth'][Task.QUEUED], 1)
+
+    def test_metrics_hidden_from_users(self):
+        """Обычный пользователь не видит метрики очереди."""
+        client = Client()
+        client.force_login(self.user)
+        response = client.get(reverse('tasks:metrics'))
+        self.assertEqual(response.status_code, HTTPStatus.FOUND)
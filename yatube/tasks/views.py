@@ -0,0 +1,9 @@
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import JsonResponse
+
+from . import queue
+
+
+@staff_member_required
+def metrics(request):
+    return JsonResponse(queue.metrics())
@@ -0,0 +1,103 @@
+import logging
+import multiprocessing
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, connection, connections
+
+from . import queue
+
+logger = logging.getLogger(__name__)
+
+
+class Worker:
+    """Пул потоков, разбирающих очередь задач.
+
+    Каждый поток сам забирает задачи из базы, поэтому несколько
+    воркеров в разных процессах могут работать с одной очередью.
+    """
+
+    def __init__(self, threads=1, burst=False, poll_interval=None):
+        self.threads = threads
+        self.burst = burst
+        self.poll_interval = poll_interval or settings.TASKS_POLL_INTERVAL
+        self.stopped = threading.Event()
+        self.running = set()
+        self.lock = threading.Lock()
+
+    def stop(self, *args):
+        self.stopped.set()
+
+    def loop(self):
+        try:
+            while not self.stopped.is_set():
+                close_old_connections()
+                task = queue.claim()
+                if task is not None:
+                    with self.lock:
+                        self.running.add(task.pk)
+                    try:
+                        queue.execute(task)
+                    finally:
+                        with self.lock:
+                            self.running.discard(task.pk)
+                    continue
+                if self.burst:
+                    break
+                self.stopped.wait(self.poll_interval)
+        finally:
+            connection.close()
+
+    def housekeeping(self):
+        while not self.stopped.wait(settings.TASKS_VISIBILITY_TIMEOUT / 4):
+            close_old_connections()
+            with self.lock:
+                running = list(self.running)
+            queue.heartbeat(running)
+            if self.burst:
+                continue
+            requeued = queue.requeue_stale()
+            purged = queue.purge_finished()
+            if requeued or purged:
+                logger.info('Возвращено задач: %s, удалено: %s',
+                            requeued, purged)
+        connection.close()
+
+    def run(self):
+        threading.Thread(target=self.housekeeping, daemon=True).start()
+        with ThreadPoolExecutor(max_workers=self.threads) as executor:
+            loops = [executor.submit(self.loop) for _ in range(self.threads)]
+        self.stopped.set()
+        for future in loops:
+            future.result()
+
+
+def run_process(threads, burst):
+    worker = Worker(threads=threads, burst=burst)
+    signal.signal(signal.SIGTERM, worker.stop)
+    signal.signal(signal.SIGINT, worker.stop)
+    worker.run()
+
+
+def run(processes=1, threads=1, burst=False):
+    if processes == 1:
+        run_process(threads, burst)
+        return
+    connections.close_all()
+    children = [
+        multiprocessing.Process(target=run_process, args=(threads, burst))
+        for _ in range(processes)
+    ]
+    for child in children:
+        child.start()
+    try:
+        while any(child.is_alive() for child in children):
+            time.sleep(settings.TASKS_POLL_INTERVAL)
+    except KeyboardInterrupt:
+        for child in children:
+            child.terminate()
+    for child in children:
+        child.join()
@@ -0,0 +1,39 @@
+from core import codec
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+from django.db import transaction
+
+USER_KEY = 'auth_user:{}'
+
+
+class CachedModelBackend(ModelBackend):
+    """ModelBackend, который берёт пользователя сессии из кэша.
+
+    Запись сбрасывается при любом сохранении пользователя: смене
+    пароля, правке профиля, обновлении last_login. QuerySet.update
+    сигналов не шлёт, поэтому запись живёт лишь
+    AUTH_USER_CACHE_TIMEOUT секунд: массовая блокировка доходит
+    до сессий не позже этого срока.
+    """
+
+    def get_user(self, user_id):
+        key = USER_KEY.format(user_id)
+        data = cache.get(key)
+        if data is not None:
+            try:
+                user = codec.loads(data)
+            except codec.Stale:
+                pass
+            else:
+                return user if self.user_can_authenticate(user) else None
+        user = super().get_user(user_id)
+        if user is not None:
+            cache.set(key, codec.dumps(user), settings.AUTH_USER_CACHE_TIMEOUT)
+        return user
+
+
+def forget_user(user_id):
+    key = USER_KEY.format(user_id)
+    cache.delete(key)
+    transaction.on_commit(lambda: cache.delete(key))
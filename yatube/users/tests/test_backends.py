@@ -0,0 +1,75 @@
+import time
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..backends import CachedModelBackend
+
+User = get_user_model()
+
+
+class CachedBackendTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='Auth_user', password='old-password')
+        self.url = reverse('about:author')
+
+    def queries_per_view(self):
+        self.client = Client()
+        self.client.force_login(self.user)
+        self.client.get(self.url)
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(self.url)
+        return len(context)
+
+    def test_saves_session_and_user_queries(self):
+        """Сессия и пользователь не читаются из базы на каждый запрос."""
+        with override_settings(
+            SESSION_ENGINE='django.contrib.sessions.backends.db',
+            AUTHENTICATION_BACKENDS=[
+                'django.contrib.auth.backends.ModelBackend'],
+        ):
+            default = self.queries_per_view()
+        cached = self.queries_per_view()
+        self.assertEqual(default, 2)
+        self.assertEqual(cached, 0)
+
+    def test_password_change_ends_session(self):
+        """После смены пароля старая сессия больше не действует."""
+        self.client.force_login(self.user)
+        follow_url = reverse('posts:follow_index')
+        self.assertEqual(self.client.get(follow_url).status_code, 200)
+        self.user.set_password('new-password')
+        self.user.save()
+        self.assertEqual(self.client.get(follow_url).status_code, 302)
+
+    def test_user_edit_invalidates_cache(self):
+        """Правка пользователя сбрасывает его запись в кэше."""
+        backend = CachedModelBackend()
+        backend.get_user(self.user.pk)
+        User.objects.get(pk=self.user.pk).save()
+        self.user.first_name = 'Имя'
+        self.user.save()
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                backend.get_user(self.user.pk).first_name, 'Имя')
+        with self.assertNumQueries(0):
+            backend.get_user(self.user.pk)
+
+    def test_bulk_deactivation_expires_quickly(self):
+        """Блокировка через update перестаёт пускать пользователя,
+        как только истекает короткая запись в кэше."""
+        backend = CachedModelBackend()
+        backend.get_user(self.user.pk)
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertIsNotNone(backend.get_user(self.user.pk))
+        later = time.time() + settings.AUTH_USER_CACHE_TIMEOUT + 1
+        with mock.patch('time.time', return_value=later):
+            self.assertIsNone(backend.get_user(self.user.pk))
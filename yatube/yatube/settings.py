@@ -23,6 +23,7 @@ INSTALLED_APPS = [
     'debug_toolbar',
     'posts.apps.PostsConfig',
     'sorl.thumbnail',
+    'tasks.apps.TasksConfig',
     'users.apps.UsersConfig',
     'django.contrib.admin',
     'django.contrib.auth',
@@ -105,7 +106,8 @@ STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
 LOGIN_URL = 'users:login'
 LOGIN_REDIRECT_URL = 'posts:index'
 
-EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
+EMAIL_BACKEND = 'core.mail.OutboxEmailBackend'
+OUTBOX_EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
 MAX_POSTS = 10
@@ -126,3 +128,142 @@ CACHES = {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
     }
 }
+
+TASKS_POLL_INTERVAL = 1
+
+TASKS_MAX_ATTEMPTS = 3
+
+TASKS_RETRY_DELAY = 10
+
+TASKS_VISIBILITY_TIMEOUT = 60 * 10
+
+TASKS_RESULT_TTL = 60 * 60 * 24
+
+TASKS_METRICS_WINDOW = 60 * 15
+
+OUTBOX_BATCH_SIZE = 100
+
+OUTBOX_MAX_ATTEMPTS = 5
+
+OUTBOX_RETRY_DELAY = 60
+
+OUTBOX_DEDUP_WINDOW = 60 * 5
+
+POST_VIEWS_FLUSH_INTERVAL = 30
+
+POST_VIEWS_BATCH_SIZE = 250
+
+POST_VIEWS_BUFFER_TIMEOUT = 60 * 60 * 24
+
+LIKE_COUNTER_SHARDS = 8
+
+LIKES_CACHE_TIMEOUT = 60 * 60
+
+TRENDING_INTERVAL = 60 * 5
+
+TRENDING_MAX_AGE = 60 * 60 * 24 * 7
+
+TRENDING_DECAY = 45000
+
+TRENDING_COMMENT_WEIGHT = 3
+
+TRENDING_LIKE_WEIGHT = 2
+
+TRENDING_VIEW_WEIGHT = 0.1
+
+RECOMMENDATIONS_LIMIT = 5
+
+RECOMMENDATIONS_BATCH_SIZE = 200
+
+RECOMMENDATIONS_FANOUT = 100
+
+RECOMMENDATIONS_HOP_LIMIT = 500
+
+FOLLOWS_CACHE_TIMEOUT = 60 * 60
+
+FOLLOWS_FAN_OUT_BATCH_SIZE = 1000
+
+FEED_ITEMS = 20
+
+FEED_CACHE_TIMEOUT = 60 * 5
+
+FEED_STAMP_TIMEOUT = 60 * 60 * 24
+
+SITEMAP_ROOT = os.path.join(BASE_DIR, 'sitemaps')
+
+SITEMAP_BASE_URL = 'http://localhost:8000'
+
+SITEMAP_SHARD_SIZE = 50000
+
+SITEMAP_CHUNK_SIZE = 2000
+
+FILE_UPLOAD_MAX_SIZE = 10 * 1024 * 1024
+
+POST_IMAGE_MAX_PIXELS = 25_000_000
+
+IMAGE_BLOB_GRACE_PERIOD = 60 * 60
+
+MEDIA_PUBLIC_DIRS = ('posts/', 'cache/')
+
+MEDIA_ACCEL = ''
+
+MEDIA_ACCEL_PREFIX = '/protected-media/'
+
+MEDIA_CACHE_TIMEOUT = 60 * 60
+
+THUMBNAIL_KVSTORE = 'core.thumbnails.CachedDBKVStore'
+
+THUMBNAIL_BACKEND = 'core.thumbnails.QueuedThumbnailBackend'
+
+THUMBNAIL_PENDING_TIMEOUT = 60 * 5
+
+POST_PLACEHOLDER_SIZE = 16
+
+POST_EXCERPT_WORDS = 30
+
+POST_CARD_CACHE_TIMEOUT = 60 * 60 * 24
+
+FEED_ID_LIMIT = 1000
+
+OBJECT_CACHE_TIMEOUT = 60 * 60
+
+QUERYCACHE_ENABLED = False
+
+QUERYCACHE_MODELS = [
+    'posts.Post',
+    'posts.Comment',
+    'posts.Follow',
+    'posts.Group',
+]
+
+QUERYCACHE_TIMEOUT = 60 * 5
+
+CACHE_COMPRESS_THRESHOLD = 1024
+
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
+AUTHENTICATION_BACKENDS = ['users.backends.CachedModelBackend']
+
+AUTH_USER_CACHE_TIMEOUT = 30
+
+SSE_ENABLED = False
+
+SSE_CHANNEL_DIR = os.path.join(BASE_DIR, 'channels')
+
+SSE_POLL_INTERVAL = 1
+
+SSE_KEEPALIVE = 15
+
+SSE_MAX_DURATION = 60
+
+SSE_RETRY = 3000
+
+DELETION_BATCH_SIZE = 500
+
+MEDIA_GC_CHUNK_SIZE = 2000
+
+MEDIA_GC_BATCH_SIZE = 500
+
+MEDIA_GC_MIN_AGE = 60 * 60 * 24
+
+MEDIA_QUARANTINE_ROOT = os.path.join(BASE_DIR, 'quarantine')